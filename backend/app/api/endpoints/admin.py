@@ -0,0 +1,113 @@
+import asyncio
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from app.core.config import settings
+from app.core.profiler import profile_store
+from app.schemas.profile import Profile, ProfileList
+from app.services.connection_manager import connection_manager
+
+router = APIRouter()
+
+def require_profiler_token(x_profile: Optional[str] = Header(None)) -> None:
+    """
+    Chỉ cho phép các request có header `X-Profile` bằng `PROFILER_TOKEN`.
+
+    Raises:
+        HTTPException: Nếu profiler chưa được bật hoặc chưa cấu hình token (mã trạng thái 404),
+            hoặc token không đúng (mã trạng thái 403).
+    """
+    if not settings.PROFILER_ENABLED or not settings.PROFILER_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiler is not enabled")
+    if x_profile is None or not secrets.compare_digest(x_profile, settings.PROFILER_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid profiler token")
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)) -> None:
+    """
+    Chỉ cho phép các request có header `X-Admin-Token` bằng `ADMIN_TOKEN`.
+
+    Raises:
+        HTTPException: Nếu chưa cấu hình `ADMIN_TOKEN` (mã trạng thái 404),
+            hoặc token không đúng (mã trạng thái 403).
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin operations are not enabled")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@router.post("/admin/drain", dependencies=[Depends(require_admin_token)])
+async def drain(timeout: Optional[float] = Query(None, ge=0)):
+    """
+    Chuẩn bị tắt tiến trình: ngừng nhận phiên chat WebSocket và tin nhắn mới, chờ các
+    câu trả lời đang stream hoàn tất rồi đóng các phiên (mã 1012) để client kết nối lại
+    tới tiến trình khác.
+
+    uvicorn đóng ngay các WebSocket khi nhận tín hiệu tắt, trước khi ứng dụng kịp drain,
+    nên endpoint này được gọi trước khi gửi tín hiệu (ví dụ trong preStop hook).
+
+    Chỉ tiến trình (worker uvicorn) nhận request này bị drain: khi chạy nhiều worker, mỗi
+    worker cần được drain riêng (hoặc để uvicorn đóng các phiên của các worker khác).
+    Tiến trình nhận lại phiên mới sau `WS_DRAIN_EXPIRY` giây, hoặc khi gọi `/admin/undrain`.
+
+    Args:
+        timeout (Optional[float]): Thời gian chờ tối đa (giây), mặc định `WS_DRAIN_TIMEOUT`.
+
+    Returns:
+        dict: Số phiên đã đóng và số tin nhắn bị hủy do hết thời gian chờ.
+    """
+    return await connection_manager.drain(settings.WS_DRAIN_TIMEOUT if timeout is None else timeout)
+
+@router.post("/admin/undrain", dependencies=[Depends(require_admin_token)])
+async def undrain():
+    """
+    Hủy drain: tiến trình nhận request này nhận lại phiên chat WebSocket và tin nhắn mới
+    (ví dụ sau một lần gọi `/admin/drain` nhầm).
+
+    Returns:
+        dict: `resumed` là False nếu tiến trình không đang drain.
+    """
+    return {"resumed": connection_manager.resume()}
+
+@router.get("/admin/profiles", response_model=ProfileList, dependencies=[Depends(require_profiler_token)])
+async def list_profiles():
+    """
+    Liệt kê các profile đã lưu (mới nhất trước), không kèm stack.
+
+    Returns:
+        ProfileList: Thông tin của các profile.
+    """
+    return ProfileList(items=await asyncio.to_thread(profile_store.list))
+
+@router.get("/admin/profiles/{profile_id}", response_model=Profile, dependencies=[Depends(require_profiler_token)])
+async def get_profile(profile_id: str):
+    """
+    Lấy một profile kèm các stack đã lấy mẫu.
+
+    Args:
+        profile_id (str): Mã profile (header `X-Profile-Id` của response được profile,
+            hoặc mã tác vụ đối với tác vụ xử lý file).
+
+    Raises:
+        HTTPException: Nếu không tìm thấy profile (mã trạng thái 404).
+    """
+    profile = await asyncio.to_thread(profile_store.get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return profile
+
+@router.get("/admin/profiles/{profile_id}/collapsed", response_class=PlainTextResponse,
+            dependencies=[Depends(require_profiler_token)])
+async def get_collapsed_profile(profile_id: str):
+    """
+    Lấy các stack của một profile ở định dạng collapsed stacks, dùng trực tiếp với
+    flamegraph.pl, speedscope hoặc inferno.
+
+    Raises:
+        HTTPException: Nếu không tìm thấy profile (mã trạng thái 404).
+    """
+    profile = await asyncio.to_thread(profile_store.get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return PlainTextResponse(profile["collapsed"] + "\n")
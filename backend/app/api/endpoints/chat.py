@@ -1,92 +1,174 @@
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
-from app.schemas.chat import ChatMessage, ChatResponse
-from app.services.chat_service import process_chat_message
-from asyncio import TimeoutError, wait_for
-
-router = APIRouter()
-
-# Constants for chat processing
-MAX_MESSAGE_SIZE = 1024  # 1 KB
-
-@router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(message: ChatMessage):
-    """
-    Xử lý yêu cầu trò chuyện và trả về phản hồi.
-
-    Hàm này nhận một tin nhắn trò chuyện từ người dùng, xử lý tin nhắn đó và trả về phản
-    hồi dưới dạng đối tượng `ChatResponse`. Nếu có lỗi xảy ra trong quá trình xử lý,
-    nó sẽ trả về một HTTPException với mã lỗi 500.
-
-    Args:
-        message (ChatMessage): Đối tượng chứa nội dung tin nhắn từ người dùng.
-
-    Returns:
-        ChatResponse: Đối tượng chứa phản hồi từ hệ thống.
-
-    Raises:
-        HTTPException: Nếu xảy ra lỗi trong quá trình xử lý tin nhắn, trả về mã lỗi 500
-            và chi tiết lỗi.
-    """
-    try:
-        answer_msg = await process_chat_message(message.text)
-        return ChatResponse(response=answer_msg)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing message: {str(e)}")
-
-@router.websocket("/chat")
-async def websocket_endpoint(websocket: WebSocket):
-    """
-    Xử lý kết nối WebSocket cho trò chuyện.
-
-    Hàm này thiết lập một kết nối WebSocket và lắng nghe các tin nhắn từ người dùng.
-    Khi nhận được một tin nhắn, nó sẽ xử lý tin nhắn đó và gửi phản hồi trở lại cho
-    người dùng. Nếu có lỗi xảy ra trong quá trình xử lý, nó sẽ đóng kết nối WebSocket.
-
-    Args:
-        websocket (WebSocket): Đối tượng WebSocket để giao tiếp với người dùng.
-
-    Raises:
-        WebSocketDisconnect: Nếu kết nối WebSocket bị ngắt.
-    """
-    # Chấp nhận kết nối WebSocket. Nếu không gọi dòng này thì không thể giao tiếp.
-    # Thông thường sẽ cần kiểm tra JWT token ở đây để xác thực người dùng.
-    await websocket.accept()
-    try:
-        while True:
-            # Nhận tin nhắn từ WebSocket. Nếu không có tin nhắn trong 30 giây, sẽ timeout.
-            received_text = await wait_for(websocket.receive_text(), timeout=30)  # 30s
-
-            # Chống tấn công DoS (Denial of Service) bằng cách giới hạn kích thước message
-            if len(received_text) > MAX_MESSAGE_SIZE:
-                await websocket.send_text(ChatResponse(response="Message too large").json())
-                continue
-
-            # Check dữ liệu đầu vào để đảm bảo dữ liệu hợp lệ và tránh lỗi không mong muốn
-            if not received_text.strip():
-                await websocket.send_text(ChatResponse(response="Empty message").json())
-                continue
-
-            # Chuyển đổi tin nhắn nhận được thành object ChatMessage
-            # (được định nghĩa trong app.schemas.chat) để đảm bảo dữ liệu hợp lệ.
-            message = ChatMessage.model_validate_json({"text": received_text})
-            answer_msg = await process_chat_message(message.text)
-
-            # Nếu không thể chuyển đổi thành ChatMessage, gửi phản hồi lỗi về cho người dùng.
-            if not isinstance(answer_msg, str):
-                answer_msg = "Invalid response from server"
-
-            response = ChatResponse(response=answer_msg)
-            await websocket.send_text(response.json())
-
-            # Dừng kết nối WebSocket nếu người dùng gửi tin nhắn "exit".
-            if received_text == "exit":
-                await websocket.close()
-                break
-    except WebSocketDisconnect:
-        print("WebSocket connection closed")
-    except TimeoutError:
-        await websocket.close()
-        print("WebSocket connection closed due to timeout")
-    except Exception as e:
-        res = ChatResponse(response=f"Error processing WebSocket message: {str(e)}")
-        await websocket.send_text(res.json())
+import asyncio
+
+from contextlib import aclosing
+from fastapi import APIRouter, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from app.core import deadline
+from app.core.config import settings
+from app.schemas.chat import ChatControl, ChatMessage, ChatResponse, ChatStreamChunk
+from app.services.chat_service import process_chat_message, stream_chat_message
+from app.services.connection_manager import ChatConnection, connection_manager
+from app.services.resilience import Overloaded
+
+router = APIRouter()
+
+# Constants for chat processing
+MAX_MESSAGE_SIZE = 1024  # 1 KB
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(message: ChatMessage, request: Request):
+    """
+    Xử lý yêu cầu trò chuyện và trả về phản hồi.
+
+    Hàm này nhận một tin nhắn trò chuyện từ người dùng, xử lý tin nhắn đó và trả về phản
+    hồi dưới dạng đối tượng `ChatResponse`. Nếu có lỗi xảy ra trong quá trình xử lý,
+    nó sẽ trả về một HTTPException với mã lỗi 500.
+
+    Việc xử lý có thời hạn `CHAT_TIMEOUT` giây và bị hủy ngay (kể cả request tới Gemini)
+    khi client ngắt kết nối, để không tốn tài nguyên cho câu trả lời không ai nhận.
+    Khi Gemini quá tải hoặc client gửi quá nhiều tin nhắn, request bị từ chối ngay kèm
+    header `Retry-After`.
+
+    Args:
+        message (ChatMessage): Đối tượng chứa nội dung tin nhắn từ người dùng.
+        request (Request): Request HTTP, dùng để phát hiện client ngắt kết nối.
+
+    Returns:
+        ChatResponse: Đối tượng chứa phản hồi từ hệ thống.
+
+    Raises:
+        HTTPException: Nếu client vượt giới hạn tốc độ (mã lỗi 429), Gemini quá tải hoặc
+            không hoạt động (mã lỗi 503), quá thời hạn (mã lỗi 504), hoặc xảy ra lỗi trong
+            quá trình xử lý tin nhắn (mã lỗi 500) và chi tiết lỗi.
+    """
+    try:
+        async with deadline.request_scope(settings.CHAT_TIMEOUT, "http"):
+            answer_msg = await deadline.cancel_on_disconnect(
+                request, process_chat_message(message.text, message.context_files, message.cache,
+                                              client=request.client.host if request.client else None)
+            )
+        return ChatResponse(response=answer_msg)
+    except deadline.RequestCancelled:
+        # Client đã ngắt kết nối, không còn ai nhận phản hồi (499: client closed request)
+        return Response(status_code=499)
+    except deadline.DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=f"Error processing message: {str(e)}")
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing message: {str(e)}")
+
+async def answer_message(connection: ChatConnection, message_id: str, message: ChatMessage) -> None:
+    """
+    Trả lời một tin nhắn qua WebSocket dưới dạng streaming: mỗi đoạn câu trả lời được đưa
+    vào hàng đợi gửi ngay trong một frame `ChatStreamChunk` (type="delta"), kết thúc bằng
+    một frame type="done" chứa toàn bộ câu trả lời. Mọi frame đều mang mã tin nhắn `id`.
+    Khi Gemini quá tải, frame type="error" cho biết thời gian nên chờ (`retry_after`).
+    """
+    answer_parts = []
+    client = connection.websocket.client.host if connection.websocket.client else None
+    try:
+        # Task bị hủy khi client ngắt kết nối hoặc gửi `cancel`, hoặc khi quá thời hạn
+        async with deadline.request_scope(settings.CHAT_TIMEOUT, "websocket"):
+            chunks = stream_chat_message(message.text, message.context_files, message.cache, client=client)
+            async with aclosing(chunks) as chunks:
+                async for chunk in chunks:
+                    answer_parts.append(chunk)
+                    # Kết nối đã đóng (hoặc client quá chậm và đã bị ngắt): dừng đọc từ Gemini
+                    if not connection.send(ChatStreamChunk(type="delta", id=message_id, response=chunk).model_dump_json()):
+                        raise deadline.RequestCancelled("disconnect")
+    except deadline.RequestCancelled:
+        return
+    except asyncio.CancelledError:
+        raise
+    except Overloaded as e:
+        connection.send(ChatStreamChunk(type="error", id=message_id, response=str(e), retry_after=e.retry_after).model_dump_json())
+        return
+    except Exception as e:
+        res = ChatStreamChunk(type="error", id=message_id, response=f"Error processing WebSocket message: {str(e)}")
+        connection.send(res.model_dump_json())
+        return
+
+    connection.send(ChatStreamChunk(type="done", id=message_id, response="".join(answer_parts)).model_dump_json())
+
+    # Dừng kết nối WebSocket nếu người dùng gửi tin nhắn "exit".
+    if message.text == "exit":
+        await connection.flush(timeout=5)
+        await connection.close()
+
+@router.websocket("/chat")
+async def websocket_endpoint(websocket: WebSocket):
+    """
+    Xử lý kết nối WebSocket cho trò chuyện.
+
+    Hàm này thiết lập một kết nối WebSocket (được quản lý bởi `connection_manager`) và lắng
+    nghe các tin nhắn từ người dùng. Mỗi tin nhắn được trả lời trong một task riêng
+    (xem `answer_message`), nên client có thể gửi tiếp tin nhắn khác khi câu trả lời trước
+    còn đang stream, tối đa `WS_MAX_IN_FLIGHT` tin nhắn cùng lúc. Các frame trả lời mang mã
+    `id` của tin nhắn; tin nhắn không có `id` được đánh số lần lượt.
+
+    Tin nhắn nhận được có thể là:
+    - JSON `{"text": "...", "id": "...", "context_files": [...]}`, hoặc văn bản thuần.
+    - Frame điều khiển `ChatControl`: `{"type": "ping"}`, `{"type": "pong"}` (trả lời frame
+      `ping` của server) hoặc `{"type": "cancel", "id": "..."}`.
+
+    Kết nối không bị đóng khi người dùng không chat, chỉ khi client không phản hồi heartbeat.
+
+    Args:
+        websocket (WebSocket): Đối tượng WebSocket để giao tiếp với người dùng.
+    """
+    # Chấp nhận kết nối WebSocket (bị từ chối nếu server đang drain).
+    # Thông thường sẽ cần kiểm tra JWT token ở đây để xác thực người dùng.
+    connection = await connection_manager.connect(websocket)
+    if connection is None:
+        return
+    try:
+        while not connection.closed:
+            received_text = await websocket.receive_text()
+            connection.touch()
+
+            # Chống tấn công DoS (Denial of Service) bằng cách giới hạn kích thước message
+            if len(received_text) > MAX_MESSAGE_SIZE:
+                connection.send(ChatResponse(response="Message too large").json())
+                continue
+
+            # Check dữ liệu đầu vào để đảm bảo dữ liệu hợp lệ và tránh lỗi không mong muốn
+            if not received_text.strip():
+                connection.send(ChatResponse(response="Empty message").json())
+                continue
+
+            # Frame điều khiển (heartbeat, hủy tin nhắn)
+            if received_text.startswith("{") and '"type"' in received_text:
+                try:
+                    control = ChatControl.model_validate_json(received_text)
+                except ValidationError:
+                    control = None
+                if control is not None:
+                    if control.type == "ping":
+                        connection.send(ChatStreamChunk(type="pong", id=control.id).model_dump_json())
+                    elif control.type == "cancel" and control.id is not None:
+                        connection.cancel_message(control.id)
+                    continue
+
+            # Chuyển đổi tin nhắn nhận được thành object ChatMessage
+            # (được định nghĩa trong app.schemas.chat) để đảm bảo dữ liệu hợp lệ.
+            # Nếu không phải JSON hợp lệ, coi toàn bộ tin nhắn là văn bản thuần.
+            try:
+                message = ChatMessage.model_validate_json(received_text)
+            except ValidationError:
+                message = ChatMessage(text=received_text)
+
+            message_id = message.id or connection.next_message_id()
+            if connection_manager.draining:
+                error = "Server is restarting, please reconnect"
+            else:
+                error = connection.start_message(message_id, answer_message(connection, message_id, message))
+            if error is not None:
+                connection.send(ChatStreamChunk(type="error", id=message_id, response=error).model_dump_json())
+    except WebSocketDisconnect:
+        print("WebSocket connection closed")
+    except RuntimeError:
+        # Kết nối đã bị server đóng (heartbeat, client quá chậm, drain)
+        pass
+    finally:
+        await connection_manager.disconnect(connection)
@@ -1,199 +1,295 @@
-import os
-import aiofiles
-import numpy as np
-
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from typing import List
-from app.core.config import settings
-from app.services.file_processor import process_file
-from app.schemas.file import FileResponse, FileInfo
-from datetime import datetime
-
-router = APIRouter()
-
-async def convert_text_to_vector(text: str) -> bytes:
-    """
-    Convert text file to vector representation.
-    This is a placeholder function. Replace with actual vectorization logic.
-    """
-    # Simple vectorization using numpy
-    vector = np.array([ord(c) for c in text], dtype=np.float32)
-    return vector.tobytes()
-
-@router.post("/upload", response_model=FileResponse)
-async def upload_file(file: UploadFile = File(...)):
-    """
-    Xử lý việc tải lên, xử lý và trích xuất nội dung từ một file.
-
-    Hàm này hỗ trợ các định dạng file cụ thể (ví dụ: DOCX, XLSX) và thực hiện các bước sau:
-    1. Kiểm tra phần mở rộng của file để đảm bảo được phép.
-    2. Lưu file đã tải lên vào thư mục chỉ định.
-    3. Trích xuất nội dung văn bản từ file.
-    4. Chuyển đổi nội dung văn bản đã trích xuất thành vector.
-    5. Lưu nội dung văn bản và dữ liệu vector vào các file riêng biệt.
-
-    Args:
-        file (UploadFile): File được tải lên. Đây là một đối tượng `UploadFile` của FastAPI.
-
-    Returns:
-        FileResponse: Phản hồi chứa metadata của file đã tải lên và nội dung văn bản đã trích xuất.
-
-    Raises:
-        HTTPException: Nếu phần mở rộng của file không được phép (mã trạng thái 400).
-    """
-    # Lấy phần mở rộng của file
-    file_extension = file.filename.split(".")[-1].lower()
-
-    # Kiểm tra xem phần mở rộng có được phép không
-    if file_extension not in settings.ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Loại file không được phép. Các loại file được phép: {settings.ALLOWED_EXTENSIONS}"
-        )
-
-    # Tạo thư mục upload nếu chưa tồn tại
-    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-
-    # Lưu file vào thư mục uploads
-    file_path = os.path.join(settings.UPLOAD_DIR, file.filename)
-    try:
-        # Sử dụng aiofiles để ghi file bất đồng bộ
-        async with aiofiles.open(file_path, "wb") as buffer:
-            # Đọc nội dung file
-            content = await file.read()
-            # Ghi nội dung file vào đường dẫn đã chỉ định
-            await buffer.write(content)
-
-        # Xử lý file và trích xuất nội dung văn bản
-        extracted_text = await process_file(file_path, file_extension)
-
-        # Ghi nội dung văn bản đã trích xuất vào file .txt trong thư mục uploads
-        text_file_path = os.path.join(settings.UPLOAD_DIR, file.filename + ".txt")
-        async with aiofiles.open(text_file_path, "w", encoding="utf-8") as text_file:
-            await text_file.write(extracted_text)
-
-        # Chuyển đổi nội dung văn bản đã trích xuất thành vector (phù hợp cho mô hình)
-        vector_data = await convert_text_to_vector(extracted_text)
-
-        # Lưu dữ liệu vector vào file .vector
-        vector_file_path = os.path.join(settings.UPLOAD_DIR, file.filename + ".vector")
-        async with aiofiles.open(vector_file_path, "wb") as vector_file:
-            await vector_file.write(vector_data)
-
-        # Trả về thông tin file đã upload
-        return FileResponse(
-            filename=file.filename,
-            content_type=file.content_type,
-            text_content=extracted_text
-        )
-    except Exception as e:
-        # Xóa file đã upload nếu có lỗi xảy ra
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        # Ném lỗi HTTPException với thông tin chi tiết
-        raise HTTPException(
-            status_code=500,
-            detail=f"Không thể lưu file: {str(e)}"
-        )
-
-@router.get("/files", response_model=List[FileInfo])
-async def list_files():
-    """
-    Liệt kê danh sách file trong thư mục upload một cách bất đồng bộ, lọc bỏ các file đã xử lý
-    và đảm bảo các file liên quan cần thiết tồn tại.
-
-    Hàm này quét thư mục được chỉ định trong `settings.UPLOAD_DIR` và thu thập thông tin
-    về các file đáp ứng các tiêu chí sau:
-    - File không có phần mở rộng `.vector`.
-    - File có các file liên quan `.txt` và `.vector` trong cùng thư mục.
-
-    Danh sách file trả về được sắp xếp theo thời gian tải lên giảm dần.
-
-    Returns:
-        List[FileInfo]: Danh sách các đối tượng `FileInfo` chứa thông tin chi tiết về các file.
-
-    Raises:
-        HTTPException: Nếu xảy ra lỗi khi liệt kê file, trả về mã trạng thái 500
-        kèm thông báo lỗi chi tiết.
-
-    Lưu ý:
-        - Hàm này bỏ qua các file được coi là "đã xử lý" (ví dụ: các file có phần mở rộng `.vector`).
-        - Các file không có các file liên quan cần thiết `.txt` hoặc `.vector` sẽ bị bỏ qua.
-
-    Ví dụ:
-        >>> files = await list_files()
-        >>> for file in files:
-        >>>     print(file.filename, file.size, file.uploaded_at)
-
-    """
-    # Sử dụng để lưu trữ thông tin về các file hợp lệ.
-    files = []
-    try:
-        # Duyệt tất cả các file trong thư mục upload
-        for filename in os.listdir(settings.UPLOAD_DIR):
-            # Bỏ qua các file có phần mở rộng .vector, vì đây là các file đã được xử lý.
-            if not filename.endswith(('.vector')):
-                file_path = os.path.join(settings.UPLOAD_DIR, filename)
-                # Kiểm tra xem file hiện tại có các file liên quan .txt và .vector hay không
-                # - File .txt chứa nội dung văn bản đã trích xuất.
-                # - File .vector chứa dữ liệu vector hóa.
-                if not os.path.exists(file_path + ".txt")  or not os.path.exists(file_path + ".vector"):
-                    continue
-
-                # Nếu file hiện tại không phải là file đã xử lý, lấy thông tin về nó
-                stats = os.stat(file_path)
-                # Lưu trữ thông tin về file hợp lệ vào danh sách files
-                files.append(FileInfo(
-                    filename=filename,
-                    size=stats.st_size,
-                    uploaded_at=datetime.fromtimestamp(stats.st_mtime)
-                ))
-        # Sắp xếp danh sách file theo thời gian tải lên giảm dần (reverse=True),
-        # để các file mới nhất xuất hiện trước.
-        return sorted(files, key=lambda x: x.uploaded_at, reverse=True)
-    except Exception as e:
-        # Nếu xảy ra lỗi trong quá trình quét thư mục hoặc xử lý file, trả về lỗi
-        # HTTP 500 với thông báo chi tiết.
-        raise HTTPException(
-            status_code=500,
-            detail=f"Could not list files: {str(e)}"
-        )
-
-@router.delete("/files/{filename}")
-async def delete_file(filename: str):
-    """
-    Xóa một tệp tin và các tệp liên quan dựa trên tên tệp được cung cấp.
-    Hàm này kiểm tra sự tồn tại của tệp trong thư mục tải lên, sau đó xóa tệp chính
-    và các tệp liên quan (.txt và .vector). Nếu tệp không tồn tại hoặc xảy ra lỗi
-    trong quá trình xóa, một HTTPException sẽ được ném ra.
-    Args:
-        filename (str): Tên của tệp cần xóa.
-    Returns:
-        dict: Một thông báo xác nhận rằng tệp đã được xóa thành công.
-    Raises:
-        HTTPException:
-            - Nếu tệp không tồn tại (status_code=404).
-            - Nếu có lỗi trong quá trình xóa tệp (status_code=500).
-    """
-    try:
-        file_path = os.path.join(settings.UPLOAD_DIR, filename)
-
-        # Kiểm tra file có tồn tại không
-        if not os.path.exists(file_path):
-            raise HTTPException(
-                status_code=404,
-                detail=f"File {filename} not found"
-            )
-
-        # Xóa file
-        os.remove(file_path)
-        os.remove(file_path + ".txt")
-        os.remove(file_path + ".vector")
-
-        return {"message": f"File {filename} deleted successfully"}
-
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error deleting file: {str(e)}"
-        )
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+import aiofiles
+
+from fastapi import APIRouter, HTTPException, Query, Request, UploadFile, File
+from typing import Optional, Tuple
+from app.core import metrics
+from app.core.config import settings
+from app.api.endpoints.jobs import job_to_info
+from app.services.chunker import read_text_page
+from app.services.document_catalog import document_catalog
+from app.services.indexing_service import unindex_document
+from app.services.job_queue import job_queue
+from app.schemas.file import FileInfo, FileList, TextPage
+from app.schemas.job import JobInfo
+from datetime import datetime
+
+router = APIRouter()
+
+async def save_upload_file(file: UploadFile, destination: str) -> Tuple[int, str]:
+    """
+    Ghi file upload xuống đĩa theo từng khối có kích thước cố định (UPLOAD_CHUNK_SIZE).
+
+    Nội dung được ghi vào một file tạm và chỉ được đổi tên (atomic rename) thành `destination`
+    khi đã ghi xong, nên không bao giờ tồn tại một file upload ghi dở. Mã SHA-256 được tính
+    dần trong quá trình sao chép, bộ nhớ sử dụng chỉ phụ thuộc vào kích thước khối.
+
+    Args:
+        file (UploadFile): File được tải lên.
+        destination (str): Đường dẫn đích của file.
+
+    Returns:
+        Tuple[int, str]: Kích thước file (byte) và mã SHA-256 (hex) của nội dung.
+
+    Raises:
+        HTTPException: Nếu file vượt quá MAX_FILE_SIZE (mã trạng thái 413).
+    """
+    tmp_path = f"{destination}.{uuid.uuid4().hex}.part"
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as buffer:
+            while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                # Dừng ngay khi vượt quá giới hạn, không đọc phần còn lại của file
+                if size > settings.MAX_FILE_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File vượt quá kích thước cho phép ({settings.MAX_FILE_SIZE} bytes)"
+                    )
+                sha256.update(chunk)
+                await buffer.write(chunk)
+        os.replace(tmp_path, destination)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return size, sha256.hexdigest()
+
+@router.post("/upload", response_model=JobInfo, status_code=202)
+async def upload_file(
+    request: Request,
+    file: UploadFile = File(...),
+    priority: int = Query(0),
+):
+    """
+    Tiếp nhận một file upload và đưa vào hàng đợi xử lý.
+
+    Hàm này hỗ trợ các định dạng file cụ thể (ví dụ: DOCX, XLSX) và thực hiện các bước sau:
+    1. Kiểm tra phần mở rộng của file để đảm bảo được phép.
+    2. Lưu file đã tải lên vào thư mục chỉ định.
+    3. Tạo một tác vụ xử lý trong hàng đợi và trả về ngay mã tác vụ (202 Accepted).
+
+    Việc trích xuất nội dung, chia chunk, vector hóa và đánh chỉ mục được các worker của
+    hàng đợi thực hiện sau đó (xem `app.services.job_queue`). Dùng `GET /jobs/{job_id}`
+    để theo dõi tiến độ và lấy kết quả.
+
+    Args:
+        request (Request): Request HTTP, dùng để kiểm tra sớm header `Content-Length`.
+        file (UploadFile): File được tải lên. Đây là một đối tượng `UploadFile` của FastAPI.
+        priority (int): Độ ưu tiên của tác vụ, giá trị lớn hơn được xử lý trước.
+
+    Returns:
+        JobInfo: Thông tin tác vụ xử lý vừa được tạo.
+
+    Raises:
+        HTTPException: Nếu phần mở rộng của file không được phép (mã trạng thái 400),
+            hoặc file vượt quá kích thước cho phép (mã trạng thái 413).
+    """
+    # Từ chối sớm nếu kích thước request đã vượt quá giới hạn (cộng thêm phần header multipart)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.MAX_FILE_SIZE + 64 * 1024:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File vượt quá kích thước cho phép ({settings.MAX_FILE_SIZE} bytes)"
+        )
+
+    # Lấy phần mở rộng của file
+    file_extension = file.filename.split(".")[-1].lower()
+
+    # Kiểm tra xem phần mở rộng có được phép không
+    if file_extension not in settings.ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Loại file không được phép. Các loại file được phép: {settings.ALLOWED_EXTENSIONS}"
+        )
+
+    # Tạo thư mục upload nếu chưa tồn tại
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+
+    # Lưu file vào thư mục uploads
+    file_path = os.path.join(settings.UPLOAD_DIR, file.filename)
+    try:
+        # Ghi file theo từng khối (không đọc toàn bộ file vào bộ nhớ) và tính SHA-256
+        started = time.perf_counter()
+        size, sha256 = await save_upload_file(file, file_path)
+        elapsed = time.perf_counter() - started
+        metrics.UPLOAD_BYTES.inc(size)
+        if elapsed > 0:
+            metrics.UPLOAD_THROUGHPUT.observe(size / elapsed)
+
+        # Đưa file vào hàng đợi xử lý, trả về ngay sau khi file đã được lưu
+        job = await job_queue.enqueue(file.filename, file_extension, sha256, size, file.content_type, priority)
+        return await job_to_info(job)
+    except HTTPException:
+        # Lỗi đã được xác định (ví dụ: file quá lớn): file tạm đã được dọn dẹp,
+        # file đích chưa bị ghi đè nên giữ nguyên
+        raise
+    except Exception as e:
+        # Xóa file đã upload nếu có lỗi xảy ra
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        # Ném lỗi HTTPException với thông tin chi tiết
+        raise HTTPException(
+            status_code=500,
+            detail=f"Không thể lưu file: {str(e)}"
+        )
+
+@router.get("/files", response_model=FileList)
+async def list_files(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None),
+    status: Optional[str] = Query("ready"),
+    q: Optional[str] = Query(None),
+    uploaded_after: Optional[datetime] = Query(None),
+    uploaded_before: Optional[datetime] = Query(None),
+):
+    """
+    Liệt kê danh sách file đã upload từ danh mục tài liệu (bảng `documents` trong database),
+    không quét thư mục upload.
+
+    Danh sách được sắp xếp theo thời gian tải lên giảm dần và được phân trang theo con trỏ:
+    dùng `next_cursor` của trang trước làm tham số `cursor` để lấy trang tiếp theo.
+
+    Args:
+        limit (int): Số file tối đa của một trang (1..200).
+        cursor (Optional[str]): Con trỏ trả về từ trang trước.
+        status (Optional[str]): Lọc theo trạng thái xử lý (processing, ready, failed).
+            Mặc định chỉ lấy các file đã xử lý xong; truyền chuỗi rỗng để lấy tất cả.
+        q (Optional[str]): Lọc các file có tên chứa chuỗi này.
+        uploaded_after (Optional[datetime]): Chỉ lấy file tải lên sau thời điểm này.
+        uploaded_before (Optional[datetime]): Chỉ lấy file tải lên trước thời điểm này.
+
+    Returns:
+        FileList: Các file của trang hiện tại và con trỏ của trang tiếp theo.
+
+    Raises:
+        HTTPException: Nếu con trỏ không hợp lệ (mã trạng thái 400), hoặc xảy ra lỗi khi
+        đọc danh mục (mã trạng thái 500).
+
+    Ví dụ:
+        >>> page = await list_files(limit=20)
+        >>> for file in page.items:
+        >>>     print(file.filename, file.size, file.uploaded_at)
+    """
+    try:
+        documents, next_cursor = await asyncio.to_thread(
+            document_catalog.list,
+            limit,
+            cursor,
+            status or None,
+            q,
+            uploaded_after.timestamp() if uploaded_after else None,
+            uploaded_before.timestamp() if uploaded_before else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        # Nếu xảy ra lỗi khi đọc danh mục, trả về lỗi HTTP 500 với thông báo chi tiết.
+        raise HTTPException(
+            status_code=500,
+            detail=f"Could not list files: {str(e)}"
+        )
+
+    return FileList(
+        items=[
+            FileInfo(
+                filename=document.filename,
+                size=document.size,
+                uploaded_at=datetime.fromtimestamp(document.uploaded_at),
+                sha256=document.sha256,
+                status=document.status,
+                chunk_count=document.chunk_count
+            )
+            for document in documents
+        ],
+        next_cursor=next_cursor
+    )
+
+@router.get("/files/{filename}/text", response_model=TextPage)
+async def get_file_text(
+    filename: str,
+    offset: int = Query(0, ge=0),
+    length: int = Query(settings.TEXT_PAGE_SIZE, ge=1, le=settings.TEXT_PAGE_MAX_SIZE),
+):
+    """
+    Đọc một trang nội dung văn bản đã trích xuất của tệp, trực tiếp từ file `.txt` đã lưu
+    (chỉ đọc đoạn được yêu cầu, không nạp toàn bộ file).
+
+    `offset` và `length` tính theo byte UTF-8; ranh giới của trang được dời tới ranh giới
+    ký tự gần nhất. Dùng `next_offset` của trang trước làm `offset` để đọc trang tiếp theo.
+
+    Args:
+        filename (str): Tên của tệp.
+        offset (int): Vị trí byte bắt đầu của trang.
+        length (int): Kích thước của trang (byte, tối đa TEXT_PAGE_MAX_SIZE).
+
+    Returns:
+        TextPage: Nội dung của trang, vị trí của trang tiếp theo và kích thước toàn bộ văn bản.
+
+    Raises:
+        HTTPException: Nếu tệp không tồn tại hoặc chưa được xử lý xong (mã trạng thái 404).
+    """
+    text_path = os.path.join(settings.UPLOAD_DIR, filename + ".txt")
+    try:
+        text, start, next_offset, total_size = await asyncio.to_thread(read_text_page, text_path, offset, length)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Text of file {filename} not found")
+
+    return TextPage(
+        filename=filename,
+        offset=start,
+        next_offset=next_offset,
+        total_size=total_size,
+        text=text
+    )
+
+@router.delete("/files/{filename}")
+async def delete_file(filename: str):
+    """
+    Xóa một tệp tin và các tệp liên quan dựa trên tên tệp được cung cấp.
+    Hàm này xóa tệp khỏi danh mục tài liệu, sau đó xóa tệp chính trong thư mục tải lên
+    và các tệp liên quan (.txt, .chunks và .vector). Nếu tệp không tồn tại hoặc xảy ra lỗi
+    trong quá trình xóa, một HTTPException sẽ được ném ra.
+    Args:
+        filename (str): Tên của tệp cần xóa.
+    Returns:
+        dict: Một thông báo xác nhận rằng tệp đã được xóa thành công.
+    Raises:
+        HTTPException:
+            - Nếu tệp không tồn tại (status_code=404).
+            - Nếu có lỗi trong quá trình xóa tệp (status_code=500).
+    """
+    try:
+        file_path = os.path.join(settings.UPLOAD_DIR, filename)
+
+        # Xóa tài liệu khỏi danh mục trước, để tài liệu không còn xuất hiện trong danh sách
+        # ngay cả khi việc xóa file bên dưới bị gián đoạn
+        removed = await asyncio.to_thread(document_catalog.remove, filename)
+
+        # Kiểm tra file có tồn tại không
+        if not removed and not os.path.exists(file_path):
+            raise HTTPException(
+                status_code=404,
+                detail=f"File {filename} not found"
+            )
+
+        # Xóa file
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+        # Xóa tài liệu khỏi các chỉ mục và xóa các file .txt, .chunks, .vector
+        await unindex_document(filename)
+
+        return {"message": f"File {filename} deleted successfully"}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error deleting file: {str(e)}"
+        )
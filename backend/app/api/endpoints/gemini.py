@@ -1,25 +1,125 @@
-import google.generativeai as genai
-
-from fastapi import APIRouter, Query
-from app.schemas.gemini import DataRequest, DataResponse
-from app.services.gemini_service import send_async
-
-router = APIRouter()
-
-@router.get("/gemini", response_model=DataResponse)
-def get_gemini_response(prompt: str = Query(...)):
-    """
-    Gửi yêu cầu đến mô hình Gemini và nhận phản hồi.
-
-    Args:
-        prompt (str): Chuỗi đầu vào để gửi đến mô hình Gemini.
-
-    Returns:
-        str: Phản hồi từ mô hình Gemini.
-    """
-    try:
-        print(f"Prompt: {prompt}")
-        # Gọi hàm send_async để gửi yêu cầu đến mô hình Gemini
-        return DataResponse(response=send_async(prompt))
-    except Exception as e:
-        raise Exception(f"Error generating response from Gemini: {str(e)}")
\ No newline at end of file
+import json
+
+from contextlib import aclosing
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from app.schemas.gemini import DataRequest, DataResponse
+from app.services.gemini_service import GeminiTimeout, admission, breaker, send_async, stream_async
+from app.services.llm_cache import llm_cache
+from app.services.resilience import Overloaded
+
+router = APIRouter()
+
+@router.get("/gemini", response_model=DataResponse)
+async def get_gemini_response(request: Request, prompt: str = Query(...), cache: Optional[bool] = Query(None)):
+    """
+    Gửi yêu cầu đến mô hình Gemini và nhận phản hồi.
+
+    Args:
+        request (Request): Request HTTP, địa chỉ của client dùng cho giới hạn tốc độ theo client.
+        prompt (str): Chuỗi đầu vào để gửi đến mô hình Gemini.
+        cache (Optional[bool]): Dùng cache phản hồi (mặc định chỉ khi temperature bằng 0).
+
+    Returns:
+        str: Phản hồi từ mô hình Gemini.
+
+    Raises:
+        HTTPException: Nếu client vượt giới hạn tốc độ (mã trạng thái 429), Gemini quá tải
+            hoặc không hoạt động (mã trạng thái 503, kèm header `Retry-After`), Gemini không
+            phản hồi kịp thời hạn (mã trạng thái 504) hoặc xảy ra lỗi khác (mã trạng thái 500).
+    """
+    try:
+        print(f"Prompt: {prompt}")
+        # Gọi hàm send_async để gửi yêu cầu đến mô hình Gemini
+        return DataResponse(response=await send_async(prompt, cache=cache, client=_client(request)))
+    except GeminiTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating response from Gemini: {str(e)}")
+
+
+@router.get("/gemini/stream")
+async def stream_gemini_response(request: Request, prompt: str = Query(...), cache: Optional[bool] = Query(None)):
+    """
+    Gửi yêu cầu đến mô hình Gemini và trả về phản hồi dạng Server-Sent Events (SSE).
+
+    Mỗi đoạn câu trả lời được gửi ngay khi Gemini sinh ra trong một event
+    `data: {"response": "..."}`, kết thúc bằng `event: done` (hoặc `event: error`
+    nếu có lỗi). Đoạn tiếp theo chỉ được đọc từ Gemini khi đoạn trước đã được gửi đi,
+    nên client chậm không làm bộ đệm tăng không giới hạn.
+
+    Response chỉ được bắt đầu khi có đoạn đầu tiên, để request bị từ chối do quá tải nhận
+    được mã trạng thái 429/503 và header `Retry-After` thay vì một luồng SSE lỗi.
+
+    Args:
+        request (Request): Request HTTP, địa chỉ của client dùng cho giới hạn tốc độ theo client.
+        prompt (str): Chuỗi đầu vào để gửi đến mô hình Gemini.
+        cache (Optional[bool]): Dùng cache phản hồi (mặc định chỉ khi temperature bằng 0).
+
+    Returns:
+        StreamingResponse: Luồng SSE chứa các đoạn phản hồi từ Gemini.
+
+    Raises:
+        HTTPException: Nếu request bị từ chối do quá tải (mã trạng thái 429 hoặc 503).
+    """
+    chunks = stream_async(prompt, cache=cache, client=_client(request))
+    first, error = None, None
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        pass
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+    except Exception as e:
+        error = e
+
+    async def event_stream():
+        if error is not None:
+            yield f"event: error\ndata: {json.dumps({'detail': str(error)}, ensure_ascii=False)}\n\n"
+            return
+        try:
+            async with aclosing(chunks):
+                if first is not None:
+                    yield f"data: {json.dumps({'response': first}, ensure_ascii=False)}\n\n"
+                async for chunk in chunks:
+                    yield f"data: {json.dumps({'response': chunk}, ensure_ascii=False)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/gemini/cache/stats")
+async def get_gemini_cache_stats():
+    """
+    Trả về các bộ đếm hit/miss của cache phản hồi Gemini (của worker xử lý request),
+    dùng để điều chỉnh thời gian sống (TTL) của cache.
+    """
+    return llm_cache.stats()
+
+
+@router.get("/gemini/status")
+async def get_gemini_status():
+    """
+    Trả về trạng thái kiểm soát tải của Gemini (của worker xử lý request): trạng thái
+    circuit breaker, giới hạn tốc độ hiện tại (tự điều chỉnh) và số request đang chờ,
+    dùng làm tín hiệu tải cho bộ cân bằng tải hoặc autoscaler.
+    """
+    return {
+        "circuit": breaker.state,
+        "retry_after": breaker.retry_after(),
+        "rate_limit": admission.rate,
+        "queue_length": admission.queue_length,
+        "max_queue": admission.max_queue,
+    }
+
+def _client(request: Request) -> Optional[str]:
+    return request.client.host if request.client else None
@@ -0,0 +1,80 @@
+import os
+import asyncio
+import aiofiles
+
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query
+from app.core.config import settings
+from app.models.job import IngestionJob
+from app.schemas.file import FileResponse
+from app.schemas.job import JobInfo
+from app.services.chunker import read_text_page
+from app.services.job_queue import job_queue
+
+router = APIRouter()
+
+# Nội dung văn bản kèm theo kết quả của tác vụ: toàn bộ, chỉ phần đầu, hoặc không có
+TEXT_MODES = "^(full|preview|none)$"
+
+async def job_to_info(job: IngestionJob, text: str = "full") -> JobInfo:
+    """
+    Chuyển một tác vụ trong database thành `JobInfo`. Khi tác vụ đã hoàn tất,
+    kèm theo kết quả xử lý và nội dung văn bản đã trích xuất theo `text`:
+
+    - "full": toàn bộ nội dung (`text_content`).
+    - "preview": chỉ `TEXT_PREVIEW_SIZE` byte đầu tiên (`text_preview`), đọc mà không nạp
+      toàn bộ file; phần còn lại đọc theo trang qua `GET /files/{filename}/text`.
+    - "none": chỉ thông tin của tệp.
+    """
+    result = None
+    if job.status == "done":
+        text_path = os.path.join(settings.UPLOAD_DIR, job.filename + ".txt")
+        if os.path.exists(text_path):
+            result = FileResponse(
+                filename=job.filename,
+                content_type=job.content_type or "application/octet-stream",
+                text_size=os.path.getsize(text_path),
+                sha256=job.sha256
+            )
+            if text == "full":
+                async with aiofiles.open(text_path, "r", encoding="utf-8", newline="") as text_file:
+                    result.text_content = await text_file.read()
+            elif text == "preview":
+                result.text_preview, *_ = await asyncio.to_thread(
+                    read_text_page, text_path, 0, settings.TEXT_PREVIEW_SIZE
+                )
+
+    return JobInfo(
+        job_id=job.id,
+        filename=job.filename,
+        status=job.status,
+        stage=job.stage,
+        progress=job.progress,
+        attempts=job.attempts,
+        error=job.error,
+        created_at=datetime.fromtimestamp(job.created_at),
+        updated_at=datetime.fromtimestamp(job.updated_at),
+        result=result
+    )
+
+@router.get("/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str, text: str = Query("full", pattern=TEXT_MODES)):
+    """
+    Lấy trạng thái và tiến độ của một tác vụ xử lý file.
+
+    Args:
+        job_id (str): Mã tác vụ được trả về khi upload file.
+        text (str): Nội dung văn bản kèm theo khi tác vụ hoàn tất: "full" (mặc định),
+            "preview" (chỉ phần đầu) hoặc "none".
+
+    Returns:
+        JobInfo: Trạng thái, bước đang thực hiện và tiến độ của tác vụ. Khi tác vụ hoàn tất,
+        kèm theo nội dung văn bản đã trích xuất.
+
+    Raises:
+        HTTPException: Nếu không tìm thấy tác vụ (mã trạng thái 404).
+    """
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return await job_to_info(job, text)
@@ -1,47 +1,217 @@
-import os
-
-from pydantic_settings import BaseSettings
-from typing import Optional
-
-class Settings(BaseSettings):
-  """
-  Application configuration settings.
-  """
-  # Project metadata
-  PROJECT_NAME: str = "Document Processing API"
-  VERSION: str = "1.0.0"
-  API_V1_STR: str = "/api/v1"
-
-  # Secret key for signing tokens or sensitive data
-  SECRET_KEY: str = "Secret key"
-
-  # Google API key for external services
-  GOOGLE_API_KEY: str = "API KEY"
-
-  # Token expiration time (in minutes), default is 8 days
-  ACESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
-
-  # Static folder configuration
-  WEB_FOLDER: str = "https://fantastic-space-acorn-9j4jjgrrq94cprpj-8000.app.github.dev"  # Path to the static web folder
-
-  # Database configuration
-  DATABASE_URL: str = "sqlite:///./sql_app.db"  # Database connection URL
-
-  # CORS (Cross-Origin Resource Sharing) settings
-  BACKEND_CORS_ORIGINS: list = ["*"]  # Allowed origins for CORS requests
-
-  # Directory for uploaded files
-  UPLOAD_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
-
-  # Maximum file size for uploads (10MB)
-  MAX_FILE_SIZE: int = 10 * 1024 * 1024
-
-  # Allowed file extensions for uploads
-  ALLOWED_EXTENSIONS: set = {"pdf", "docx", "pptx", "xlsx", "csv", "txt"}
-
-  class Config:
-    case_sensitive = True  # Enforce case sensitivity for environment variables
-    env_file = ".env"  # Path to the environment file
-    env_file_encoding = "utf-8"  # Encoding for the environment file
-
+import os
+
+from pydantic_settings import BaseSettings
+from typing import Optional
+
+class Settings(BaseSettings):
+  """
+  Application configuration settings.
+  """
+  # Project metadata
+  PROJECT_NAME: str = "Document Processing API"
+  VERSION: str = "1.0.0"
+  API_V1_STR: str = "/api/v1"
+
+  # Secret key for signing tokens or sensitive data
+  SECRET_KEY: str = "Secret key"
+
+  # Google API key for external services
+  GOOGLE_API_KEY: str = "API KEY"
+
+  # Gemini client: max concurrent in-flight requests per worker and per-call deadline (seconds)
+  GEMINI_MAX_CONCURRENCY: int = 64
+  GEMINI_TIMEOUT: float = 60
+
+  # Deadline (seconds) of a chat message, from retrieval to the end of the answer; Gemini
+  # calls are given whatever is left of it
+  CHAT_TIMEOUT: float = 90
+
+  # Gemini admission control, per worker (0 disables a limit): token bucket for all calls,
+  # halved whenever Gemini rate-limits us and recovering on success, and one per client (IP)
+  GEMINI_RATE_LIMIT: float = 30  # Requests per second
+  GEMINI_RATE_BURST: int = 60
+  GEMINI_CLIENT_RATE_LIMIT: float = 2
+  GEMINI_CLIENT_RATE_BURST: int = 10
+  GEMINI_MAX_QUEUE: int = 256  # Calls allowed to wait for a token or a concurrency slot
+
+  # Retries of transient Gemini errors (429, 5xx, timeouts) with exponential backoff and
+  # full jitter, within the call deadline
+  GEMINI_RETRY_ATTEMPTS: int = 3
+  GEMINI_RETRY_BASE_DELAY: float = 0.5
+  GEMINI_RETRY_MAX_DELAY: float = 8
+
+  # Circuit breaker: after GEMINI_BREAKER_FAILURES consecutive failures, Gemini calls fail
+  # fast (HTTP 503 + Retry-After) for GEMINI_BREAKER_RESET seconds, then one probe call is let through
+  GEMINI_BREAKER_FAILURES: int = 5
+  GEMINI_BREAKER_RESET: float = 30
+
+  # Coalesce identical concurrent retrievals and Gemini calls into a single in-flight call
+  SINGLE_FLIGHT_ENABLED: bool = True
+
+  # Model behind gemini_service: "live" (Gemini API), "fake" (local stand-in),
+  # "record" (live, responses appended to GEMINI_RECORDINGS_PATH) or "replay"
+  # (recorded responses only, with the recorded chunk timing if GEMINI_REPLAY_TIMING)
+  GEMINI_BACKEND: str = "live"
+  GEMINI_RECORDINGS_PATH: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "gemini_recordings.jsonl")
+  GEMINI_REPLAY_TIMING: bool = False
+
+  # Fake Gemini backend: latency to the first chunk (mean/jitter in ms, distribution:
+  # fixed, uniform, normal, lognormal, exponential), streaming rate, answer length,
+  # fraction of failing requests and RNG seed (None = non-deterministic)
+  GEMINI_FAKE_LATENCY_MS: float = 300
+  GEMINI_FAKE_LATENCY_JITTER_MS: float = 100
+  GEMINI_FAKE_LATENCY_DISTRIBUTION: str = "lognormal"
+  GEMINI_FAKE_TOKENS_PER_SECOND: float = 200
+  GEMINI_FAKE_RESPONSE_TOKENS: int = 120
+  GEMINI_FAKE_ERROR_RATE: float = 0.0
+  GEMINI_FAKE_SEED: Optional[int] = None
+
+  # Gemini response cache: in-memory LRU size, time-to-live (seconds) of cached responses
+  # and interval (seconds) between deletions of expired responses from the database
+  LLM_CACHE_MAX_ENTRIES: int = 1024
+  LLM_CACHE_TTL: float = 24 * 60 * 60
+  LLM_CACHE_PURGE_INTERVAL: float = 60 * 60
+
+  # Token expiration time (in minutes), default is 8 days
+  ACESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
+
+  # Static folder configuration
+  WEB_FOLDER: str = "https://fantastic-space-acorn-9j4jjgrrq94cprpj-8000.app.github.dev"  # Path to the static web folder
+
+  # Frontend build served from memory: scanned once at startup, text files precompressed
+  # (gzip, and brotli when the `brotli` package is installed); larger files stay on disk
+  STATIC_MAX_CACHED_FILE_SIZE: int = 10 * 1024 * 1024
+  STATIC_GZIP_LEVEL: int = 9
+  STATIC_BROTLI_QUALITY: int = 11
+
+  # Database configuration
+  DATABASE_URL: str = "sqlite:///./sql_app.db"  # Database connection URL
+
+  # CORS (Cross-Origin Resource Sharing) settings
+  BACKEND_CORS_ORIGINS: list = ["*"]  # Allowed origins for CORS requests
+
+  # Directory for uploaded files
+  UPLOAD_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
+
+  # Content-addressed store of extraction results, shared by duplicate uploads
+  CONTENT_STORE_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "content_store")
+
+  # Directory for retrieval indexes (BM25 inverted index, ...)
+  INDEX_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "index")
+
+  # Dimension of the document embeddings stored in .vector files
+  EMBEDDING_DIM: int = 1024
+
+  # Vector search: storage type of the embeddings in the index segments ("float32",
+  # "float16" or "int8" with a scale per vector; float16 is more precise than int8 but slower
+  # to scan), and IVF approximate search in segments of at least VECTOR_IVF_MIN_SIZE vectors
+  # (0 disables it; keep it off with the hashed bag-of-words embeddings, on which IVF recall is
+  # below 0.2 until it scans as many vectors as an exact search, see benchmarks/ann.py):
+  # number of k-means lists (0: about sqrt(n)) and number of lists scanned per query
+  # (higher: better recall, slower queries)
+  VECTOR_QUANTIZATION: str = "int8"
+  VECTOR_IVF_MIN_SIZE: int = 0
+  VECTOR_IVF_NLIST: int = 0
+  VECTOR_IVF_NPROBE: int = 16
+
+  # Retrieval index segments (under INDEX_DIR/segments): the smallest segments are merged
+  # once there are more than INDEX_MAX_SEGMENTS of them
+  INDEX_MAX_SEGMENTS: int = 8
+
+  # Chunking of extracted text: max characters per chunk and overlap between chunks
+  CHUNK_SIZE: int = 1000
+  CHUNK_OVERLAP: int = 200
+
+  # Number of chunks returned by retrieval for each chat message
+  RETRIEVAL_TOP_K: int = 3
+
+  # Process pool used to extract text from uploaded documents
+  EXTRACTION_WORKERS: int = max(1, (os.cpu_count() or 2) // 2)
+  EXTRACTION_MAX_QUEUE: int = 32  # Jobs allowed to wait for a free worker
+  EXTRACTION_TIMEOUT: float = 300  # Seconds an extraction job may run (queue wait excluded) before it is aborted
+  EXTRACTION_MAX_TASKS_PER_WORKER: int = 50  # Recycle workers to contain parser memory leaks
+
+  # OCR fallback for scanned PDFs: pages with fewer than OCR_MIN_PAGE_CHARS characters in
+  # their text layer are rasterized in grayscale at OCR_DPI (lowered so a page never exceeds
+  # OCR_MAX_PIXELS pixels, i.e. bytes of image memory) and recognized by tesseract in the
+  # extraction pool, one task per page and OCR_CONCURRENCY pages of a document at a time
+  # (0: one per extraction worker). OCR_PAGE_TIMEOUT bounds tesseract on one page (seconds).
+  # Recognized pages are cached by content hash under CONTENT_STORE_DIR/ocr
+  OCR_ENABLED: bool = True
+  OCR_LANGUAGES: str = "eng"  # tesseract language codes, e.g. "vie+eng"
+  OCR_MIN_PAGE_CHARS: int = 16
+  OCR_DPI: int = 300
+  OCR_MAX_PIXELS: int = 16_000_000
+  OCR_CONCURRENCY: int = 0
+  OCR_PAGE_TIMEOUT: float = 120
+
+  # Ingestion job queue: concurrent jobs per process, polling interval (seconds),
+  # attempts per job, base retry delay (seconds, doubled on each attempt) and the time
+  # after which a running job whose worker died is handed to another worker (or marked
+  # failed once it has used all its attempts)
+  JOB_WORKERS: int = 2
+  JOB_POLL_INTERVAL: float = 1.0
+  JOB_MAX_ATTEMPTS: int = 3
+  JOB_RETRY_BACKOFF: float = 2.0
+  JOB_LEASE_TIMEOUT: float = 900
+
+  # Chat WebSocket sessions: messages answered concurrently per connection, frames buffered
+  # per connection before a slow client is disconnected, seconds of inactivity before a
+  # ping is sent and without any frame (pong included) before the connection is closed,
+  # and seconds given to in-flight answers when draining on shutdown. A drained worker
+  # accepts sessions again after WS_DRAIN_EXPIRY seconds (0 keeps it drained until
+  # /admin/undrain is called or it restarts)
+  WS_MAX_IN_FLIGHT: int = 4
+  WS_SEND_QUEUE_SIZE: int = 256
+  WS_HEARTBEAT_INTERVAL: float = 25
+  WS_HEARTBEAT_TIMEOUT: float = 75
+  WS_DRAIN_TIMEOUT: float = 30
+  WS_DRAIN_EXPIRY: float = 5 * 60
+
+  # Import the format loaders, the embedding vectorizer and the Gemini client during
+  # startup instead of on the first request (slower boot, no slow first request)
+  WARMUP_ON_STARTUP: bool = False
+
+  # Path of the Prometheus metrics endpoint (set PROMETHEUS_MULTIPROC_DIR to aggregate
+  # the metrics of several uvicorn workers)
+  METRICS_PATH: str = "/metrics"
+
+  # Sampling profiler for individual requests: a request is profiled when its X-Profile
+  # header equals PROFILER_TOKEN (which also guards the /admin/profiles endpoints) or at
+  # random with probability PROFILER_SAMPLE_RATE. Stack sampling interval (seconds), longest
+  # profiled duration (seconds) and the ring buffer of saved profiles (count and total bytes)
+  PROFILER_ENABLED: bool = False
+  PROFILER_TOKEN: Optional[str] = None
+  PROFILER_SAMPLE_RATE: float = 0.0
+  PROFILER_INTERVAL: float = 0.005
+  PROFILER_MAX_DURATION: float = 300
+  PROFILER_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "profiles")
+  PROFILER_MAX_PROFILES: int = 200
+  PROFILER_MAX_BYTES: int = 50 * 1024 * 1024
+
+  # Token expected in the X-Admin-Token header by the /admin operations (drain, undrain, ...);
+  # None disables them
+  ADMIN_TOKEN: Optional[str] = None
+
+  # Maximum file size for uploads (10MB)
+  MAX_FILE_SIZE: int = 10 * 1024 * 1024
+
+  # Size of the blocks used to stream uploads to disk (1MB)
+  UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+
+  # Extracted text returned with a finished job: size (bytes) of the preview returned with
+  # `?text=preview` (kept small enough to be sent back as a Gemini prompt in a URL), and
+  # default/maximum page size (bytes) of GET /files/{filename}/text
+  TEXT_PREVIEW_SIZE: int = 4096
+  TEXT_PAGE_SIZE: int = 64 * 1024
+  TEXT_PAGE_MAX_SIZE: int = 1024 * 1024
+
+  # Allowed file extensions for uploads
+  ALLOWED_EXTENSIONS: set = {"pdf", "docx", "pptx", "xlsx", "csv", "txt"}
+
+  class Config:
+    case_sensitive = True  # Enforce case sensitivity for environment variables
+    env_file = ".env"  # Path to the environment file
+    env_file_encoding = "utf-8"  # Encoding for the environment file
+
 settings = Settings()
\ No newline at end of file
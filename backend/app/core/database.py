@@ -0,0 +1,39 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import declarative_base, sessionmaker
+from app.core.config import settings
+
+# SQLite cần `check_same_thread=False` vì session được dùng trong thread pool (asyncio.to_thread)
+connect_args = {"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
+
+engine = create_engine(settings.DATABASE_URL, connect_args=connect_args, pool_pre_ping=True)
+
+if settings.DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragma(dbapi_connection, connection_record):
+        """
+        Bật chế độ WAL để nhiều worker uvicorn có thể đọc/ghi cùng một file SQLite
+        mà không chặn nhau, và chờ thay vì báo lỗi ngay khi database đang bị khóa.
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
+SessionLocal = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+Base = declarative_base()
+
+def init_db() -> None:
+    """
+    Tạo các bảng chưa tồn tại trong database.
+    """
+    # Import các model để chúng được đăng ký với Base.metadata
+    from app.models import document, job, llm_cache  # noqa: F401
+    try:
+        Base.metadata.create_all(bind=engine)
+    except OperationalError:
+        # Nhiều worker uvicorn khởi động cùng lúc: worker khác vừa tạo bảng
+        # giữa lúc kiểm tra và lúc tạo, chạy lại để bỏ qua các bảng đã có
+        Base.metadata.create_all(bind=engine)
@@ -0,0 +1,174 @@
+import time
+import asyncio
+import contextvars
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Optional
+from starlette.requests import Request
+from app.core import metrics
+
+# Thời hạn và trạng thái hủy của request hiện tại (một request HTTP `/chat` hoặc một tin
+# nhắn WebSocket), truyền ngầm qua ContextVar từ endpoint xuống truy xuất ngữ cảnh và
+# client Gemini. ContextVar được sao chép sang các task con và các hàm chạy bằng
+# `asyncio.to_thread`, nên `check()` dùng được cả trong luồng khác.
+
+class DeadlineExceeded(Exception):
+    """
+    Ngoại lệ khi request vượt quá thời hạn cho phép.
+    """
+
+class RequestCancelled(Exception):
+    """
+    Ngoại lệ khi request bị hủy trước khi hoàn tất (ví dụ client ngắt kết nối).
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(f"Request cancelled ({reason})")
+        self.reason = reason
+
+class RequestContext:
+    """
+    Thời hạn, lý do hủy (nếu có) và bước đang thực hiện của một request.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout
+        self.stage = "start"
+        self.cancelled: Optional[str] = None
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def cancel(self, reason: str) -> None:
+        if self.cancelled is None:
+            self.cancelled = reason
+
+    def check(self) -> None:
+        """
+        Dừng sớm nếu request đã bị hủy hoặc đã hết thời hạn.
+
+        Raises:
+            RequestCancelled: Nếu request đã bị hủy.
+            DeadlineExceeded: Nếu request đã hết thời hạn.
+        """
+        if self.cancelled is not None:
+            raise RequestCancelled(self.cancelled)
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"Request deadline of {self.timeout} seconds exceeded")
+
+_current: contextvars.ContextVar[Optional[RequestContext]] = contextvars.ContextVar("request_context", default=None)
+
+def current() -> Optional[RequestContext]:
+    """
+    Ngữ cảnh của request hiện tại, None nếu không nằm trong `request_scope`.
+    """
+    return _current.get()
+
+def check() -> None:
+    """
+    Dừng sớm nếu request hiện tại đã bị hủy hoặc đã hết thời hạn (không làm gì nếu
+    không nằm trong `request_scope`).
+    """
+    context = _current.get()
+    if context is not None:
+        context.check()
+
+def stage(name: str) -> None:
+    """
+    Ghi nhận bước đang thực hiện của request hiện tại (retrieval, generation, ...),
+    dùng làm nhãn của chỉ số khi request bị hủy.
+    """
+    context = _current.get()
+    if context is not None:
+        context.stage = name
+
+def limit(timeout: float) -> float:
+    """
+    Thời gian chờ tối đa cho một thao tác: `timeout`, nhưng không vượt quá thời gian
+    còn lại của request hiện tại.
+
+    Raises:
+        DeadlineExceeded: Nếu request đã hết thời hạn.
+    """
+    context = _current.get()
+    if context is None:
+        return timeout
+    context.check()
+    return min(timeout, context.remaining())
+
+def detached_context() -> contextvars.Context:
+    """
+    Bản sao ngữ cảnh hiện tại nhưng không thuộc request nào, cho công việc dùng chung
+    giữa nhiều request (xem `app.services.single_flight`): thời hạn và việc hủy của
+    request đã khởi chạy nó không áp dụng cho công việc đó.
+    """
+    context = contextvars.copy_context()
+    context.run(_current.set, None)
+    return context
+
+@asynccontextmanager
+async def request_scope(timeout: float, transport: str) -> AsyncIterator[RequestContext]:
+    """
+    Chạy khối lệnh bên trong với thời hạn `timeout` giây: khi hết hạn, công việc đang chờ
+    (truy xuất, Gemini) bị hủy và `DeadlineExceeded` được ném ra. Các request bị hủy hoặc
+    hết hạn được đếm trong `metrics.CHAT_CANCELLED` theo lý do và bước đang thực hiện.
+
+    Task bị hủy bằng `task.cancel(reason)` sẽ được ghi nhận với lý do `reason`
+    (ví dụ "disconnect", "client_cancel").
+    """
+    context = RequestContext(timeout)
+    token = _current.set(context)
+    timer = asyncio.timeout(timeout)
+    try:
+        async with timer:
+            yield context
+    except TimeoutError:
+        if not timer.expired():
+            raise
+        context.cancel("deadline")
+        raise DeadlineExceeded(f"Request deadline of {timeout} seconds exceeded")
+    except DeadlineExceeded:
+        context.cancel("deadline")
+        raise
+    except RequestCancelled as e:
+        context.cancel(e.reason)
+        raise
+    except asyncio.CancelledError as e:
+        # Các hàm còn chạy trong luồng khác thấy được lý do hủy qua `check()`
+        context.cancel(str(e.args[0]) if e.args and e.args[0] else "cancelled")
+        raise
+    finally:
+        _current.reset(token)
+        if context.cancelled is not None:
+            metrics.CHAT_CANCELLED.labels(transport, context.cancelled, context.stage).inc()
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[Any]) -> Any:
+    """
+    Chờ `awaitable`, và hủy nó ngay khi client HTTP ngắt kết nối.
+
+    Chỉ dùng sau khi body của request đã được đọc hết (ví dụ tham số body của FastAPI),
+    vì thông điệp tiếp theo từ server ASGI chỉ có thể là `http.disconnect`.
+
+    Raises:
+        RequestCancelled: Nếu client ngắt kết nối trước khi có kết quả.
+    """
+    work = asyncio.ensure_future(awaitable)
+
+    async def wait_for_disconnect() -> None:
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        work.cancel()
+        raise
+    finally:
+        watcher.cancel()
+
+    if work.done():
+        return work.result()
+    work.cancel("disconnect")
+    raise RequestCancelled("disconnect")
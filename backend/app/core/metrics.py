@@ -0,0 +1,197 @@
+import os
+import time
+import asyncio
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Các chỉ số (metrics) của ứng dụng, xuất ra ở `/metrics` theo định dạng văn bản của Prometheus.
+#
+# Khi chạy nhiều worker uvicorn, đặt biến môi trường `PROMETHEUS_MULTIPROC_DIR` tới một thư mục
+# trống trước khi khởi động: mỗi worker ghi giá trị vào file riêng trong thư mục đó và
+# `/metrics` (ở bất kỳ worker nào) trả về giá trị đã gộp của tất cả các worker.
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+_GEMINI_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60, 90)
+_THROUGHPUT_BUCKETS = tuple(2 ** i * 64 * 1024 for i in range(15))  # 64 KB/s .. 1 GB/s
+
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served",
+    multiprocess_mode="livesum",
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request duration (until the response is fully sent)",
+    ["method", "route", "status"], buckets=_LATENCY_BUCKETS,
+)
+WEBSOCKETS_OPEN = Gauge(
+    "websocket_connections_open", "Open WebSocket connections",
+    multiprocess_mode="livesum",
+)
+WEBSOCKET_EVICTIONS = Counter(
+    "websocket_evictions_total", "WebSocket connections closed by the server",
+    ["reason"],
+)
+
+UPLOAD_BYTES = Counter("upload_bytes_total", "Bytes received by file uploads")
+UPLOAD_THROUGHPUT = Histogram(
+    "upload_throughput_bytes_per_second", "Throughput of streaming an upload to disk",
+    buckets=_THROUGHPUT_BUCKETS,
+)
+
+EXTRACTION_DURATION = Histogram(
+    "extraction_duration_seconds", "Text extraction time in process_file (including queueing)",
+    ["format", "outcome"], buckets=_LATENCY_BUCKETS,
+)
+EXTRACTION_QUEUE_DEPTH = Gauge(
+    "extraction_queue_depth", "Extraction jobs running or waiting in the process pool",
+    multiprocess_mode="livesum",
+)
+OCR_PAGES = Counter(
+    "ocr_pages_total", "Scanned PDF pages, by outcome (ocr, cached, error)",
+    ["outcome"],
+)
+OCR_PAGE_DURATION = Histogram(
+    "ocr_page_duration_seconds", "Time to rasterize and recognize one scanned PDF page (including queueing)",
+    buckets=_LATENCY_BUCKETS,
+)
+VECTORIZE_DURATION = Histogram(
+    "vectorize_duration_seconds", "Time to embed the chunks of a document",
+    buckets=_LATENCY_BUCKETS,
+)
+RETRIEVAL_DURATION = Histogram(
+    "retrieval_duration_seconds", "Time to retrieve the context of a chat message",
+    buckets=_LATENCY_BUCKETS,
+)
+INDEX_SEGMENTS = Gauge(
+    "index_segments", "Segments in the current version of the retrieval index",
+    multiprocess_mode="max",
+)
+INDEX_MERGE_DURATION = Histogram(
+    "index_merge_duration_seconds", "Time to merge retrieval index segments",
+    buckets=_LATENCY_BUCKETS,
+)
+
+CHAT_CANCELLED = Counter(
+    "chat_cancelled_total", "Chat requests abandoned before completion (client gone, cancelled or past the deadline)",
+    ["transport", "reason", "stage"],
+)
+
+SINGLE_FLIGHT_SHARED = Counter(
+    "single_flight_shared_total", "Calls that joined an identical call already in flight instead of starting their own",
+    ["kind"],
+)
+
+UPSTREAM_REJECTED = Counter(
+    "upstream_rejected_total", "Calls to an upstream service rejected before being sent (rate limit, full queue, open circuit)",
+    ["upstream", "reason"],
+)
+UPSTREAM_RETRIES = Counter(
+    "upstream_retries_total", "Retries of transient upstream errors",
+    ["upstream", "mode"],
+)
+UPSTREAM_QUEUE_LENGTH = Gauge(
+    "upstream_queue_length", "Calls waiting for a rate-limit token or a concurrency slot of an upstream service",
+    ["upstream"], multiprocess_mode="livesum",
+)
+UPSTREAM_RATE_LIMIT = Gauge(
+    "upstream_rate_limit", "Current (adaptive) rate limit of an upstream service, in requests per second",
+    ["upstream"], multiprocess_mode="livesum",
+)
+UPSTREAM_CIRCUIT_OPEN = Gauge(
+    "upstream_circuit_open", "1 while the circuit breaker of an upstream service is open",
+    ["upstream"], multiprocess_mode="max",
+)
+
+GEMINI_DURATION = Histogram(
+    "gemini_request_duration_seconds", "Gemini request duration (cache hits excluded)",
+    ["mode", "outcome"], buckets=_GEMINI_BUCKETS,
+)
+GEMINI_TIME_TO_FIRST_TOKEN = Histogram(
+    "gemini_time_to_first_token_seconds", "Time until the first streamed chunk from Gemini",
+    buckets=_GEMINI_BUCKETS,
+)
+
+def render() -> bytes:
+    """
+    Xuất tất cả các chỉ số theo định dạng văn bản của Prometheus (gộp các worker nếu cần).
+    """
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+def mark_process_dead() -> None:
+    """
+    Bỏ các gauge của worker hiện tại khỏi kết quả gộp (gọi khi worker tắt).
+    """
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI đo thời gian và số request đang xử lý, số WebSocket đang mở,
+    và trả về các chỉ số ở đường dẫn `path`.
+
+    Được viết trực tiếp theo ASGI (không dùng `BaseHTTPMiddleware`) để chi phí trên mỗi
+    request chỉ là vài phép đo thời gian, và không ảnh hưởng tới các response streaming.
+    Nhãn `route` là mẫu đường dẫn (ví dụ `/api/v1/jobs/{job_id}`) để số chuỗi thời gian
+    không tăng theo tham số trong URL.
+    """
+
+    def __init__(self, app, path: str = "/metrics"):
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            WEBSOCKETS_OPEN.inc()
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                WEBSOCKETS_OPEN.dec()
+            return
+
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["path"] == self.path:
+            payload = await asyncio.to_thread(render)
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", CONTENT_TYPE_LATEST.encode("latin-1"))],
+            })
+            await send({"type": "http.response.body", "body": payload})
+            return
+
+        status = 500
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status),
+            ).observe(time.perf_counter() - started)
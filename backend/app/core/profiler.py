@@ -0,0 +1,422 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import threading
+import contextvars
+import weakref
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+
+# Profiler lấy mẫu (sampling profiler) cho từng request.
+#
+# Một luồng nền đọc stack của các luồng (`sys._current_frames()`) sau mỗi `interval` giây
+# và cộng dồn theo từng phiên profile. Các mẫu được gán cho đúng request nhờ:
+# - Luồng event loop: task đang chạy thuộc về phiên nào (task của request và các task con
+#   được tạo trong request, ghi nhận qua task factory).
+# - Luồng của thread pool (`asyncio.to_thread`): executor mặc định ghi nhận phiên của
+#   hàm đang chạy trên mỗi luồng.
+# - Task của request đang chờ (I/O, Gemini, ...): chuỗi coroutine đang await, kết thúc
+#   bằng `[await]`, để profile phản ánh cả thời gian chờ.
+# - Tiến trình trích xuất: `run_profiled` tự lấy mẫu trong tiến trình con và trả về
+#   kết quả cùng các stack để gộp vào phiên.
+#
+# Kết quả được lưu dưới dạng "collapsed stacks" (mỗi dòng `frame;frame;frame số_mẫu`),
+# dùng trực tiếp được với flamegraph.pl, speedscope hoặc inferno.
+# Khi không có phiên nào, luồng lấy mẫu không chạy và chi phí trên mỗi request chỉ là
+# một lần đọc ContextVar.
+
+_current_session: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar(
+    "profile_session", default=None
+)
+
+_MAX_DEPTH = 128
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def collapse_stack(frame) -> str:
+    """
+    Chuyển stack của một frame thành chuỗi `gốc;...;lá` (định dạng collapsed stacks).
+    """
+    labels = []
+    while frame is not None and len(labels) < _MAX_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+def await_stack(coro) -> str:
+    """
+    Chuỗi `gốc;...;lá` của một coroutine đang bị treo, theo các coroutine mà nó đang await.
+    """
+    labels = []
+    while coro is not None and len(labels) < _MAX_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        labels.append(_frame_label(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return ";".join(labels)
+
+class ProfileSession:
+    """
+    Các mẫu stack thu được trong khi xử lý một request (hoặc một tác vụ nền).
+    """
+
+    def __init__(self, profile_id: str, kind: str, name: str, interval: float, max_duration: float):
+        self.profile_id = profile_id
+        self.kind = kind
+        self.name = name
+        self.interval = interval
+        self.max_duration = max_duration
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.samples: Counter = Counter()
+        self.metadata: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.finished_at is None and time.time() - self.started_at < self.max_duration
+
+    def add(self, stack: str, count: int = 1, prefix: Optional[str] = None) -> None:
+        if prefix:
+            stack = f"{prefix};{stack}"
+        with self._lock:
+            self.samples[stack] += count
+
+    def merge(self, samples: Dict[str, int], prefix: Optional[str] = None) -> None:
+        """
+        Gộp các mẫu thu được ở nơi khác (ví dụ tiến trình trích xuất) vào phiên.
+        """
+        for stack, count in samples.items():
+            self.add(stack, count, prefix)
+
+    def collapsed(self) -> str:
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            total = sum(self.samples.values())
+        return {
+            "profile_id": self.profile_id,
+            "kind": self.kind,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration": (self.finished_at or time.time()) - self.started_at,
+            "interval": self.interval,
+            "samples": total,
+            "metadata": self.metadata,
+        }
+
+class Sampler:
+    """
+    Luồng nền lấy mẫu stack. Chỉ chạy khi có ít nhất một phiên profile đang hoạt động,
+    nên không tốn chi phí khi không có request nào được profile.
+    """
+
+    def __init__(self):
+        self._sessions: "weakref.WeakSet[ProfileSession]" = weakref.WeakSet()
+        # Task trên event loop -> phiên profile
+        self.task_sessions: "weakref.WeakKeyDictionary[asyncio.Task, ProfileSession]" = weakref.WeakKeyDictionary()
+        # Luồng của thread pool -> phiên profile của hàm đang chạy trên luồng đó
+        self.thread_sessions: Dict[int, ProfileSession] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        self.interval = 0.005
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self, session: ProfileSession) -> None:
+        with self._lock:
+            self._sessions.add(session)
+            self.interval = min(self.interval, session.interval) if self._thread else session.interval
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                sessions = [session for session in self._sessions if session.active]
+                if not sessions:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            running = asyncio.current_task(self.loop) if self.loop is not None else None
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                session = self._session_of_thread(thread_id, running)
+                if session is not None and session.active:
+                    session.add(collapse_stack(frame))
+            self._sample_awaiting(running)
+            time.sleep(self.interval)
+
+    def _session_of_thread(self, thread_id: int, running: Optional[asyncio.Task]) -> Optional[ProfileSession]:
+        if thread_id == self.loop_thread_id:
+            return self.task_sessions.get(running) if running is not None else None
+        return self.thread_sessions.get(thread_id)
+
+    def _sample_awaiting(self, running: Optional[asyncio.Task]) -> None:
+        # Các task đang chờ (I/O, Gemini, luồng khác, ...) cũng được lấy mẫu, với stack là
+        # chuỗi coroutine đang await, để profile phản ánh cả thời gian chờ chứ không chỉ CPU
+        try:
+            tasks = list(self.task_sessions.items())
+        except RuntimeError:
+            # Event loop vừa thêm task trong lúc sao chép, bỏ qua lần lấy mẫu này
+            return
+        for task, session in tasks:
+            if task is running or task.done() or not session.active:
+                continue
+            stack = await_stack(task.get_coro())
+            if stack:
+                session.add(f"{stack};[await]")
+
+_sampler = Sampler()
+
+class ProfilingThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    Executor mặc định của event loop khi bật profiler: ghi nhận hàm đang chạy trên mỗi
+    luồng thuộc phiên profile nào (phiên của coroutine đã gọi `asyncio.to_thread`).
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        session = _current_session.get()
+        if session is None:
+            return super().submit(fn, *args, **kwargs)
+
+        def run(*args, **kwargs):
+            thread_id = threading.get_ident()
+            _sampler.thread_sessions[thread_id] = session
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _sampler.thread_sessions.pop(thread_id, None)
+
+        return super().submit(run, *args, **kwargs)
+
+def _task_factory(loop, coro, **kwargs):
+    task = asyncio.Task(coro, loop=loop, **kwargs)
+    # Task con được tạo trong một request đang được profile thuộc về cùng phiên
+    session = _current_session.get()
+    if session is not None:
+        _sampler.task_sessions[task] = session
+    return task
+
+def install(loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+    """
+    Cài đặt profiler vào event loop hiện tại (gọi một lần khi ứng dụng khởi động).
+    """
+    loop = loop or asyncio.get_running_loop()
+    _sampler.loop = loop
+    _sampler.loop_thread_id = threading.get_ident()
+    loop.set_task_factory(_task_factory)
+    loop.set_default_executor(ProfilingThreadPoolExecutor(thread_name_prefix="asyncio"))
+
+def current_session() -> Optional[ProfileSession]:
+    """
+    Phiên profile của request (hoặc tác vụ) hiện tại, None nếu không được profile.
+    """
+    return _current_session.get()
+
+@contextmanager
+def profile(kind: str, name: str, interval: float, max_duration: float, store: Optional["ProfileStore"] = None,
+            profile_id: Optional[str] = None):
+    """
+    Profile đoạn code bên trong khối `with` (chạy trên event loop) và lưu kết quả vào `store`.
+    """
+    session = ProfileSession(profile_id or uuid.uuid4().hex, kind, name, interval, max_duration)
+    token = _current_session.set(session)
+    task = asyncio.current_task()
+    previous = _sampler.task_sessions.get(task) if task is not None else None
+    if task is not None:
+        _sampler.task_sessions[task] = session
+    _sampler.start(session)
+    try:
+        yield session
+    finally:
+        session.finished_at = time.time()
+        _current_session.reset(token)
+        if task is not None:
+            if previous is not None:
+                _sampler.task_sessions[task] = previous
+            else:
+                _sampler.task_sessions.pop(task, None)
+        if store is not None:
+            store.save_later(session)
+
+def run_profiled(fn: Callable[..., Any], interval: float, *args: Any) -> Tuple[Any, Dict[str, int]]:
+    """
+    Chạy `fn(*args)` và lấy mẫu stack của luồng hiện tại trong lúc chạy.
+    Dùng trong tiến trình trích xuất, nơi luồng lấy mẫu của tiến trình chính không thấy được.
+
+    Returns:
+        Tuple: Kết quả của `fn` và các mẫu dưới dạng {collapsed stack: số mẫu}.
+    """
+    target_id = threading.get_ident()
+    samples: Counter = Counter()
+    done = threading.Event()
+
+    def sample() -> None:
+        while not done.wait(interval):
+            frame = sys._current_frames().get(target_id)
+            if frame is not None:
+                samples[collapse_stack(frame)] += 1
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        result = fn(*args)
+    finally:
+        done.set()
+        sampler.join()
+    return result, dict(samples)
+
+class ProfileStore:
+    """
+    Lưu các profile trên đĩa theo kiểu bộ đệm vòng (ring buffer): khi vượt quá
+    `max_profiles` profile hoặc `max_bytes` byte, các profile cũ nhất bị xóa.
+    """
+
+    def __init__(self, directory: str, max_profiles: int, max_bytes: int):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def save(self, session: ProfileSession) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        data = {**session.to_dict(), "collapsed": session.collapsed()}
+        path = self._path(session.profile_id)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+        self._prune()
+
+    def save_later(self, session: ProfileSession) -> None:
+        """
+        Lưu profile trong một luồng riêng, không chặn request.
+        """
+        threading.Thread(target=self._save_safely, args=(session,), daemon=True).start()
+
+    def _save_safely(self, session: ProfileSession) -> None:
+        try:
+            self.save(session)
+        except Exception as e:
+            print(f"Error saving profile {session.profile_id}: {str(e)}")
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".json"):
+                stats = os.stat(os.path.join(self.directory, filename))
+                entries.append((stats.st_mtime, stats.st_size, filename))
+        return sorted(entries)
+
+    def _prune(self) -> None:
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            while entries and (len(entries) > self.max_profiles or total > self.max_bytes):
+                _, size, filename = entries.pop(0)
+                total -= size
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        """
+        Thông tin của các profile đã lưu, mới nhất trước (không kèm stack).
+        """
+        profiles = []
+        for _, _, filename in reversed(self._entries()):
+            try:
+                with open(os.path.join(self.directory, filename), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            data.pop("collapsed", None)
+            profiles.append(data)
+        return profiles
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Đọc một profile (kèm collapsed stacks), None nếu không tồn tại.
+        """
+        if not all(c.isalnum() or c in "-_" for c in profile_id):
+            return None
+        try:
+            with open(self._path(profile_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+class ProfilerMiddleware:
+    """
+    Middleware ASGI profile một request (HTTP hoặc cả phiên WebSocket) khi:
+    - request có header `X-Profile` bằng token quản trị (`token`), hoặc
+    - request được chọn ngẫu nhiên với xác suất `sample_rate`.
+
+    Các đường dẫn bắt đầu bằng một trong `exclude` (ví dụ các endpoint quản trị) không bao giờ
+    được profile. Request được profile nhận header `X-Profile-Id` trong response (HTTP) để tra cứu profile
+    qua các endpoint quản trị. Các request khác chỉ tốn một lần đọc header và một số ngẫu nhiên.
+    """
+
+    def __init__(self, app, store: ProfileStore, token: Optional[str], sample_rate: float,
+                 interval: float, max_duration: float, exclude: Tuple[str, ...] = ()):
+        self.app = app
+        self.exclude = exclude
+        self.store = store
+        self.token = token.encode("latin-1") if token else None
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_duration = max_duration
+
+    def _requested(self, scope) -> bool:
+        if self.token is not None:
+            for name, value in scope.get("headers", ()):
+                if name == b"x-profile":
+                    return value == self.token
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] not in ("http", "websocket") or scope["path"].startswith(self.exclude)
+                or not self._requested(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        name = f"{scope.get('method', 'WEBSOCKET')} {scope['path']}"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+                session.metadata["status"] = message["status"]
+            await send(message)
+
+        with profile(scope["type"], name, self.interval, self.max_duration, self.store, profile_id) as session:
+            await self.app(scope, receive, send_wrapper if scope["type"] == "http" else send)
+
+# Nơi lưu các profile dùng chung cho toàn bộ ứng dụng
+profile_store = ProfileStore(
+    directory=settings.PROFILER_DIR,
+    max_profiles=settings.PROFILER_MAX_PROFILES,
+    max_bytes=settings.PROFILER_MAX_BYTES,
+)
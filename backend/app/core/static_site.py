@@ -0,0 +1,215 @@
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from starlette.responses import FileResponse, Response
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:
+    # brotli là phụ thuộc tùy chọn: không có thì chỉ nén sẵn bằng gzip
+    brotli = None
+
+# File trong thư mục assets của Vite (hoặc static của Create React App) có mã hash nội dung
+# trong tên, ví dụ `assets/index-BxK3fF2a.js`: nội dung không bao giờ thay đổi
+_HASHED_ASSET_RE = re.compile(r"^(assets|static)/(.+/)?[^/]+[.-][A-Za-z0-9_-]{8,}(\.[A-Za-z0-9]+)+$")
+_HASHED_DIRS = ("assets/", "static/")
+
+_COMPRESSIBLE_TYPES = (
+    "text/", "application/javascript", "application/json", "application/manifest+json",
+    "application/xml", "image/svg+xml", "application/wasm",
+)
+_MIN_COMPRESS_SIZE = 256
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Các file khác (index.html, file trong public/) được trình duyệt kiểm tra lại bằng ETag
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+mimetypes.add_type("application/json", ".map")
+
+@dataclass
+class Asset:
+    """
+    Một file của bản build frontend.
+
+    `data` là nội dung file (None nếu file quá lớn để giữ trong bộ nhớ và được đọc từ đĩa),
+    `variants` là các biến thể nén sẵn theo `Content-Encoding`: (nội dung, ETag).
+    """
+    path: str
+    content_type: str
+    etag: str
+    immutable: bool
+    data: Optional[bytes] = None
+    variants: Dict[str, Tuple[bytes, str]] = field(default_factory=dict)
+
+    @property
+    def compressible(self) -> bool:
+        return self.content_type.startswith(_COMPRESSIBLE_TYPES)
+
+def _accepted_encodings(accept_encoding: str) -> List[str]:
+    """
+    Các `Content-Encoding` client chấp nhận (q > 0), theo thứ tự ưu tiên của server.
+    """
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    wildcard = accepted.get("*", 0.0)
+    return [encoding for encoding in ("br", "gzip") if accepted.get(encoding, wildcard) > 0]
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+class StaticSite:
+    """
+    Bản build của frontend (Vite), phục vụ từ bộ nhớ.
+
+    - Thư mục build được quét một lần khi khởi động (`load`): nội dung, kiểu MIME và ETag
+      (hash SHA-256 của nội dung) của mỗi file được giữ trong một manifest trong bộ nhớ,
+      không còn `os.path.isfile` và đọc file trên mỗi request.
+    - Các file dạng văn bản (JS, CSS, HTML, SVG, JSON, ...) được nén sẵn (`compress`) bằng
+      gzip và brotli (nếu có thư viện `brotli`), hoặc dùng file `.gz`/`.br` có sẵn trong bản
+      build; biến thể được chọn theo `Accept-Encoding`.
+    - ETag mạnh cho mỗi biến thể và trả về 304 khi `If-None-Match` khớp. File có hash nội
+      dung trong tên (`assets/`) được cache vĩnh viễn (`immutable`), các file khác được
+      trình duyệt kiểm tra lại mỗi lần.
+    - Các đường dẫn không phải file (route của SPA) nhận `index.html` từ bộ nhớ.
+
+    File lớn hơn `max_cached_file_size` (ví dụ source map lớn) không được giữ trong bộ nhớ
+    và được đọc từ đĩa khi có request.
+    """
+
+    def __init__(self, directory: str, max_cached_file_size: int, gzip_level: int, brotli_quality: int):
+        self.directory = directory
+        self.max_cached_file_size = max_cached_file_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.assets: Dict[str, Asset] = {}
+
+    @property
+    def index(self) -> Optional[Asset]:
+        return self.assets.get("index.html")
+
+    def load(self) -> None:
+        """
+        Quét thư mục build và tạo manifest (chạy trong luồng khác khi khởi động).
+        """
+        if not os.path.isdir(self.directory):
+            self.assets = {}
+            return
+
+        paths = {}
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                full_path = os.path.join(root, name)
+                paths[os.path.relpath(full_path, self.directory).replace(os.sep, "/")] = full_path
+
+        assets = {}
+        for name, full_path in paths.items():
+            # Biến thể nén sẵn của một file khác trong bản build (ví dụ vite-plugin-compression)
+            if name.endswith((".gz", ".br")) and name[:-3] in paths:
+                continue
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            immutable = bool(_HASHED_ASSET_RE.match(name))
+            digest = hashlib.sha256()
+            data = None
+            if os.path.getsize(full_path) <= self.max_cached_file_size:
+                with open(full_path, "rb") as f:
+                    data = f.read()
+                digest.update(data)
+            else:
+                with open(full_path, "rb") as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(block)
+            etag = digest.hexdigest()[:32]
+            asset = Asset(full_path, content_type, f'"{etag}"', immutable, data)
+
+            if data is not None:
+                for suffix, encoding in ((".br", "br"), (".gz", "gzip")):
+                    if name + suffix in paths:
+                        with open(paths[name + suffix], "rb") as f:
+                            asset.variants[encoding] = (f.read(), f'"{etag}-{encoding}"')
+            assets[name] = asset
+        self.assets = assets
+
+    def compress(self) -> None:
+        """
+        Tạo các biến thể nén sẵn còn thiếu của các file dạng văn bản (chạy trong luồng khác
+        sau khi khởi động; trong lúc đó các file được trả về không nén).
+        """
+        for asset in list(self.assets.values()):
+            if asset.data is None or not asset.compressible or len(asset.data) < _MIN_COMPRESS_SIZE:
+                continue
+            variants = dict(asset.variants)
+            if "gzip" not in variants:
+                variants["gzip"] = (gzip.compress(asset.data, self.gzip_level, mtime=0), asset.etag[:-1] + '-gzip"')
+            if brotli is not None and "br" not in variants:
+                variants["br"] = (brotli.compress(asset.data, quality=self.brotli_quality), asset.etag[:-1] + '-br"')
+            # Chỉ giữ biến thể thực sự nhỏ hơn đáng kể
+            asset.variants = {
+                encoding: variant for encoding, variant in variants.items()
+                if len(variant[0]) < len(asset.data) * 0.9
+            }
+
+    def response(self, path: str, accept_encoding: str = "", if_none_match: Optional[str] = None) -> Optional[Response]:
+        """
+        Response cho đường dẫn `path` (tương đối so với gốc của frontend).
+
+        Returns:
+            Optional[Response]: None nếu không có file nào phù hợp (không có bản build, hoặc
+            file trong thư mục assets không tồn tại).
+        """
+        asset = self.assets.get(path)
+        if asset is None:
+            # File asset không tồn tại (ví dụ bản build cũ): không trả về index.html thay cho JS/CSS
+            if path.startswith(_HASHED_DIRS):
+                return None
+            asset = self.index
+            if asset is None:
+                return None
+
+        headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL if asset.immutable else REVALIDATE_CACHE_CONTROL}
+        if asset.compressible:
+            headers["Vary"] = "Accept-Encoding"
+
+        if asset.data is None:
+            if _etag_matches(if_none_match, asset.etag):
+                return Response(status_code=304, headers={**headers, "ETag": asset.etag})
+            return FileResponse(asset.path, media_type=asset.content_type, headers={**headers, "ETag": asset.etag})
+
+        body, etag = asset.data, asset.etag
+        variants = asset.variants
+        for encoding in _accepted_encodings(accept_encoding) if variants else ():
+            if encoding in variants:
+                body, etag = variants[encoding]
+                headers["Content-Encoding"] = encoding
+                break
+        headers["ETag"] = etag
+        if _etag_matches(if_none_match, etag):
+            headers.pop("Content-Encoding", None)
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type=asset.content_type, headers=headers)
+
+# Bản build frontend dùng chung cho toàn bộ ứng dụng (nạp khi khởi động, xem app.main)
+static_site = StaticSite(
+    settings.WEB_FOLDER,
+    max_cached_file_size=settings.STATIC_MAX_CACHED_FILE_SIZE,
+    gzip_level=settings.STATIC_GZIP_LEVEL,
+    brotli_quality=settings.STATIC_BROTLI_QUALITY,
+)
@@ -1,48 +1,111 @@
-import os
-
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from app.core.config import settings
-
-# Import and include routers
-from app.api.endpoints import auth, chat, files, gemini
-
-# Create FastAPI app
-app = FastAPI(
-    title=settings.PROJECT_NAME,
-    version=settings.VERSION
-)
-
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-app.include_router(auth.router, prefix=settings.API_V1_STR, tags=["auth"])
-app.include_router(chat.router, prefix=settings.API_V1_STR, tags=["chat"])
-app.include_router(files.router, prefix=settings.API_V1_STR, tags=["files"])
-app.include_router(gemini.router, prefix=settings.API_V1_STR, tags=["gemini"])
-
-# Mount thư mục build của React
-if (os.path.isdir(settings.WEB_FOLDER)):
-    app.mount("/static", StaticFiles(directory=settings.WEB_FOLDER + "/static"), name="static")
-
-# Route mặc định trả về index.html
-@app.get("/")
-async def read_index():
-    if (os.path.isdir(settings.WEB_FOLDER) and os.path.isfile(settings.WEB_FOLDER + "/index.html")):
-        return FileResponse(settings.WEB_FOLDER + "/index.html")
-    return {"message": settings.PROJECT_NAME}
-
-# Route bắt tất cả các path khác để hỗ trợ client-side routing
-@app.get("/{full_path:path}")
-async def catch_all(full_path: str):
-    if (os.path.isfile(settings.WEB_FOLDER + "/" + full_path)):
-        return FileResponse(settings.WEB_FOLDER + "/" + full_path)
-    return FileResponse(settings.WEB_FOLDER + "/index.html")
\ No newline at end of file
+import asyncio
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse
+from fastapi.middleware.cors import CORSMiddleware
+from app.core import metrics, profiler
+from app.core.config import settings
+from app.core.database import init_db
+from app.core.static_site import static_site
+from app.services.connection_manager import connection_manager
+from app.services.document_catalog import document_catalog
+from app.services.extraction_pool import extraction_pool
+from app.services.job_queue import job_queue
+from app.services.llm_cache import llm_cache
+from app.services.segment_index import segment_index
+from app.services.warmup import warm_up
+
+# Import and include routers
+from app.api.endpoints import admin, auth, chat, files, gemini, jobs
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Tạo các bảng database (cache phản hồi LLM, ...) nếu chưa tồn tại
+    init_db()
+    # Gắn profiler vào event loop (task factory và executor mặc định) nếu được bật
+    if settings.PROFILER_ENABLED:
+        profiler.install()
+    # Nạp bản build frontend vào bộ nhớ; các biến thể nén được tạo dần trong nền
+    await asyncio.to_thread(static_site.load)
+    compress_task = asyncio.create_task(asyncio.to_thread(static_site.compress))
+    # Thêm các file đã xử lý từ trước vào danh mục tài liệu (chỉ khi danh mục còn trống)
+    await asyncio.to_thread(document_catalog.backfill)
+    # Mở chỉ mục truy xuất dùng chung (lần đầu: xây dựng từ các file đã upload)
+    await asyncio.to_thread(segment_index.open)
+    # Nạp trước các thư viện nặng (Gemini, scikit-learn, bộ đọc file) nếu được bật
+    if settings.WARMUP_ON_STARTUP:
+        print(f"Warm-up finished in {await warm_up():.2f}s")
+    # Khởi động các worker xử lý hàng đợi file upload
+    await job_queue.start()
+    # Xóa định kỳ các phản hồi đã hết hạn khỏi cache phản hồi LLM
+    await llm_cache.start()
+    yield
+    compress_task.cancel()
+    # Trả lời nốt các tin nhắn đang stream rồi đóng các phiên WebSocket còn lại
+    await connection_manager.drain(settings.WS_DRAIN_TIMEOUT)
+    # Dừng các worker và các tiến trình trích xuất khi ứng dụng tắt
+    await job_queue.stop()
+    await llm_cache.stop()
+    extraction_pool.shutdown()
+    metrics.mark_process_dead()
+
+# Create FastAPI app
+# Các response JSON được tạo bằng orjson thay cho json của thư viện chuẩn
+app = FastAPI(
+    title=settings.PROJECT_NAME,
+    version=settings.VERSION,
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+
+# Đo thời gian request, số request đang xử lý, số WebSocket đang mở và xuất các chỉ số ở /metrics
+app.add_middleware(metrics.MetricsMiddleware, path=settings.METRICS_PATH)
+
+# Profile các request có header X-Profile hợp lệ hoặc được chọn ngẫu nhiên (xem app.core.profiler)
+if settings.PROFILER_ENABLED:
+    app.add_middleware(
+        profiler.ProfilerMiddleware,
+        store=profiler.profile_store,
+        token=settings.PROFILER_TOKEN,
+        sample_rate=settings.PROFILER_SAMPLE_RATE,
+        interval=settings.PROFILER_INTERVAL,
+        max_duration=settings.PROFILER_MAX_DURATION,
+        exclude=(settings.API_V1_STR + "/admin", settings.METRICS_PATH),
+    )
+
+# Configure CORS
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+app.include_router(auth.router, prefix=settings.API_V1_STR, tags=["auth"])
+app.include_router(chat.router, prefix=settings.API_V1_STR, tags=["chat"])
+app.include_router(files.router, prefix=settings.API_V1_STR, tags=["files"])
+app.include_router(gemini.router, prefix=settings.API_V1_STR, tags=["gemini"])
+app.include_router(jobs.router, prefix=settings.API_V1_STR, tags=["jobs"])
+app.include_router(admin.router, prefix=settings.API_V1_STR, tags=["admin"])
+
+# Frontend (bản build trong WEB_FOLDER) được phục vụ từ bộ nhớ, xem app.core.static_site
+def _frontend_response(path: str, request: Request):
+    return static_site.response(path, request.headers.get("accept-encoding", ""), request.headers.get("if-none-match"))
+
+# Route mặc định trả về index.html
+@app.get("/")
+async def read_index(request: Request):
+    response = _frontend_response("index.html", request)
+    if response is None:
+        return {"message": settings.PROJECT_NAME}
+    return response
+
+# Route bắt tất cả các path khác để hỗ trợ client-side routing
+@app.get("/{full_path:path}")
+async def catch_all(full_path: str, request: Request):
+    response = _frontend_response(full_path, request)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return response
\ No newline at end of file
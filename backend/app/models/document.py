@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Float, Index, Integer, String
+from app.core.database import Base
+
+class Document(Base):
+    """
+    Một file đã upload trong danh mục tài liệu (thay cho việc quét thư mục upload).
+    """
+    __tablename__ = "documents"
+
+    filename = Column(String(255), primary_key=True)
+    size = Column(Integer, nullable=False, default=0)
+    sha256 = Column(String(64), nullable=True)
+    uploaded_at = Column(Float, nullable=False)
+    # processing -> ready | failed
+    status = Column(String(16), nullable=False, default="processing")
+    chunk_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(Float, nullable=False)
+
+    __table_args__ = (
+        # Phục vụ phân trang theo thời gian upload (keyset pagination)
+        Index("ix_documents_uploaded_at", "uploaded_at", "filename"),
+        Index("ix_documents_status_uploaded_at", "status", "uploaded_at", "filename"),
+    )
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Float, Index, Integer, String, Text
+from app.core.database import Base
+
+class IngestionJob(Base):
+    """
+    Một tác vụ xử lý (trích xuất, chia chunk, vector hóa, đánh chỉ mục) file đã upload.
+    """
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(String(32), primary_key=True)
+    filename = Column(String(255), nullable=False)
+    file_extension = Column(String(16), nullable=False)
+    content_type = Column(String(255), nullable=True)
+    sha256 = Column(String(64), nullable=False)
+    size = Column(Integer, nullable=False, default=0)
+
+    # queued -> running -> done | failed (running -> queued khi thử lại)
+    status = Column(String(16), nullable=False, default="queued")
+    # Bước đang thực hiện: queued, extracting, ocr, indexing, done, failed
+    stage = Column(String(16), nullable=False, default="queued")
+    progress = Column(Float, nullable=False, default=0.0)
+    priority = Column(Integer, nullable=False, default=0)  # Lớn hơn được xử lý trước
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
+    available_at = Column(Float, nullable=False)  # Thời điểm sớm nhất được xử lý (chờ thử lại)
+    locked_by = Column(String(64), nullable=True)
+    locked_at = Column(Float, nullable=True)
+
+    __table_args__ = (
+        Index("ix_ingestion_jobs_queue", "status", "priority", "created_at"),
+        # Tìm tác vụ mới nhất của một tên file (file được upload lại)
+        Index("ix_ingestion_jobs_filename", "filename", "created_at"),
+    )
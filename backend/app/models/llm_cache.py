@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Float, Index, String, Text
+from app.core.database import Base
+
+class LLMCacheEntry(Base):
+    """
+    Một phản hồi của mô hình ngôn ngữ được lưu trong cache trên đĩa.
+    """
+    __tablename__ = "llm_cache"
+
+    key = Column(String(64), primary_key=True)  # SHA-256 của prompt + cấu hình
+    model_name = Column(String(128), nullable=False)
+    response = Column(Text, nullable=False)
+    created_at = Column(Float, nullable=False)
+    expires_at = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_llm_cache_expires_at", "expires_at"),
+    )
@@ -1,21 +1,55 @@
-from pydantic import BaseModel
-from typing import Optional, List
-from datetime import datetime
-
-class ChatMessage(BaseModel):
-    """
-    Mô hình dữ liệu cho một tin nhắn trong chat.
-    """
-    # id: int
-    # sender_id: int
-    # receiver_id: int
-    # timestamp: datetime
-    text: str
-    context_files: Optional[List[str]] = None
-
-class ChatResponse(BaseModel):
-    """
-    Mô hình dữ liệu cho phản hồi từ hệ thống chat.
-    """
-    response: Optional[str] = None
-    timestamp: datetime = datetime.now()
\ No newline at end of file
+from pydantic import BaseModel, Field
+from typing import Literal, Optional, List
+from datetime import datetime
+
+class ChatMessage(BaseModel):
+    """
+    Mô hình dữ liệu cho một tin nhắn trong chat.
+    """
+    # id: int
+    # sender_id: int
+    # receiver_id: int
+    # timestamp: datetime
+    text: str
+    # Mã tin nhắn, được gửi kèm trong các frame trả lời (WebSocket) để client phân biệt
+    # câu trả lời của các tin nhắn được gửi đồng thời
+    id: Optional[str] = None
+    context_files: Optional[List[str]] = None
+    # Dùng cache phản hồi của Gemini (mặc định chỉ khi temperature bằng 0)
+    cache: Optional[bool] = None
+
+class ChatResponse(BaseModel):
+    """
+    Mô hình dữ liệu cho phản hồi từ hệ thống chat.
+    """
+    response: Optional[str] = None
+    timestamp: datetime = datetime.now()
+
+class ChatControl(BaseModel):
+    """
+    Mô hình dữ liệu cho một frame điều khiển từ client qua WebSocket.
+
+    - `ping`: kiểm tra kết nối, server trả lời bằng `pong`.
+    - `pong`: trả lời frame `ping` của server.
+    - `cancel`: hủy việc trả lời tin nhắn có mã `id`.
+    """
+    type: Literal["ping", "pong", "cancel"]
+    id: Optional[str] = None
+
+class ChatStreamChunk(BaseModel):
+    """
+    Mô hình dữ liệu cho một frame phản hồi dạng streaming qua WebSocket.
+
+    - `delta`: một đoạn tiếp theo của câu trả lời.
+    - `done`: kết thúc câu trả lời, `response` chứa toàn bộ câu trả lời.
+    - `error`: xảy ra lỗi, `response` chứa thông báo lỗi.
+    - `ping` / `pong`: heartbeat, client cần trả lời `ping` bằng một frame `pong`.
+
+    `id` là mã của tin nhắn mà frame trả lời. `retry_after` (giây) đi kèm frame `error` khi
+    tin nhắn bị từ chối do quá tải.
+    """
+    type: Literal["delta", "done", "error", "ping", "pong"]
+    id: Optional[str] = None
+    response: Optional[str] = None
+    retry_after: Optional[float] = None
+    timestamp: datetime = Field(default_factory=datetime.now)
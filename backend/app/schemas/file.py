@@ -1,18 +1,42 @@
-from pydantic import BaseModel, Field
-from datetime import datetime
-
-class FileResponse(BaseModel):
-  """
-  Mô hình dữ liệu cho phản hồi từ hệ thống xử lý tệp.
-  """
-  filename: str = Field(..., description="Tên của tệp đã được tải lên")
-  content_type: str = Field(..., description="Loại nội dung của tệp")
-  text_content: str = Field(..., description="Nội dung văn bản của tệp")
-
-class FileInfo(BaseModel):
-    """
-    Mô hình dữ liệu cho thông tin tệp.
-    """
-    filename: str = Field(..., description="Tên tệp")
-    size: int = Field(..., description="Kích thước tệp (byte)")
-    uploaded_at: datetime = Field(..., description="Thời gian tải lên tệp")
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+class FileResponse(BaseModel):
+  """
+  Mô hình dữ liệu cho phản hồi từ hệ thống xử lý tệp.
+  """
+  filename: str = Field(..., description="Tên của tệp đã được tải lên")
+  content_type: str = Field(..., description="Loại nội dung của tệp")
+  text_content: Optional[str] = Field(None, description="Nội dung văn bản của tệp (chỉ khi yêu cầu toàn bộ nội dung)")
+  text_preview: Optional[str] = Field(None, description="Phần đầu của nội dung văn bản (chỉ khi yêu cầu bản xem trước)")
+  text_size: Optional[int] = Field(None, description="Kích thước nội dung văn bản (byte UTF-8)")
+  sha256: Optional[str] = Field(None, description="Mã băm SHA-256 của nội dung tệp")
+
+class TextPage(BaseModel):
+  """
+  Mô hình dữ liệu cho một trang trong nội dung văn bản đã trích xuất của tệp.
+  """
+  filename: str = Field(..., description="Tên tệp")
+  offset: int = Field(..., description="Vị trí byte (UTF-8) bắt đầu của trang")
+  next_offset: Optional[int] = Field(None, description="Vị trí byte của trang tiếp theo, None nếu là trang cuối")
+  total_size: int = Field(..., description="Kích thước toàn bộ nội dung văn bản (byte UTF-8)")
+  text: str = Field(..., description="Nội dung văn bản của trang")
+
+class FileInfo(BaseModel):
+    """
+    Mô hình dữ liệu cho thông tin tệp.
+    """
+    filename: str = Field(..., description="Tên tệp")
+    size: int = Field(..., description="Kích thước tệp (byte)")
+    uploaded_at: datetime = Field(..., description="Thời gian tải lên tệp")
+    sha256: Optional[str] = Field(None, description="Mã băm SHA-256 của nội dung tệp")
+    status: str = Field("ready", description="Trạng thái xử lý: processing, ready, failed")
+    chunk_count: int = Field(0, description="Số chunk của tài liệu")
+
+class FileList(BaseModel):
+    """
+    Mô hình dữ liệu cho một trang trong danh sách tệp.
+    """
+    items: List[FileInfo] = Field(..., description="Các tệp của trang hiện tại")
+    next_cursor: Optional[str] = Field(None, description="Con trỏ của trang tiếp theo, None nếu là trang cuối")
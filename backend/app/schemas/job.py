@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+from app.schemas.file import FileResponse
+
+class JobInfo(BaseModel):
+  """
+  Mô hình dữ liệu cho trạng thái của một tác vụ xử lý file.
+  """
+  job_id: str = Field(..., description="Mã tác vụ")
+  filename: str = Field(..., description="Tên tệp đang được xử lý")
+  status: str = Field(..., description="Trạng thái: queued, running, done, failed")
+  stage: str = Field(..., description="Bước đang thực hiện: queued, extracting, ocr, indexing, done, failed")
+  progress: float = Field(..., description="Tiến độ xử lý (0..1)")
+  attempts: int = Field(..., description="Số lần đã thử xử lý")
+  error: Optional[str] = Field(None, description="Thông báo lỗi của lần thử gần nhất")
+  created_at: datetime = Field(..., description="Thời gian tạo tác vụ")
+  updated_at: datetime = Field(..., description="Thời gian cập nhật gần nhất")
+  result: Optional[FileResponse] = Field(None, description="Kết quả xử lý khi tác vụ hoàn tất")
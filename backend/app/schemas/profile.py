@@ -0,0 +1,27 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List
+
+class ProfileInfo(BaseModel):
+  """
+  Mô hình dữ liệu cho thông tin của một profile đã lưu.
+  """
+  profile_id: str = Field(..., description="Mã profile (mã tác vụ đối với tác vụ xử lý file)")
+  kind: str = Field(..., description="Loại: http, websocket, job")
+  name: str = Field(..., description="Request hoặc tác vụ được profile")
+  started_at: float = Field(..., description="Thời điểm bắt đầu (Unix timestamp)")
+  duration: float = Field(..., description="Thời gian chạy (giây)")
+  interval: float = Field(..., description="Chu kỳ lấy mẫu (giây)")
+  samples: int = Field(..., description="Tổng số mẫu stack")
+  metadata: Dict[str, Any] = Field(default_factory=dict, description="Thông tin thêm (mã trạng thái, mã tác vụ, ...)")
+
+class Profile(ProfileInfo):
+  """
+  Mô hình dữ liệu cho một profile, kèm các stack đã lấy mẫu.
+  """
+  collapsed: str = Field(..., description="Các stack ở định dạng collapsed stacks (`frame;frame số_mẫu` mỗi dòng)")
+
+class ProfileList(BaseModel):
+  """
+  Mô hình dữ liệu cho danh sách profile.
+  """
+  items: List[ProfileInfo] = Field(..., description="Các profile, mới nhất trước")
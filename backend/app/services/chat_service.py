@@ -1,96 +1,216 @@
-import os
-import numpy as np
-
-from app.core.config import settings
-from typing import List, Optional
-
-def load_context_from_file(file_path: str, encoding: str = 'utf-8') -> str:
-    """
-    Đọc nội dung file và trả về nội dung dưới dạng chuỗi.
-
-    Tham số:
-        file_path (str): Đường dẫn tới tệp cần tải.
-    Trả về:
-        str: Nội dung của tệp dưới dạng chuỗi. Trả về chuỗi rỗng nếu tệp không tồn tại
-        hoặc nếu xảy ra lỗi trong quá trình đọc tệp.
-    Ngoại lệ:
-        Exception: Bắt và ghi lại bất kỳ ngoại lệ nào xảy ra trong quá trình đọc tệp.
-    """
-    # Kiểm tra xem file_path có phải là chuỗi hợp lệ không
-    if not isinstance(file_path, str) or not file_path.strip():
-        print("Invalid file path provided.")
-        return ""
-
-    try:
-        # Đọc nội dung file và trả về nội dung dưới dạng chuỗi
-        with open(file_path, 'r', encoding=encoding) as file:
-            return file.read()
-
-    except FileNotFoundError:
-        print(f"File {file_path} does not exist.")
-        return ""
-    except PermissionError:
-        print(f"Permission denied for file {file_path}.")
-        return ""
-    except IOError as e:
-        print(f"I/O error while reading file {file_path}: {str(e)}")
-        return ""
-    except Exception as e:
-        print(f"Error loading file {file_path}: {str(e)}")
-        return ""
-
-async def find_relevant_context(message: str, context_files: Optional[List[str]] = None, ext: str = ".txt") -> str:
-    """
-    Tìm kiếm ngữ cảnh liên quan từ các tệp được cung cấp dựa trên tin nhắn đầu vào.
-
-    Tham số:
-        message (str): Tin nhắn đầu vào từ người dùng.
-        context_files (Optional[List[str]]): Danh sách các tệp chứa ngữ cảnh.
-        ext (str): Đuôi tệp cần tìm kiếm. Mặc định là ".txt".
-
-    Trả về:
-        str: Ngữ cảnh liên quan được tìm thấy từ các tệp. Nếu không tìm thấy, trả về chuỗi rỗng.
-    """
-    all_context = ""
-
-    if context_files is None:
-        for filename in os.listdir(settings.UPLOAD_DIR):
-            if filename.endswith(".txt"):
-                content = await load_context_from_file(os.path.join(settings.UPLOAD_DIR, filename))
-
-                # TODO: TEST - find the context that is most relevant to the message
-                if message in content:
-                    all_context = content
-                    break
-    else:
-        for filename in context_files:
-            file_path = os.path.join(settings.UPLOAD_DIR, filename + ext)
-            if os.path.exists(file_path):
-                content = await load_context_from_file(file_path)
-
-                # TODO: TEST - find the context that is most relevant to the message
-                if message in content:
-                    all_context = content
-                    break
-
-                # all_context += content + "\n\n"
-
-    return all_context
-
-async def process_chat_message(message: str, context_files: Optional[List[str]] = None) -> str:
-    """
-    Process a chat message and return a response
-    """
-    try:
-        # Get relevant context from uploaded files. extension is .vector
-        context = await find_relevant_context(message, context_files, ".txt")
-
-        # For now, return a simple response
-        # TODO: Implement actual chat processing logic
-        if context:
-            return f"I found some relevant information from the uploaded files: {context[:200]}..."
-        else:
-            return "I don't have any relevant information from the uploaded files to answer your question."
-
-    except Exception as e:
-        raise Exception(f"Error processing chat message: {str(e)}")
+import os
+import time
+import asyncio
+import hashlib
+import threading
+
+from contextlib import aclosing
+
+from app.core import deadline, metrics
+from app.core.config import settings
+from app.services.chunker import read_span
+from app.services.gemini_service import send_async, stream_async
+from app.services.llm_cache import normalize_prompt
+from app.services.resilience import Overloaded
+from app.services.segment_index import segment_index
+from app.services.single_flight import SingleFlight
+from app.services.vector_store import embed_texts
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+def load_context_from_file(file_path: str, encoding: str = 'utf-8') -> str:
+    """
+    Đọc nội dung file và trả về nội dung dưới dạng chuỗi.
+
+    Tham số:
+        file_path (str): Đường dẫn tới tệp cần tải.
+    Trả về:
+        str: Nội dung của tệp dưới dạng chuỗi. Trả về chuỗi rỗng nếu tệp không tồn tại
+        hoặc nếu xảy ra lỗi trong quá trình đọc tệp.
+    Ngoại lệ:
+        Exception: Bắt và ghi lại bất kỳ ngoại lệ nào xảy ra trong quá trình đọc tệp.
+    """
+    # Kiểm tra xem file_path có phải là chuỗi hợp lệ không
+    if not isinstance(file_path, str) or not file_path.strip():
+        print("Invalid file path provided.")
+        return ""
+
+    try:
+        # Đọc nội dung file và trả về nội dung dưới dạng chuỗi
+        with open(file_path, 'r', encoding=encoding) as file:
+            return file.read()
+
+    except FileNotFoundError:
+        print(f"File {file_path} does not exist.")
+        return ""
+    except PermissionError:
+        print(f"Permission denied for file {file_path}.")
+        return ""
+    except IOError as e:
+        print(f"I/O error while reading file {file_path}: {str(e)}")
+        return ""
+    except Exception as e:
+        print(f"Error loading file {file_path}: {str(e)}")
+        return ""
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[str, float]]], k: int = 60) -> List[str]:
+    """
+    Gộp nhiều danh sách xếp hạng bằng Reciprocal Rank Fusion (RRF).
+
+    Tham số:
+        rankings (List[List[Tuple[str, float]]]): Các danh sách (id, điểm) đã sắp xếp giảm dần.
+        k (int): Hằng số làm mượt của RRF.
+
+    Trả về:
+        List[str]: Danh sách id theo thứ tự điểm RRF giảm dần.
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, (item_id, _score) in enumerate(ranking):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)
+
+# Gộp các truy xuất giống nhau đang diễn ra đồng thời
+_retrieval_flight = SingleFlight("retrieval", enabled=settings.SINGLE_FLIGHT_ENABLED)
+
+async def find_relevant_context(message: str, context_files: Optional[List[str]] = None, ext: str = ".txt") -> str:
+    """
+    Tìm kiếm ngữ cảnh liên quan từ các tệp được cung cấp dựa trên tin nhắn đầu vào.
+
+    Việc truy xuất được thực hiện ở mức chunk, kết hợp hai cách:
+    - Từ khóa: chỉ mục ngược BM25.
+    - Ngữ nghĩa: tìm kiếm cosine top-k trên các vector của chunk.
+    Cả hai dùng chỉ mục chung của các worker (xem `app.services.segment_index`).
+    Hai kết quả được gộp bằng RRF; chỉ đoạn văn bản của các chunk có hạng cao nhất
+    được đọc từ đĩa theo vị trí byte, không nạp toàn bộ tài liệu.
+
+    Các truy xuất giống nhau (cùng tin nhắn đã chuẩn hóa khoảng trắng, cùng tập tài liệu)
+    diễn ra đồng thời chỉ được thực hiện một lần và dùng chung kết quả.
+
+    Tham số:
+        message (str): Tin nhắn đầu vào từ người dùng.
+        context_files (Optional[List[str]]): Danh sách các tệp chứa ngữ cảnh.
+        ext (str): Đuôi tệp cần tìm kiếm. Mặc định là ".txt".
+
+    Trả về:
+        str: Ngữ cảnh liên quan được tìm thấy từ các tệp. Nếu không tìm thấy, trả về chuỗi rỗng.
+    """
+    deadline.stage("retrieval")
+    deadline.check()
+    message = normalize_prompt(message)
+    key = (message, tuple(sorted(set(context_files))) if context_files is not None else None, ext)
+    return await _retrieval_flight.do(key, lambda: _retrieve(message, context_files, ext))
+
+async def _retrieve(message: str, context_files: Optional[List[str]], ext: str) -> str:
+    started = time.perf_counter()
+    # Hủy task không dừng được luồng đang chạy: luồng kiểm tra cờ này giữa các bước
+    abandoned = threading.Event()
+    try:
+        contexts = await asyncio.to_thread(_search, message, context_files, ext, settings.RETRIEVAL_TOP_K, abandoned)
+    except asyncio.CancelledError:
+        abandoned.set()
+        raise
+    metrics.RETRIEVAL_DURATION.observe(time.perf_counter() - started)
+    return "\n\n".join(contexts)
+
+def _check(abandoned: threading.Event) -> None:
+    if abandoned.is_set():
+        raise deadline.RequestCancelled("abandoned")
+    deadline.check()
+
+def _search(message: str, context_files: Optional[List[str]], ext: str, top_k: int,
+            abandoned: threading.Event) -> List[str]:
+    """
+    Các bước truy xuất, chạy trong luồng khác: kiểm tra manifest của chỉ mục có thể phải chờ
+    khóa của tiến trình khác, đọc segment (mmap) và file `.txt` có thể phải chờ đĩa, nên
+    không được chặn event loop.
+
+    Giữa các bước, việc truy xuất dừng nếu `abandoned` được bật (task chờ kết quả đã bị
+    hủy) hoặc request đã bị hủy hay hết thời hạn. Khi dùng chung giữa các request
+    (single-flight), việc truy xuất không thuộc request nào nên chỉ dừng khi không còn
+    request nào chờ kết quả.
+    """
+    # Xếp hạng chunk theo BM25 và theo độ tương đồng vector,
+    # giới hạn trong context_files nếu được cung cấp.
+    keyword_results = segment_index.search_keywords(message, top_k=top_k, doc_ids=context_files)
+    _check(abandoned)
+    query_vector = embed_texts([message])[0]
+    semantic_results = segment_index.search_vectors(query_vector, top_k=top_k, doc_ids=context_files)
+
+    contexts = []
+    for chunk_id in reciprocal_rank_fusion([keyword_results, semantic_results])[:top_k]:
+        _check(abandoned)
+        span = segment_index.span(chunk_id)
+        if span is None:
+            continue
+        doc_id, start, end = span
+        try:
+            content = read_span(os.path.join(settings.UPLOAD_DIR, doc_id + ext), start, end)
+        except OSError as e:
+            print(f"Error reading chunk {chunk_id}: {str(e)}")
+            continue
+        if content:
+            contexts.append(content)
+    return contexts
+
+def build_prompt(message: str, context: str) -> str:
+    """
+    Tạo prompt gửi tới Gemini từ câu hỏi của người dùng và ngữ cảnh đã truy xuất.
+    """
+    return (
+        "Answer the question using only the information from the uploaded documents below. "
+        "If the documents do not contain the answer, say so.\n\n"
+        f"Documents:\n{context}\n\n"
+        f"Question: {message}"
+    )
+
+def context_fingerprint(context: str) -> str:
+    """
+    Dấu vân tay của ngữ cảnh đã truy xuất, dùng trong khóa cache phản hồi của Gemini
+    để câu trả lời được tính lại khi tài liệu thay đổi.
+    """
+    return hashlib.sha256(context.encode("utf-8")).hexdigest()
+
+async def process_chat_message(message: str, context_files: Optional[List[str]] = None, cache: Optional[bool] = None,
+                               client: Optional[str] = None) -> str:
+    """
+    Process a chat message and return a response.
+
+    The most relevant chunks of the uploaded files are retrieved and sent to
+    Gemini together with the question. When nothing relevant is found, Gemini
+    is not called. `cache` opts in/out of the Gemini response cache; `client`
+    identifies the caller for the per-client Gemini rate limit.
+    """
+    try:
+        # Get relevant context from uploaded files (BM25 + vector search)
+        context = await find_relevant_context(message, context_files, ".txt")
+
+        if not context:
+            return "I don't have any relevant information from the uploaded files to answer your question."
+
+        deadline.stage("generation")
+        return await send_async(build_prompt(message, context), cache=cache,
+                                context_fingerprint=context_fingerprint(context), client=client)
+
+    except (deadline.DeadlineExceeded, deadline.RequestCancelled, Overloaded):
+        # Giữ nguyên loại ngoại lệ để endpoint trả về mã lỗi phù hợp
+        raise
+    except Exception as e:
+        raise Exception(f"Error processing chat message: {str(e)}")
+
+async def stream_chat_message(message: str, context_files: Optional[List[str]] = None, cache: Optional[bool] = None,
+                              client: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Process a chat message and stream the response piece by piece as Gemini generates it.
+    """
+    context = await find_relevant_context(message, context_files, ".txt")
+
+    if not context:
+        yield "I don't have any relevant information from the uploaded files to answer your question."
+        return
+
+    deadline.stage("generation")
+    prompt = build_prompt(message, context)
+    chunks = stream_async(prompt, cache=cache, context_fingerprint=context_fingerprint(context), client=client)
+    async with aclosing(chunks) as chunks:
+        async for chunk in chunks:
+            yield chunk
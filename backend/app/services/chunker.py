@@ -0,0 +1,173 @@
+import os
+import json
+import uuid
+
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+from app.core.config import settings
+
+@dataclass(frozen=True)
+class Chunk:
+    """
+    Một đoạn (chunk) văn bản của tài liệu.
+
+    `start` và `end` là vị trí byte (UTF-8) trong file `.txt` đã lưu, nên có thể đọc
+    lại đúng đoạn văn bản bằng `seek` mà không cần nạp toàn bộ file.
+    """
+    chunk_id: str
+    doc_id: str
+    start: int
+    end: int
+    text: str = ""
+
+def make_chunk_id(doc_id: str, index: int) -> str:
+    """
+    Tạo định danh ổn định cho chunk thứ `index` của tài liệu `doc_id`.
+    """
+    return f"{doc_id}#{index:05d}"
+
+def split_into_chunks(doc_id: str, text: str, chunk_size: int = None, overlap: int = None) -> List[Chunk]:
+    """
+    Chia văn bản thành các chunk chồng lấn nhau, mỗi chunk không vượt quá `chunk_size` ký tự.
+
+    Ranh giới chunk được lùi về khoảng trắng gần nhất (nếu có) để không cắt ngang một từ.
+
+    Args:
+        doc_id (str): Định danh tài liệu (tên file đã upload).
+        text (str): Nội dung văn bản đã trích xuất.
+        chunk_size (int): Số ký tự tối đa của một chunk. Mặc định là `settings.CHUNK_SIZE`.
+        overlap (int): Số ký tự chồng lấn giữa hai chunk liên tiếp. Mặc định là `settings.CHUNK_OVERLAP`.
+
+    Returns:
+        List[Chunk]: Danh sách các chunk kèm vị trí byte trong văn bản đã mã hóa UTF-8.
+    """
+    chunk_size = chunk_size or settings.CHUNK_SIZE
+    overlap = settings.CHUNK_OVERLAP if overlap is None else overlap
+    overlap = min(overlap, chunk_size // 2)
+
+    chunks = []
+    start = 0
+    # Vị trí byte tương ứng với vị trí ký tự `start`, được cập nhật dần để tránh mã hóa lại từ đầu
+    start_byte = 0
+    length = len(text)
+
+    while start < length:
+        end = min(start + chunk_size, length)
+        if end < length:
+            # Lùi ranh giới về khoảng trắng gần nhất trong nửa sau của chunk
+            boundary = text.rfind(" ", start + chunk_size // 2, end)
+            newline = text.rfind("\n", start + chunk_size // 2, end)
+            boundary = max(boundary, newline)
+            if boundary > start:
+                end = boundary
+
+        chunk_text = text[start:end]
+        end_byte = start_byte + len(chunk_text.encode("utf-8"))
+        if chunk_text.strip():
+            chunks.append(Chunk(make_chunk_id(doc_id, len(chunks)), doc_id, start_byte, end_byte, chunk_text))
+
+        if end >= length:
+            break
+        next_start = max(end - overlap, start + 1)
+        start_byte += len(text[start:next_start].encode("utf-8"))
+        start = next_start
+
+    return chunks
+
+def read_span(text_path: str, start: int, end: int) -> str:
+    """
+    Đọc một đoạn văn bản từ file `.txt` theo vị trí byte, không nạp toàn bộ file.
+    """
+    with open(text_path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start).decode("utf-8", errors="ignore")
+
+def _is_continuation(byte: int) -> bool:
+    # Byte tiếp nối (10xxxxxx) của một ký tự UTF-8 nhiều byte
+    return byte & 0xC0 == 0x80
+
+def read_text_page(text_path: str, offset: int, length: int) -> Tuple[str, int, Optional[int], int]:
+    """
+    Đọc một trang văn bản khoảng `length` byte bắt đầu từ vị trí byte `offset` của file
+    `.txt`, không nạp toàn bộ file.
+
+    Ranh giới của trang được dời tới ranh giới ký tự UTF-8 gần nhất phía sau (một ký tự
+    không bị cắt đôi), nên có thể đọc lần lượt cả file bằng cách dùng `next_offset` của
+    trang trước làm `offset` của trang sau.
+
+    Returns:
+        Tuple[str, int, Optional[int], int]: Nội dung của trang, vị trí byte bắt đầu thực
+        tế, vị trí byte của trang tiếp theo (None nếu là trang cuối) và kích thước file.
+    """
+    with open(text_path, "rb") as f:
+        total_size = os.fstat(f.fileno()).st_size
+        start = min(offset, total_size)
+        f.seek(start)
+        # Đọc thêm tối đa 3 byte để hoàn tất ký tự cuối cùng của trang
+        data = f.read(length + 3)
+
+    skip = 0
+    while skip < len(data) and skip < 3 and _is_continuation(data[skip]):
+        skip += 1
+    end = min(length, len(data))
+    while end < len(data) and _is_continuation(data[end]):
+        end += 1
+    end = max(end, skip)
+
+    next_offset = start + end
+    return (
+        data[skip:end].decode("utf-8", errors="ignore"),
+        start + skip,
+        next_offset if next_offset < total_size else None,
+        total_size,
+    )
+
+def save_chunks(chunks_path: str, chunks: List[Chunk]) -> None:
+    """
+    Lưu vị trí byte của các chunk vào file `.chunks`.
+
+    Chỉ lưu vị trí (không lưu chunk_id) để cùng một file `.chunks` có thể được dùng chung
+    cho nhiều tài liệu có cùng nội dung (xem `app.services.content_store`).
+    """
+    # Tên file tạm riêng cho mỗi lần ghi: hai tác vụ có thể ghi cùng một file cùng lúc
+    tmp_path = f"{chunks_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([[c.start, c.end] for c in chunks], f)
+        os.replace(tmp_path, chunks_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def load_chunks(doc_id: str, chunks_path: str) -> List[Chunk]:
+    """
+    Đọc danh sách chunk (không kèm nội dung) từ file `.chunks`.
+    """
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        # Định dạng cũ lưu [chunk_id, start, end]: chỉ lấy hai giá trị vị trí cuối
+        spans = [entry[-2:] for entry in json.load(f)]
+    return [Chunk(make_chunk_id(doc_id, i), doc_id, start, end) for i, (start, end) in enumerate(spans)]
+
+def iter_stored_documents() -> Iterator[str]:
+    """
+    Liệt kê doc_id của các tài liệu đã có file `.txt` trích xuất trong thư mục upload.
+    """
+    if not os.path.isdir(settings.UPLOAD_DIR):
+        return
+    for filename in os.listdir(settings.UPLOAD_DIR):
+        if not filename.endswith(".txt"):
+            continue
+        doc_id = filename[:-len(".txt")]
+        # Chỉ lấy các file .txt được sinh ra từ một file upload gốc
+        if os.path.exists(os.path.join(settings.UPLOAD_DIR, doc_id)):
+            yield doc_id
+
+def load_document_chunks(doc_id: str) -> List[Chunk]:
+    """
+    Đọc file `.txt` của tài liệu và chia lại thành chunk (kèm nội dung).
+
+    Vì việc chia chunk là tất định, chunk_id và vị trí byte trùng với các giá trị đã lưu.
+    """
+    with open(os.path.join(settings.UPLOAD_DIR, doc_id + ".txt"), "rb") as f:
+        text = f.read().decode("utf-8")
+    return split_into_chunks(doc_id, text)
@@ -0,0 +1,278 @@
+import time
+import uuid
+import asyncio
+
+from typing import Coroutine, Dict, Optional, Set
+from fastapi import WebSocket
+from app.core import metrics
+from app.core.config import settings
+from app.schemas.chat import ChatStreamChunk
+
+# Mã đóng kết nối WebSocket (RFC 6455)
+CLOSE_NORMAL = 1000
+CLOSE_GOING_AWAY = 1001
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_SERVICE_RESTART = 1012
+
+# Các task đóng kết nối chạy nền: giữ tham chiếu để task không bị thu hồi trước khi xong
+_closing: Set[asyncio.Task] = set()
+
+def close_in_background(connection: "ChatConnection", code: int, reason: str) -> None:
+    """
+    Đóng một kết nối mà không chờ (từ nơi không thể `await`, hoặc không nên chờ client).
+    """
+    task = asyncio.create_task(connection.close(code, reason))
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+class ChatConnection:
+    """
+    Một phiên WebSocket đang mở.
+
+    - Các frame gửi đi được đưa vào hàng đợi có giới hạn (`send_queue_size`) và được một
+      task riêng ghi ra socket, nên nhiều tin nhắn có thể được trả lời cùng lúc. Khi hàng
+      đợi đầy (client đọc chậm hơn tốc độ sinh câu trả lời), kết nối bị đóng thay vì để
+      bộ đệm tăng không giới hạn.
+    - Tối đa `max_in_flight` tin nhắn được xử lý đồng thời, mỗi tin nhắn có một mã
+      (`message_id`) được gửi kèm trong mọi frame trả lời.
+    """
+
+    def __init__(self, websocket: WebSocket, max_in_flight: int, send_queue_size: int):
+        self.websocket = websocket
+        self.connection_id = uuid.uuid4().hex
+        self.max_in_flight = max_in_flight
+        self.connected_at = time.monotonic()
+        self.last_received = self.connected_at
+        self.last_ping = self.connected_at
+        self.closed = False
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        self._queue: asyncio.Queue = asyncio.Queue(send_queue_size)
+        self._writer: Optional[asyncio.Task] = None
+        self._message_count = 0
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def touch(self) -> None:
+        """
+        Ghi nhận vừa nhận được một frame từ client (kể cả `pong`).
+        """
+        self.last_received = time.monotonic()
+
+    def next_message_id(self) -> str:
+        """
+        Mã cho tin nhắn không có `id` (client cũ, gửi lần lượt từng tin nhắn).
+        """
+        self._message_count += 1
+        return str(self._message_count)
+
+    def send(self, frame: str) -> bool:
+        """
+        Đưa một frame vào hàng đợi gửi.
+
+        Returns:
+            bool: False nếu kết nối đã đóng, hoặc hàng đợi đã đầy (client quá chậm, kết nối
+            bị đóng).
+        """
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            metrics.WEBSOCKET_EVICTIONS.labels("slow_consumer").inc()
+            close_in_background(self, CLOSE_POLICY_VIOLATION, "Slow consumer")
+            return False
+
+    async def _write_loop(self) -> None:
+        try:
+            while True:
+                frame = await self._queue.get()
+                await self.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Kết nối đã bị đóng phía client
+            self.closed = True
+
+    def start_message(self, message_id: str, coro: Coroutine) -> Optional[str]:
+        """
+        Xử lý một tin nhắn trong một task riêng.
+
+        Returns:
+            Optional[str]: None nếu tin nhắn đã được nhận xử lý, ngược lại là lý do từ chối.
+        """
+        if message_id in self.in_flight:
+            coro.close()
+            return f"Message {message_id} is already being processed"
+        if len(self.in_flight) >= self.max_in_flight:
+            coro.close()
+            return f"Too many messages in flight (max {self.max_in_flight})"
+        task = asyncio.create_task(coro)
+        self.in_flight[message_id] = task
+        task.add_done_callback(lambda _: self.in_flight.pop(message_id, None))
+        return None
+
+    def cancel_message(self, message_id: str) -> bool:
+        """
+        Hủy việc xử lý một tin nhắn (client yêu cầu `cancel`).
+        """
+        task = self.in_flight.get(message_id)
+        if task is None:
+            return False
+        task.cancel("client_cancel")
+        return True
+
+    async def close(self, code: int = CLOSE_NORMAL, reason: str = "") -> None:
+        """
+        Hủy các tin nhắn đang xử lý, dừng task gửi và đóng kết nối.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        current = asyncio.current_task()
+        for task in list(self.in_flight.values()):
+            if task is not current:
+                task.cancel("disconnect")
+        if self._writer is not None:
+            self._writer.cancel()
+        try:
+            # Client không còn đọc dữ liệu có thể làm việc gửi frame đóng bị treo
+            await asyncio.wait_for(self.websocket.close(code, reason), timeout=5)
+        except Exception:
+            pass
+
+    async def flush(self, timeout: float) -> None:
+        """
+        Chờ các frame còn trong hàng đợi được gửi đi (tối đa `timeout` giây).
+        """
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and not self.closed and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+class ConnectionManager:
+    """
+    Quản lý các phiên WebSocket `/chat` của một tiến trình.
+
+    - Heartbeat: một task duy nhất (không phải một task cho mỗi kết nối) gửi frame `ping`
+      tới các kết nối không có hoạt động sau `heartbeat_interval` giây, và đóng các kết nối
+      không gửi gì (kể cả `pong`) trong `heartbeat_timeout` giây. Kết nối chỉ bị đóng khi
+      client không còn phản hồi, không phải khi người dùng không chat.
+    - Drain: ngừng nhận kết nối và tin nhắn mới, chờ các câu trả lời đang stream hoàn tất
+      rồi đóng các kết nối với mã 1012 (service restart) để client kết nối lại. Trạng thái
+      drain chỉ thuộc về tiến trình này (mỗi worker uvicorn drain riêng) và tự hết sau
+      `drain_expiry` giây (0: không tự hết), hoặc khi gọi `resume()`, để một lần gọi nhầm
+      không làm worker từ chối mọi kết nối cho tới khi khởi động lại.
+    """
+
+    def __init__(self, max_in_flight: int, send_queue_size: int, heartbeat_interval: float,
+                 heartbeat_timeout: float, drain_expiry: float):
+        self.max_in_flight = max_in_flight
+        self.send_queue_size = send_queue_size
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.drain_expiry = drain_expiry
+        self._draining_until: Optional[float] = None
+        self._connections: Dict[str, ChatConnection] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    @property
+    def draining(self) -> bool:
+        if self._draining_until is None:
+            return False
+        if time.monotonic() >= self._draining_until:
+            self._draining_until = None
+            return False
+        return True
+
+    def resume(self) -> bool:
+        """
+        Nhận lại kết nối và tin nhắn mới sau khi drain.
+
+        Returns:
+            bool: False nếu tiến trình không đang drain.
+        """
+        draining = self.draining
+        self._draining_until = None
+        return draining
+
+    @property
+    def connection_count(self) -> int:
+        return len(self._connections)
+
+    @property
+    def in_flight_count(self) -> int:
+        return sum(len(connection.in_flight) for connection in self._connections.values())
+
+    async def connect(self, websocket: WebSocket) -> Optional[ChatConnection]:
+        """
+        Chấp nhận một kết nối WebSocket và đăng ký phiên.
+
+        Returns:
+            Optional[ChatConnection]: Phiên vừa tạo, None nếu server đang drain
+            (kết nối bị từ chối).
+        """
+        if self.draining:
+            await websocket.close(CLOSE_SERVICE_RESTART)
+            return None
+        await websocket.accept()
+        connection = ChatConnection(websocket, self.max_in_flight, self.send_queue_size)
+        connection.start()
+        self._connections[connection.connection_id] = connection
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+        return connection
+
+    async def disconnect(self, connection: ChatConnection) -> None:
+        """
+        Hủy đăng ký một phiên khi kết nối kết thúc.
+        """
+        self._connections.pop(connection.connection_id, None)
+        await connection.close()
+
+    async def _heartbeat_loop(self) -> None:
+        while self._connections:
+            await asyncio.sleep(min(self.heartbeat_interval, self.heartbeat_timeout) / 2)
+            now = time.monotonic()
+            ping = ChatStreamChunk(type="ping").model_dump_json()
+            for connection in list(self._connections.values()):
+                idle = now - connection.last_received
+                if idle > self.heartbeat_timeout:
+                    metrics.WEBSOCKET_EVICTIONS.labels("heartbeat_timeout").inc()
+                    close_in_background(connection, CLOSE_GOING_AWAY, "Heartbeat timeout")
+                elif idle >= self.heartbeat_interval and now - connection.last_ping >= self.heartbeat_interval:
+                    connection.last_ping = now
+                    connection.send(ping)
+
+    async def drain(self, timeout: float) -> Dict[str, int]:
+        """
+        Ngừng nhận kết nối và tin nhắn mới, chờ tối đa `timeout` giây cho các tin nhắn đang
+        xử lý rồi đóng tất cả các kết nối.
+
+        Returns:
+            Dict[str, int]: Số kết nối đã đóng và số tin nhắn bị hủy do hết thời gian chờ.
+        """
+        self._draining_until = time.monotonic() + self.drain_expiry if self.drain_expiry > 0 else float("inf")
+        deadline = time.monotonic() + timeout
+        tasks = [task for connection in self._connections.values() for task in connection.in_flight.values()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        cancelled = sum(1 for task in tasks if not task.done())
+
+        connections = list(self._connections.values())
+        await asyncio.gather(*(c.flush(max(0.0, deadline - time.monotonic())) for c in connections))
+        await asyncio.gather(*(c.close(CLOSE_SERVICE_RESTART, "Server is restarting") for c in connections))
+        self._connections.clear()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        return {"connections": len(connections), "cancelled_messages": cancelled}
+
+# Quản lý phiên WebSocket dùng chung cho toàn bộ ứng dụng
+connection_manager = ConnectionManager(
+    max_in_flight=settings.WS_MAX_IN_FLIGHT,
+    send_queue_size=settings.WS_SEND_QUEUE_SIZE,
+    heartbeat_interval=settings.WS_HEARTBEAT_INTERVAL,
+    heartbeat_timeout=settings.WS_HEARTBEAT_TIMEOUT,
+    drain_expiry=settings.WS_DRAIN_EXPIRY,
+)
@@ -0,0 +1,207 @@
+import os
+import json
+import uuid
+import shutil
+import threading
+
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from app.core.config import settings
+from app.core.file_lock import file_lock
+from app.services.file_processor import EXTRACTOR_VERSION
+
+# Các file được lưu trong một mục (entry) của kho: tên file trong kho -> hậu tố trong thư mục upload
+ARTIFACTS = {
+    "text.txt": ".txt",
+    "chunks.json": ".chunks",
+    "vectors.npy": ".vector",
+}
+SOURCE_NAME = "source"
+
+def link_or_copy(src: str, dst: str) -> None:
+    """
+    Tạo hard link `dst` trỏ tới `src` (thay thế `dst` nếu đã tồn tại).
+    Nếu hệ thống file không hỗ trợ hard link, sao chép file thay thế.
+    """
+    # Tên file tạm riêng cho mỗi lần gọi: hai tác vụ có thể tạo cùng một `dst` cùng lúc
+    tmp_path = f"{dst}.{uuid.uuid4().hex}.link"
+    try:
+        try:
+            os.link(src, tmp_path)
+        except OSError:
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def processing_version() -> str:
+    """
+    Phiên bản của toàn bộ quá trình xử lý: bộ trích xuất, cách chia chunk và số chiều vector.
+    Khi một trong các giá trị này thay đổi, các mục cũ trong kho không còn được sử dụng.
+    """
+    return f"x{EXTRACTOR_VERSION}-c{settings.CHUNK_SIZE}.{settings.CHUNK_OVERLAP}-e{settings.EMBEDDING_DIM}"
+
+class ContentStore:
+    """
+    Kho lưu trữ theo địa chỉ nội dung (content-addressed) cho kết quả trích xuất.
+
+    Mỗi mục được định danh bởi mã SHA-256 của file upload và phiên bản xử lý
+    (`processing_version()`), chứa file gốc, văn bản đã trích xuất, vị trí các chunk
+    và ma trận vector. Khi một file có cùng nội dung được upload lại (kể cả với tên khác),
+    các file này được hard link vào thư mục upload thay vì phải trích xuất và vector hóa lại.
+
+    Kho đếm số tham chiếu (tên file trong thư mục upload) tới mỗi nội dung, một mục chỉ
+    bị xóa khi tham chiếu cuối cùng bị xóa.
+
+    Kho được dùng chung bởi các worker uvicorn: mọi thay đổi (tham chiếu trong `refs.json`,
+    tạo và xóa mục) được thực hiện dưới một khóa file giữa các tiến trình, và `refs.json`
+    được đọc lại dưới khóa đó mỗi lần.
+    """
+
+    def __init__(self, root: str, version: str):
+        self.root = root
+        self.version = version
+        self._refs_path = os.path.join(root, "refs.json")
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        # Khóa giữa các luồng của tiến trình này và giữa các tiến trình (không gọi lồng nhau)
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock, file_lock(os.path.join(self.root, "refs.lock")):
+            yield
+
+    def _load_refs(self) -> Dict[str, str]:
+        try:
+            with open(self._refs_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_refs(self, refs: Dict[str, str]) -> None:
+        tmp_path = f"{self._refs_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(refs, f, ensure_ascii=False)
+            os.replace(tmp_path, self._refs_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _content_dir(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def _entry_dir(self, sha256: str) -> str:
+        return os.path.join(self._content_dir(sha256), self.version)
+
+    def lookup(self, sha256: str) -> Optional[str]:
+        """
+        Tìm mục ứng với nội dung `sha256` được tạo bởi phiên bản trích xuất hiện tại.
+
+        Returns:
+            Optional[str]: Đường dẫn thư mục của mục, hoặc None nếu chưa có.
+        """
+        entry_dir = self._entry_dir(sha256)
+        if all(os.path.exists(os.path.join(entry_dir, name)) for name in list(ARTIFACTS) + [SOURCE_NAME]):
+            return entry_dir
+        return None
+
+    def put(self, sha256: str, doc_id: str) -> None:
+        """
+        Lưu các file đã trích xuất của tài liệu `doc_id` vào kho và ghi nhận tham chiếu.
+        """
+        base_path = os.path.join(settings.UPLOAD_DIR, doc_id)
+        entry_dir = self._entry_dir(sha256)
+        tmp_dir = f"{entry_dir}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(tmp_dir)
+            link_or_copy(base_path, os.path.join(tmp_dir, SOURCE_NAME))
+            for name, ext in ARTIFACTS.items():
+                link_or_copy(base_path + ext, os.path.join(tmp_dir, name))
+
+            with self._exclusive():
+                if self.lookup(sha256) is None:
+                    if os.path.exists(entry_dir):
+                        shutil.rmtree(entry_dir)
+                    os.replace(tmp_dir, entry_dir)
+                # Ngược lại một request khác đã lưu cùng nội dung trước đó
+                self._add_ref(sha256, doc_id)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def reuse(self, sha256: str, doc_id: str) -> bool:
+        """
+        Nếu nội dung `sha256` đã có trong kho: liên kết các file của mục vào thư mục upload
+        dưới tên `doc_id` và ghi nhận tham chiếu. Cả hai được thực hiện dưới khóa, để mục
+        không bị xóa (tham chiếu cuối cùng bị bỏ ở worker khác) giữa chừng.
+
+        Returns:
+            bool: False nếu nội dung chưa có trong kho.
+        """
+        with self._exclusive():
+            entry_dir = self.lookup(sha256)
+            if entry_dir is None:
+                return False
+            self.link_into(entry_dir, doc_id)
+            self._add_ref(sha256, doc_id)
+            return True
+
+    def link_into(self, entry_dir: str, doc_id: str) -> None:
+        """
+        Hard link các file của mục vào thư mục upload dưới tên `doc_id` (file gốc,
+        `.txt`, `.chunks`, `.vector`), thay thế file gốc vừa upload để không lưu trùng.
+        """
+        base_path = os.path.join(settings.UPLOAD_DIR, doc_id)
+        link_or_copy(os.path.join(entry_dir, SOURCE_NAME), base_path)
+        for name, ext in ARTIFACTS.items():
+            link_or_copy(os.path.join(entry_dir, name), base_path + ext)
+
+    def add_ref(self, sha256: str, doc_id: str) -> None:
+        """
+        Ghi nhận tài liệu `doc_id` tham chiếu tới nội dung `sha256`.
+        """
+        with self._exclusive():
+            self._add_ref(sha256, doc_id)
+
+    def _add_ref(self, sha256: str, doc_id: str) -> None:
+        refs = self._load_refs()
+        previous = refs.get(doc_id)
+        refs[doc_id] = sha256
+        self._save_refs(refs)
+        if previous is not None and previous != sha256:
+            self._collect(refs, previous)
+
+    def release(self, doc_id: str) -> None:
+        """
+        Bỏ tham chiếu của tài liệu `doc_id`. Nếu đó là tham chiếu cuối cùng tới nội dung,
+        xóa mục tương ứng khỏi kho.
+        """
+        with self._exclusive():
+            refs = self._load_refs()
+            sha256 = refs.pop(doc_id, None)
+            if sha256 is None:
+                return
+            self._save_refs(refs)
+            self._collect(refs, sha256)
+
+    def ref_count(self, sha256: str) -> int:
+        """
+        Số tài liệu đang tham chiếu tới nội dung `sha256`.
+        """
+        with self._exclusive():
+            return sum(1 for value in self._load_refs().values() if value == sha256)
+
+    def _collect(self, refs: Dict[str, str], sha256: str) -> None:
+        # Xóa tất cả các phiên bản của nội dung khi không còn tham chiếu (đang giữ khóa)
+        if sha256 not in refs.values():
+            content_dir = self._content_dir(sha256)
+            shutil.rmtree(content_dir, ignore_errors=True)
+            try:
+                os.rmdir(os.path.dirname(content_dir))
+            except OSError:
+                # Thư mục tiền tố vẫn còn nội dung khác
+                pass
+
+# Kho nội dung dùng chung cho toàn bộ ứng dụng
+content_store = ContentStore(settings.CONTENT_STORE_DIR, processing_version())
@@ -0,0 +1,164 @@
+import os
+import time
+import base64
+
+from typing import List, Optional, Tuple
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.document import Document
+from app.services.chunker import iter_stored_documents, load_chunks, load_document_chunks
+
+def encode_cursor(uploaded_at: float, filename: str) -> str:
+    """
+    Mã hóa vị trí của tài liệu cuối cùng trong một trang thành con trỏ phân trang.
+    """
+    return base64.urlsafe_b64encode(f"{uploaded_at!r}|{filename}".encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """
+    Giải mã con trỏ phân trang.
+
+    Raises:
+        ValueError: Nếu con trỏ không hợp lệ.
+    """
+    try:
+        uploaded_at, filename = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+        return float(uploaded_at), filename
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+class DocumentCatalog:
+    """
+    Danh mục các file đã upload, lưu trong bảng `documents` của database (`DATABASE_URL`).
+
+    Các hàm nhận `session` cho phép cập nhật danh mục trong cùng một giao dịch với
+    thao tác khác (ví dụ tạo hoặc hoàn tất tác vụ xử lý file).
+    """
+
+    # ----- Các thao tác trong một giao dịch có sẵn -----
+
+    def upsert(self, session: Session, filename: str, size: int, sha256: Optional[str],
+               status: str = "processing", uploaded_at: Optional[float] = None) -> Document:
+        """
+        Thêm tài liệu vào danh mục, hoặc cập nhật nếu tên file đã tồn tại (upload lại).
+        """
+        now = time.time()
+        return session.merge(Document(
+            filename=filename,
+            size=size,
+            sha256=sha256,
+            uploaded_at=uploaded_at or now,
+            status=status,
+            chunk_count=0,
+            updated_at=now,
+        ))
+
+    def set_status(self, session: Session, filename: str, status: str, chunk_count: Optional[int] = None) -> None:
+        """
+        Cập nhật trạng thái (và số chunk) của tài liệu.
+        """
+        document = session.get(Document, filename)
+        if document is None:
+            return
+        document.status = status
+        if chunk_count is not None:
+            document.chunk_count = chunk_count
+        document.updated_at = time.time()
+
+    def delete(self, session: Session, filename: str) -> bool:
+        """
+        Xóa tài liệu khỏi danh mục.
+
+        Returns:
+            bool: True nếu tài liệu có trong danh mục.
+        """
+        result = session.execute(delete(Document).where(Document.filename == filename))
+        return (result.rowcount or 0) > 0
+
+    # ----- Các thao tác tự mở giao dịch (đồng bộ, được gọi qua asyncio.to_thread) -----
+
+    def remove(self, filename: str) -> bool:
+        """
+        Xóa tài liệu khỏi danh mục trong một giao dịch riêng.
+        """
+        with SessionLocal() as session:
+            removed = self.delete(session, filename)
+            session.commit()
+            return removed
+
+    def list(self, limit: int, cursor: Optional[str] = None, status: Optional[str] = None,
+             query: Optional[str] = None, uploaded_after: Optional[float] = None,
+             uploaded_before: Optional[float] = None) -> Tuple[List[Document], Optional[str]]:
+        """
+        Liệt kê tài liệu theo thời gian upload giảm dần, phân trang theo con trỏ
+        (keyset pagination): mỗi trang chỉ đọc `limit` dòng qua chỉ mục `uploaded_at`,
+        không phụ thuộc vào số tài liệu đứng trước.
+
+        Args:
+            limit (int): Số tài liệu tối đa của trang.
+            cursor (Optional[str]): Con trỏ trả về từ trang trước.
+            status (Optional[str]): Chỉ lấy tài liệu có trạng thái này.
+            query (Optional[str]): Chỉ lấy tài liệu có tên chứa chuỗi này (không phân biệt hoa thường).
+            uploaded_after (Optional[float]): Chỉ lấy tài liệu upload sau thời điểm này (timestamp).
+            uploaded_before (Optional[float]): Chỉ lấy tài liệu upload trước thời điểm này (timestamp).
+
+        Returns:
+            Tuple[List[Document], Optional[str]]: Các tài liệu của trang và con trỏ của trang
+            tiếp theo (None nếu đây là trang cuối).
+        """
+        statement = select(Document)
+        if status is not None:
+            statement = statement.where(Document.status == status)
+        if query:
+            statement = statement.where(func.lower(Document.filename).contains(query.lower(), autoescape=True))
+        if uploaded_after is not None:
+            statement = statement.where(Document.uploaded_at > uploaded_after)
+        if uploaded_before is not None:
+            statement = statement.where(Document.uploaded_at < uploaded_before)
+        if cursor:
+            last_uploaded_at, last_filename = decode_cursor(cursor)
+            statement = statement.where(or_(
+                Document.uploaded_at < last_uploaded_at,
+                and_(Document.uploaded_at == last_uploaded_at, Document.filename < last_filename),
+            ))
+        statement = statement.order_by(Document.uploaded_at.desc(), Document.filename.desc()).limit(limit + 1)
+
+        with SessionLocal() as session:
+            documents = list(session.scalars(statement).all())
+
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = encode_cursor(documents[-1].uploaded_at, documents[-1].filename)
+        return documents, next_cursor
+
+    def backfill(self) -> int:
+        """
+        Khi danh mục còn trống, thêm các tài liệu đã xử lý sẵn có trong thư mục upload
+        (dữ liệu được tạo trước khi có danh mục). Chỉ quét thư mục một lần.
+
+        Returns:
+            int: Số tài liệu đã thêm.
+        """
+        with SessionLocal() as session:
+            if session.scalar(select(func.count()).select_from(Document)):
+                return 0
+            count = 0
+            for doc_id in iter_stored_documents():
+                file_path = os.path.join(settings.UPLOAD_DIR, doc_id)
+                if not os.path.exists(file_path + ".vector"):
+                    continue
+                stats = os.stat(file_path)
+                document = self.upsert(session, doc_id, stats.st_size, None, status="ready", uploaded_at=stats.st_mtime)
+                if os.path.exists(file_path + ".chunks"):
+                    document.chunk_count = len(load_chunks(doc_id, file_path + ".chunks"))
+                else:
+                    document.chunk_count = len(load_document_chunks(doc_id))
+                count += 1
+            session.commit()
+            return count
+
+# Danh mục tài liệu dùng chung cho toàn bộ ứng dụng
+document_catalog = DocumentCatalog()
@@ -0,0 +1,209 @@
+import os
+import uuid
+import signal
+import asyncio
+import threading
+import multiprocessing
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set
+from app.core.config import settings
+
+class ExtractionQueueFull(Exception):
+    """
+    Ngoại lệ khi hàng đợi trích xuất đã đầy (quá nhiều tác vụ đang chờ).
+    """
+
+class ExtractionTimeout(Exception):
+    """
+    Ngoại lệ khi một tác vụ trích xuất chạy quá thời gian cho phép.
+    """
+
+# Hàng đợi để tiến trình worker báo cho tiến trình chính khi một tác vụ bắt đầu chạy
+_started_queue = None
+
+def _init_worker(started_queue) -> None:
+    global _started_queue
+    _started_queue = started_queue
+
+def _run_task(token: str, fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Chạy một tác vụ trong tiến trình worker, sau khi báo mã tác vụ và PID của worker.
+    """
+    _started_queue.put((token, os.getpid()))
+    return fn(*args)
+
+class ExtractionPool:
+    """
+    Chạy các tác vụ nặng về CPU (trích xuất văn bản từ PDF, DOCX, XLSX, PPTX, ...)
+    trong một `ProcessPoolExecutor`, để event loop chỉ phải chờ kết quả.
+
+    - Hàng đợi có giới hạn: tối đa `max_workers + max_queue` tác vụ cùng lúc,
+      vượt quá sẽ ném `ExtractionQueueFull`.
+    - Mỗi tác vụ có thời gian chạy tối đa `timeout` giây, tính từ khi một worker bắt đầu
+      chạy tác vụ (không tính thời gian chờ trong hàng đợi), vượt quá sẽ ném
+      `ExtractionTimeout` và tiến trình đang chạy tác vụ đó sẽ bị dừng.
+    - Mỗi worker được thay mới sau `max_tasks_per_child` tác vụ để hạn chế rò rỉ bộ nhớ
+      của các thư viện đọc file.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, timeout: float, max_tasks_per_child: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_tasks_per_child = max_tasks_per_child
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[ProcessPoolExecutor, Set[Future]] = {}
+        self._pending = 0
+        # Mã tác vụ -> future nhận PID của worker khi tác vụ bắt đầu chạy (xem `_run_task`)
+        self._started: Dict[str, asyncio.Future] = {}
+        self._started_queue = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Executor đã ngừng dùng -> các tác vụ bị treo của nó và PID của worker đang chạy chúng
+        self._stuck: Dict[ProcessPoolExecutor, Dict[Future, int]] = {}
+
+    @property
+    def pending(self) -> int:
+        """
+        Số tác vụ đang chạy hoặc đang chờ trong hàng đợi.
+        """
+        return self._pending
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # `max_tasks_per_child` yêu cầu phương thức khởi tạo tiến trình "spawn"
+            context = multiprocessing.get_context("spawn")
+            if self._started_queue is None:
+                self._started_queue = context.SimpleQueue()
+                threading.Thread(target=self._read_started, args=(self._started_queue,),
+                                 name="extraction-started", daemon=True).start()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                max_tasks_per_child=self.max_tasks_per_child,
+                initializer=_init_worker,
+                initargs=(self._started_queue,),
+            )
+            self._inflight[self._executor] = set()
+        return self._executor
+
+    def _read_started(self, started_queue) -> None:
+        """
+        Luồng nền nhận các thông báo bắt đầu chạy tác vụ từ các worker.
+        """
+        while True:
+            message = started_queue.get()
+            if message is None:
+                return
+            try:
+                self._loop.call_soon_threadsafe(self._set_started, *message)
+            except RuntimeError:
+                # Event loop đã đóng
+                pass
+
+    def _set_started(self, token: str, pid: int) -> None:
+        started = self._started.get(token)
+        if started is not None and not started.done():
+            started.set_result(pid)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Chạy `fn(*args)` trong một tiến trình worker và chờ kết quả.
+
+        Args:
+            fn (Callable): Hàm cấp module (có thể pickle được) cần chạy.
+            *args: Các tham số truyền vào `fn`.
+            timeout (Optional[float]): Thời gian chạy tối đa (giây), tính từ khi tác vụ bắt
+                đầu chạy trong worker. Mặc định là `self.timeout`.
+
+        Returns:
+            Any: Kết quả trả về của `fn`.
+
+        Raises:
+            ExtractionQueueFull: Nếu hàng đợi đã đầy.
+            ExtractionTimeout: Nếu tác vụ chạy quá thời gian cho phép.
+        """
+        if self._pending >= self.max_workers + self.max_queue:
+            raise ExtractionQueueFull(f"Extraction queue is full ({self._pending} jobs pending)")
+
+        # Import tại đây để các tiến trình worker (cũng import module này) không tạo metrics riêng
+        from app.core import metrics
+
+        self._loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        token = uuid.uuid4().hex
+        started = self._started[token] = self._loop.create_future()
+        future = executor.submit(_run_task, token, fn, *args)
+        self._inflight[executor].add(future)
+        self._pending += 1
+        metrics.EXTRACTION_QUEUE_DEPTH.inc()
+        result = asyncio.wrap_future(future)
+        try:
+            # Chờ một worker rảnh: thời gian chờ trong hàng đợi không tính vào `timeout`
+            await asyncio.wait({started, result}, return_when=asyncio.FIRST_COMPLETED)
+            return await asyncio.wait_for(asyncio.shield(result), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            if result.done():
+                # TimeoutError do chính tác vụ ném ra
+                raise
+            # Bỏ kết quả (lỗi của executor khi worker bị dừng)
+            result.cancel()
+            self._retire(executor, future, started.result())
+            raise ExtractionTimeout(f"Extraction timed out after {timeout or self.timeout} seconds")
+        except asyncio.CancelledError:
+            # Bên gọi không còn chờ: bỏ tác vụ nếu nó chưa bắt đầu chạy
+            future.cancel()
+            raise
+        finally:
+            self._started.pop(token, None)
+            self._pending -= 1
+            metrics.EXTRACTION_QUEUE_DEPTH.dec()
+            inflight = self._inflight.get(executor)
+            if inflight is not None:
+                inflight.discard(future)
+                if not inflight and executor in self._stuck:
+                    self._shutdown_retired(executor)
+
+    def _retire(self, executor: ProcessPoolExecutor, stuck: Future, pid: int) -> None:
+        """
+        Ngừng dùng executor có tác vụ bị treo (đang chạy trong worker `pid`): các tác vụ mới
+        sẽ chạy trên executor mới, các tác vụ khác của executor cũ được chạy xong rồi mới
+        dừng các worker đang chạy tác vụ bị treo (dừng một worker khi các worker khác còn
+        đang chạy làm hỏng cả executor và các tác vụ đó).
+        """
+        self._stuck.setdefault(executor, {})[stuck] = pid
+        if executor is self._executor:
+            self._executor = None
+
+    def _shutdown_retired(self, executor: ProcessPoolExecutor) -> None:
+        for future, pid in self._stuck.pop(executor).items():
+            if not future.done():
+                # Worker vẫn đang chạy tác vụ bị treo nên PID chưa thể được dùng lại
+                try:
+                    os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+                except OSError:
+                    pass
+        self._inflight.pop(executor, None)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        """
+        Dừng tất cả các worker (gọi khi ứng dụng tắt).
+        """
+        for executor in list(self._stuck.keys()):
+            self._shutdown_retired(executor)
+        for executor in list(self._inflight.keys()):
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._inflight.clear()
+        self._executor = None
+        if self._started_queue is not None:
+            self._started_queue.put(None)
+            self._started_queue = None
+
+# Pool trích xuất dùng chung cho toàn bộ ứng dụng
+extraction_pool = ExtractionPool(
+    max_workers=settings.EXTRACTION_WORKERS,
+    max_queue=settings.EXTRACTION_MAX_QUEUE,
+    timeout=settings.EXTRACTION_TIMEOUT,
+    max_tasks_per_child=settings.EXTRACTION_MAX_TASKS_PER_WORKER,
+)
@@ -1,88 +1,248 @@
-from langchain_community.document_loaders import (
-    Docx2txtLoader,
-    UnstructuredExcelLoader,
-    TextLoader,
-    CSVLoader,
-    PyPDFLoader,
-)
-import os
-from pptx import Presentation
-
-async def process_file(file_path: str, file_extension: str) -> str:
-    """
-    Process different types of files and extract text using LangChain
-    """
-    try:
-        if file_extension.lower() == "docx":
-            loader = Docx2txtLoader(file_path)
-        elif file_extension.lower() in ["xlsx"]:
-            loader = UnstructuredExcelLoader(file_path, mode="elements")
-        elif file_extension.lower() in ["pptx"]:
-            return extract_text_from_pptx(file_path).strip()
-        elif file_extension.lower() in ["pdf"]:
-            loader = PyPDFLoader(file_path)
-        elif file_extension.lower() in ["csv"]:
-            loader = CSVLoader(file_path)
-        else:
-            loader = TextLoader(file_path)
-
-        documents = loader.load()
-        extracted_text = ""
-
-        for doc in documents:
-            extracted_text += doc.page_content + "\n"
-
-        return extracted_text.strip()
-
-    except Exception as e:
-        raise Exception(f"Error processing file: {str(e)}")
-    # finally:
-        # Clean up the uploaded file
-        # if os.path.exists(file_path):
-        #    os.remove(file_path)
-
-
-def extract_text_from_pptx(pptx_path):
-    """
-    Extract all text from a PowerPoint file
-
-    Args:
-        pptx_path (str): Path to the PowerPoint file
-
-    Returns:
-        dict: Dictionary with slide numbers as keys and text content as values
-    """
-    if not os.path.exists(pptx_path):
-        raise FileNotFoundError(f"File not found: {pptx_path}")
-
-    # Load the presentation
-    prs = Presentation(pptx_path)
-
-    # Dictionary to store slide content
-    slides_text = {}
-
-    # Process each slide
-    for i, slide in enumerate(prs.slides, 1):
-        text_content = []
-
-        # Extract text from shapes
-        for shape in slide.shapes:
-            if hasattr(shape, "text") and shape.text:
-                text_content.append(shape.text)
-
-        # Extract text from tables
-        for shape in slide.shapes:
-            if shape.has_table:
-                table = shape.table
-                for row in table.rows:
-                    row_text = []
-                    for cell in row.cells:
-                        if cell.text:
-                            row_text.append(cell.text)
-                    if row_text:
-                        text_content.append(" | ".join(row_text))
-
-        # Join all text elements with newlines
-        slides_text[f"Slide {i}"] = "\n".join(text_content)
-
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.services.extraction_pool import extraction_pool
+from app.services.ocr import OCRUnavailable, ScannedPage, find_scanned_pages, ocr_page
+
+# Bump whenever extraction output changes (parser upgrade, new options, ...)
+# so cached extraction results in the content store are invalidated
+EXTRACTOR_VERSION = "2"
+
+async def process_file(file_path: str, file_extension: str,
+                       on_pages: Optional[Callable[[int, int], Awaitable[None]]] = None) -> str:
+    """
+    Process different types of files and extract text.
+
+    The parsers are synchronous and CPU bound, so the extraction runs in the
+    shared process pool and the event loop only awaits the result. Pages of a
+    PDF without a text layer (scans) are recognized with OCR, one pool task per
+    page (see `_ocr_pages`).
+
+    Args:
+        on_pages: Called with (pages done, pages to recognize) as OCR progresses
+
+    Raises:
+        ExtractionQueueFull: If too many extraction jobs are already pending
+        ExtractionTimeout: If the extraction takes longer than EXTRACTION_TIMEOUT
+    """
+    # Imported here so the extraction worker processes (which import this module
+    # for `extract_text`) do not register metrics of their own
+    from app.core import metrics
+
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        if file_extension.lower() == "pdf":
+            text = await _process_pdf(file_path, on_pages)
+        else:
+            text = await _run_in_pool(file_extension.lower(), extract_text, file_path, file_extension)
+        outcome = "ok"
+        return text
+    finally:
+        metrics.EXTRACTION_DURATION.labels(file_extension.lower(), outcome).observe(time.perf_counter() - started)
+
+
+async def _run_in_pool(label: str, fn, *args):
+    from app.core import profiler
+
+    session = profiler.current_session()
+    if session is None:
+        return await extraction_pool.run(fn, *args)
+    # The sampler of this process cannot see the worker process, so the
+    # worker samples itself and its stacks are merged into the profile
+    result, samples = await extraction_pool.run(profiler.run_profiled, fn, session.interval, *args)
+    session.merge(samples, prefix=f"extraction_worker ({label})")
+    return result
+
+
+async def _process_pdf(file_path: str, on_pages: Optional[Callable[[int, int], Awaitable[None]]]) -> str:
+    min_chars = settings.OCR_MIN_PAGE_CHARS if settings.OCR_ENABLED else 0
+    page_texts, scanned = await _run_in_pool("pdf", extract_pdf_pages, file_path, min_chars)
+    if scanned:
+        await _ocr_pages(file_path, page_texts, scanned, on_pages)
+    return "\n".join(page_texts).strip()
+
+
+async def _ocr_pages(file_path: str, page_texts: List[str], scanned: List[ScannedPage],
+                     on_pages: Optional[Callable[[int, int], Awaitable[None]]]) -> None:
+    """
+    Recognize the scanned pages of a PDF and put their text into `page_texts`.
+
+    Pages are recognized concurrently, one extraction pool task each (at most
+    OCR_CONCURRENCY at a time), so a long scan is spread over all the workers.
+    Each page is cached by content hash as soon as it is recognized: a retry
+    after a failed page, or a re-upload of the same scan, only recognizes the
+    pages that are not cached yet.
+    """
+    from app.core import metrics
+    from app.services.ocr import ocr_cache
+
+    done = 0
+
+    async def report() -> None:
+        if on_pages is not None:
+            await on_pages(done, len(scanned))
+
+    # Identical pages (same content hash) are recognized once
+    pending: Dict[Any, List[ScannedPage]] = {}
+    for page in scanned:
+        cached = await asyncio.to_thread(ocr_cache.get, page.digest) if page.digest else None
+        if cached is None:
+            pending.setdefault(page.digest or page.index, []).append(page)
+        else:
+            page_texts[page.index] = cached
+            done += 1
+            metrics.OCR_PAGES.labels("cached").inc()
+    await report()
+
+    slots = asyncio.Semaphore(settings.OCR_CONCURRENCY or extraction_pool.max_workers)
+
+    async def recognize(pages: List[ScannedPage]) -> None:
+        nonlocal done
+        page = pages[0]
+        async with slots:
+            started = time.perf_counter()
+            try:
+                text = await _run_in_pool("ocr", ocr_page, file_path, page, settings.OCR_DPI,
+                                          settings.OCR_MAX_PIXELS, settings.OCR_LANGUAGES, settings.OCR_PAGE_TIMEOUT)
+            except Exception:
+                metrics.OCR_PAGES.labels("error").inc()
+                raise
+            metrics.OCR_PAGE_DURATION.observe(time.perf_counter() - started)
+        metrics.OCR_PAGES.labels("ocr").inc(len(pages))
+        for same in pages:
+            page_texts[same.index] = text
+        if page.digest:
+            await asyncio.to_thread(ocr_cache.put, page.digest, text)
+        done += len(pages)
+        await report()
+
+    # Let the other pages finish (and be cached) when one of them fails
+    results = await asyncio.gather(*(recognize(pages) for pages in pending.values()), return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if any(isinstance(error, OCRUnavailable) for error in errors):
+        # Same behavior as before OCR support: the scanned pages stay empty
+        print(f"OCR unavailable, {len(scanned) - done} scanned pages of {file_path} are not indexed: {errors[0]}")
+        return
+    if errors:
+        raise errors[0]
+
+
+def preload_loaders() -> None:
+    """
+    Import the format loaders ahead of the first extraction (used by the warm-up hook).
+    The loaders are otherwise imported lazily by `extract_text`, since they are only
+    needed in the extraction worker processes and are slow to import.
+    """
+    import langchain_community.document_loaders  # noqa: F401
+    import pptx  # noqa: F401
+
+
+def extract_text(file_path: str, file_extension: str) -> str:
+    """
+    Process different types of files and extract text using LangChain.
+    Runs in a worker process of the extraction pool.
+    """
+    from langchain_community.document_loaders import (
+        Docx2txtLoader,
+        UnstructuredExcelLoader,
+        TextLoader,
+        CSVLoader,
+        PyPDFLoader,
+    )
+
+    try:
+        if file_extension.lower() == "docx":
+            loader = Docx2txtLoader(file_path)
+        elif file_extension.lower() in ["xlsx"]:
+            loader = UnstructuredExcelLoader(file_path, mode="elements")
+        elif file_extension.lower() in ["pptx"]:
+            return extract_text_from_pptx(file_path).strip()
+        elif file_extension.lower() in ["pdf"]:
+            loader = PyPDFLoader(file_path)
+        elif file_extension.lower() in ["csv"]:
+            loader = CSVLoader(file_path)
+        else:
+            loader = TextLoader(file_path)
+
+        documents = loader.load()
+        extracted_text = ""
+
+        for doc in documents:
+            extracted_text += doc.page_content + "\n"
+
+        return extracted_text.strip()
+
+    except Exception as e:
+        raise Exception(f"Error processing file: {str(e)}")
+    # finally:
+        # Clean up the uploaded file
+        # if os.path.exists(file_path):
+        #    os.remove(file_path)
+
+
+def extract_pdf_pages(file_path: str, ocr_min_chars: int) -> Tuple[List[str], List[ScannedPage]]:
+    """
+    Extract the text layer of each page of a PDF, and find the pages with fewer
+    than `ocr_min_chars` characters of text (scans) to recognize with OCR.
+    Runs in a worker process of the extraction pool.
+    """
+    from langchain_community.document_loaders import PyPDFLoader
+
+    try:
+        page_texts = [doc.page_content for doc in PyPDFLoader(file_path).load()]
+    except Exception as e:
+        raise Exception(f"Error processing file: {str(e)}")
+    if ocr_min_chars <= 0:
+        return page_texts, []
+    return page_texts, find_scanned_pages(file_path, page_texts, ocr_min_chars)
+
+
+def extract_text_from_pptx(pptx_path):
+    """
+    Extract all text from a PowerPoint file
+
+    Args:
+        pptx_path (str): Path to the PowerPoint file
+
+    Returns:
+        dict: Dictionary with slide numbers as keys and text content as values
+    """
+    from pptx import Presentation
+
+    if not os.path.exists(pptx_path):
+        raise FileNotFoundError(f"File not found: {pptx_path}")
+
+    # Load the presentation
+    prs = Presentation(pptx_path)
+
+    # Dictionary to store slide content
+    slides_text = {}
+
+    # Process each slide
+    for i, slide in enumerate(prs.slides, 1):
+        text_content = []
+
+        # Extract text from shapes
+        for shape in slide.shapes:
+            if hasattr(shape, "text") and shape.text:
+                text_content.append(shape.text)
+
+        # Extract text from tables
+        for shape in slide.shapes:
+            if shape.has_table:
+                table = shape.table
+                for row in table.rows:
+                    row_text = []
+                    for cell in row.cells:
+                        if cell.text:
+                            row_text.append(cell.text)
+                    if row_text:
+                        text_content.append(" | ".join(row_text))
+
+        # Join all text elements with newlines
+        slides_text[f"Slide {i}"] = "\n".join(text_content)
+
     return "\n".join(slides_text.values())
\ No newline at end of file
@@ -0,0 +1,224 @@
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+import threading
+
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List, Optional
+from app.core.config import settings
+from app.services.llm_cache import normalize_prompt
+
+# Các mô hình thay thế cho client Gemini, có cùng giao diện `generate_content_async`
+# (phản hồi có thuộc tính `text`, hoặc là async iterator các đoạn khi `stream=True`).
+# Được chọn qua `GEMINI_BACKEND` (xem `gemini_service.get_model`) để kiểm thử tải
+# mà không gọi Gemini thật.
+
+_WORDS = (
+    "tài liệu dữ liệu hệ thống người dùng phản hồi thông tin nội dung xử lý kết quả câu hỏi "
+    "mô hình tìm kiếm văn bản ngữ cảnh truy xuất đoạn trích tổng hợp phân tích báo cáo"
+).split()
+
+class FakeGeminiError(Exception):
+    """
+    Lỗi được mô hình giả lập cố ý sinh ra (error injection), được coi là lỗi tạm thời
+    của Gemini (HTTP 503).
+    """
+    code = 503
+
+class ReplayMissError(Exception):
+    """
+    Không có phản hồi đã ghi cho prompt ở chế độ replay.
+    """
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+class _StreamResponse:
+    def __init__(self, chunks: AsyncIterator[str]):
+        self._chunks = chunks
+
+    def __aiter__(self):
+        async def iterate():
+            async for text in self._chunks:
+                yield _Response(text)
+        return iterate()
+
+def prompt_key(prompt: str) -> str:
+    """
+    Khóa của prompt (đã chuẩn hóa khoảng trắng) trong file ghi phản hồi.
+    """
+    return hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+
+class FakeGenerativeModel:
+    """
+    Mô hình Gemini giả lập chạy hoàn toàn cục bộ.
+
+    - Độ trễ tới đoạn đầu tiên theo phân phối cấu hình được: fixed, uniform, normal,
+      lognormal hoặc exponential (trung bình `latency_ms`, độ lệch `jitter_ms`).
+    - Câu trả lời được sinh tất định từ prompt, gồm `response_tokens` từ, được stream
+      với tốc độ `tokens_per_second`.
+    - Mỗi request có xác suất `error_rate` bị lỗi (trước đoạn đầu tiên hoặc giữa chừng
+      khi streaming).
+    """
+
+    def __init__(self, latency_ms: float, jitter_ms: float, distribution: str, tokens_per_second: float,
+                 response_tokens: int, error_rate: float, seed: Optional[int] = None, chunk_tokens: int = 8):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.chunk_tokens = chunk_tokens
+        self._rng = random.Random(seed)
+
+    @classmethod
+    def from_settings(cls) -> "FakeGenerativeModel":
+        return cls(
+            latency_ms=settings.GEMINI_FAKE_LATENCY_MS,
+            jitter_ms=settings.GEMINI_FAKE_LATENCY_JITTER_MS,
+            distribution=settings.GEMINI_FAKE_LATENCY_DISTRIBUTION,
+            tokens_per_second=settings.GEMINI_FAKE_TOKENS_PER_SECOND,
+            response_tokens=settings.GEMINI_FAKE_RESPONSE_TOKENS,
+            error_rate=settings.GEMINI_FAKE_ERROR_RATE,
+            seed=settings.GEMINI_FAKE_SEED,
+        )
+
+    def _latency(self) -> float:
+        mean, jitter = self.latency_ms / 1000, self.jitter_ms / 1000
+        if self.distribution == "fixed" or mean <= 0:
+            value = mean
+        elif self.distribution == "uniform":
+            value = self._rng.uniform(mean - jitter, mean + jitter)
+        elif self.distribution == "normal":
+            value = self._rng.gauss(mean, jitter)
+        elif self.distribution == "exponential":
+            value = self._rng.expovariate(1 / mean)
+        elif self.distribution == "lognormal":
+            # Tham số hóa theo trung bình và độ lệch chuẩn của chính phân phối log-normal
+            sigma2 = math.log(1 + (jitter / mean) ** 2)
+            value = self._rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+        else:
+            raise ValueError(f"Unknown latency distribution: {self.distribution}")
+        return max(0.0, value)
+
+    def _tokens(self, prompt: str) -> List[str]:
+        rng = random.Random(prompt_key(prompt))
+        return [rng.choice(_WORDS) for _ in range(self.response_tokens)]
+
+    def _should_fail(self) -> bool:
+        return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs):
+        fail = self._should_fail()
+        await asyncio.sleep(self._latency())
+        tokens = self._tokens(prompt)
+
+        if not stream:
+            if fail:
+                raise FakeGeminiError("Injected Gemini error")
+            if self.tokens_per_second > 0:
+                await asyncio.sleep(len(tokens) / self.tokens_per_second)
+            return _Response(" ".join(tokens))
+
+        # Lỗi khi streaming xảy ra giữa chừng, sau khi đã gửi một phần câu trả lời
+        fail_at = self._rng.randint(0, max(0, len(tokens) - 1)) if fail else None
+
+        async def chunks() -> AsyncIterator[str]:
+            for start in range(0, len(tokens), self.chunk_tokens):
+                if fail_at is not None and start >= fail_at:
+                    raise FakeGeminiError("Injected Gemini error while streaming")
+                part = tokens[start:start + self.chunk_tokens]
+                if start > 0 and self.tokens_per_second > 0:
+                    await asyncio.sleep(len(part) / self.tokens_per_second)
+                yield " ".join(part) + " "
+            if fail_at is not None:
+                raise FakeGeminiError("Injected Gemini error while streaming")
+
+        return _StreamResponse(chunks())
+
+class RecordingModel:
+    """
+    Bọc client Gemini thật: mỗi phản hồi (kể cả từng đoạn khi streaming và thời gian
+    giữa các đoạn) được ghi thêm vào file JSONL để phát lại sau bằng `ReplayModel`.
+    """
+
+    def __init__(self, model, path: str):
+        self.model = model
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _append(self, prompt: str, chunks: List[str], delays: List[float]) -> None:
+        record = {"key": prompt_key(prompt), "chunks": chunks, "delays": delays, "recorded_at": time.time()}
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs):
+        started = time.perf_counter()
+        response = await self.model.generate_content_async(prompt, stream=stream, **kwargs)
+        if not stream:
+            await asyncio.to_thread(self._append, prompt, [response.text], [time.perf_counter() - started])
+            return response
+
+        async def chunks() -> AsyncIterator[str]:
+            parts, delays = [], []
+            last = started
+            async for chunk in response:
+                now = time.perf_counter()
+                parts.append(chunk.text)
+                delays.append(now - last)
+                last = now
+                yield chunk.text
+            # Chỉ ghi khi đã nhận đủ toàn bộ phản hồi
+            await asyncio.to_thread(self._append, prompt, parts, delays)
+
+        return _StreamResponse(chunks())
+
+class ReplayModel:
+    """
+    Phát lại các phản hồi đã ghi bởi `RecordingModel`, không gọi Gemini.
+
+    Một prompt được ghi nhiều lần sẽ được phát lại lần lượt theo thứ tự ghi (quay vòng),
+    nên cùng một chuỗi request luôn nhận cùng một chuỗi phản hồi. Với `timing=True`,
+    thời gian chờ giữa các đoạn được tái hiện như lúc ghi.
+    """
+
+    def __init__(self, path: str, timing: bool = False):
+        self.path = path
+        self.timing = timing
+        self._records: Dict[str, List[dict]] = defaultdict(list)
+        self._positions: Dict[str, int] = defaultdict(int)
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self._records[record["key"]].append(record)
+
+    def _next(self, prompt: str) -> dict:
+        key = prompt_key(prompt)
+        records = self._records.get(key)
+        if not records:
+            raise ReplayMissError(f"No recorded response for prompt {key[:12]}")
+        position = self._positions[key]
+        self._positions[key] = position + 1
+        return records[position % len(records)]
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs):
+        record = self._next(prompt)
+        if not stream:
+            if self.timing:
+                await asyncio.sleep(sum(record["delays"]))
+            return _Response("".join(record["chunks"]))
+
+        async def chunks() -> AsyncIterator[str]:
+            for text, delay in zip(record["chunks"], record["delays"]):
+                if self.timing:
+                    await asyncio.sleep(delay)
+                yield text
+
+        return _StreamResponse(chunks())
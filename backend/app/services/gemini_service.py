@@ -1,52 +1,386 @@
-import google.generativeai as genai
-
-from app.core.config import settings
-
-genai.configure(api_key=settings.GOOGLE_API_KEY)
-
-# Set up the model
-generation_config = {
-    "temperature": 0.9,
-    "top_p": 1,
-    "top_k": 1,
-    "max_output_tokens": 4096,
-}
-
-safety_settings = [
-    {
-        "category": "HARM_CATEGORY_HARASSMENT",
-        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-    },
-    {
-        "category": "HARM_CATEGORY_HATE_SPEECH",
-        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-    },
-    {
-        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-    },
-    {
-        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-    }
-]
-
-model = genai.GenerativeModel(model_name="models/gemini-2.0-flash-001",
-                              generation_config=generation_config,
-                              safety_settings=safety_settings)
-
-def send_async(prompt: str) -> str:
-    """
-    Gửi yêu cầu đến mô hình Gemini và nhận phản hồi không đồng bộ.
-
-    Args:
-        prompt (str): Chuỗi đầu vào để gửi đến mô hình Gemini.
-
-    Returns:
-        str: Phản hồi từ mô hình Gemini.
-    """
-    try:
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        raise Exception(f"Error generating response from Gemini: {str(e)}")
+import time
+import asyncio
+import threading
+
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Optional
+from app.core import deadline, metrics
+from app.core.config import settings
+from app.services.llm_cache import llm_cache, make_cache_key
+from app.services.resilience import AdmissionController, CircuitBreaker, backoff_delay, is_rate_limit, is_transient
+from app.services.single_flight import SingleFlight
+
+# Set up the model
+generation_config = {
+    "temperature": 0.9,
+    "top_p": 1,
+    "top_k": 1,
+    "max_output_tokens": 4096,
+}
+
+safety_settings = [
+    {
+        "category": "HARM_CATEGORY_HARASSMENT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_HATE_SPEECH",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    }
+]
+
+MODEL_NAME = "models/gemini-2.0-flash-001"
+
+# Client Gemini chỉ được import và khởi tạo ở request đầu tiên (hoặc khi warm-up),
+# vì import google.generativeai mất khoảng 1 giây khi khởi động worker
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """
+    Trả về client mô hình Gemini dùng chung, khởi tạo ở lần gọi đầu tiên.
+
+    Mô hình được chọn theo `GEMINI_BACKEND`: Gemini thật ("live"), mô hình giả lập cục bộ
+    ("fake"), Gemini thật có ghi lại phản hồi ("record") hoặc chỉ phát lại các phản hồi
+    đã ghi ("replay"), xem `app.services.gemini_backends`.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = _create_model()
+    return _model
+
+def _create_model():
+    backend = settings.GEMINI_BACKEND
+    if backend == "fake":
+        from app.services.gemini_backends import FakeGenerativeModel
+        return FakeGenerativeModel.from_settings()
+    if backend == "replay":
+        from app.services.gemini_backends import ReplayModel
+        return ReplayModel(settings.GEMINI_RECORDINGS_PATH, timing=settings.GEMINI_REPLAY_TIMING)
+    if backend not in ("live", "record"):
+        raise ValueError(f"Unknown GEMINI_BACKEND: {backend}")
+
+    import google.generativeai as genai
+    genai.configure(api_key=settings.GOOGLE_API_KEY)
+    model = genai.GenerativeModel(model_name=MODEL_NAME,
+                                  generation_config=generation_config,
+                                  safety_settings=safety_settings)
+    if backend == "record":
+        from app.services.gemini_backends import RecordingModel
+        return RecordingModel(model, settings.GEMINI_RECORDINGS_PATH)
+    return model
+
+# Giới hạn số request đồng thời tới Gemini trong mỗi worker
+_semaphore = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+
+# Gộp các request giống nhau đang diễn ra đồng thời
+_flight = SingleFlight("gemini", enabled=settings.SINGLE_FLIGHT_ENABLED)
+
+# Giới hạn tốc độ (toàn cục và theo client) và circuit breaker cho các request tới Gemini
+admission = AdmissionController(
+    "gemini",
+    rate=settings.GEMINI_RATE_LIMIT,
+    burst=settings.GEMINI_RATE_BURST,
+    client_rate=settings.GEMINI_CLIENT_RATE_LIMIT,
+    client_burst=settings.GEMINI_CLIENT_RATE_BURST,
+    max_queue=settings.GEMINI_MAX_QUEUE,
+)
+breaker = CircuitBreaker("gemini", settings.GEMINI_BREAKER_FAILURES, settings.GEMINI_BREAKER_RESET)
+
+class GeminiTimeout(deadline.DeadlineExceeded):
+    """
+    Ngoại lệ khi request tới Gemini vượt quá thời hạn cho phép.
+    """
+
+def _cache_key(prompt: str, cache: Optional[bool], context_fingerprint: str) -> Optional[str]:
+    """
+    Trả về khóa cache của prompt, hoặc None nếu không dùng cache cho request này.
+
+    Khi `temperature` khác 0, câu trả lời không tất định nên cache chỉ được dùng
+    khi request yêu cầu rõ ràng (`cache=True`).
+    """
+    enabled = cache if cache is not None else generation_config["temperature"] == 0
+    if not enabled:
+        return None
+    return make_cache_key(prompt, MODEL_NAME, generation_config, context_fingerprint)
+
+async def send_async(prompt: str, timeout: Optional[float] = None, cache: Optional[bool] = None,
+                     context_fingerprint: str = "", client: Optional[str] = None) -> str:
+    """
+    Gửi yêu cầu đến mô hình Gemini và nhận phản hồi không đồng bộ.
+
+    Dùng API bất đồng bộ của Gemini (`generate_content_async`) trên client dùng chung,
+    nên event loop không bị chặn trong khi chờ phản hồi. Số request đồng thời bị giới hạn
+    bởi `GEMINI_MAX_CONCURRENCY` và tốc độ gửi bởi `admission`; thời gian chờ trong hàng
+    đợi cũng được tính vào thời hạn. Lỗi tạm thời (429, 5xx) được thử lại với backoff có
+    jitter trong thời hạn; khi Gemini liên tục lỗi, request bị từ chối ngay (`breaker`).
+    Các request giống nhau (cùng prompt đã chuẩn hóa và cùng ngữ cảnh) diễn ra đồng thời
+    chỉ gọi Gemini một lần và nhận chung kết quả (xem `app.services.single_flight`).
+    Nếu coroutine bị hủy (ví dụ client ngắt kết nối), bên gọi ngừng chờ; request tới
+    Gemini chỉ bị hủy khi không còn bên nào chờ kết quả.
+
+    Args:
+        prompt (str): Chuỗi đầu vào để gửi đến mô hình Gemini.
+        timeout (Optional[float]): Thời hạn (giây) cho toàn bộ request.
+            Mặc định là `GEMINI_TIMEOUT`, không vượt quá thời hạn còn lại của request chat
+            (xem `app.core.deadline`).
+        cache (Optional[bool]): Có dùng cache phản hồi hay không. Mặc định chỉ dùng khi
+            `temperature` bằng 0.
+        context_fingerprint (str): Dấu vân tay của ngữ cảnh đã truy xuất, là một phần của khóa cache.
+        client (Optional[str]): Định danh của client (ví dụ địa chỉ IP) cho giới hạn tốc độ
+            theo client.
+
+    Returns:
+        str: Phản hồi từ mô hình Gemini.
+
+    Raises:
+        GeminiTimeout: Nếu request vượt quá thời hạn.
+        Overloaded: Nếu request bị từ chối do quá tải, client vượt giới hạn (`RateLimited`)
+            hoặc Gemini đang không hoạt động (`CircuitOpen`).
+    """
+    cache_key = _cache_key(prompt, cache, context_fingerprint)
+    if cache_key is not None:
+        cached = await llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    requested = timeout or settings.GEMINI_TIMEOUT
+    timeout = deadline.limit(requested)
+
+    key = ("unary", make_cache_key(prompt, MODEL_NAME, generation_config, context_fingerprint), cache_key is not None)
+    try:
+        return await asyncio.wait_for(_flight.do(key, lambda: _generate(prompt, requested, cache_key, client)),
+                                      timeout=timeout)
+    except asyncio.TimeoutError:
+        raise GeminiTimeout(f"Gemini did not respond within {timeout:.1f} seconds")
+
+async def _acquire(mode: str, client: Optional[str], attempt: int, remaining: Callable[[], float]) -> bool:
+    """
+    Chờ đến lượt gửi một request tới Gemini: circuit breaker, giới hạn tốc độ (giới hạn
+    theo client chỉ tính cho lần gửi đầu tiên, không tính các lần thử lại), rồi một slot
+    trong `GEMINI_MAX_CONCURRENCY`.
+
+    Returns:
+        bool: True nếu đây là request thử của circuit breaker (xem `CircuitBreaker.check`).
+    """
+    started = time.perf_counter()
+    probe = False
+    try:
+        probe = breaker.check()
+        await admission.admit(client if attempt == 0 else None, remaining())
+        with admission.waiting():
+            await asyncio.wait_for(_semaphore.acquire(), timeout=remaining())
+    except (asyncio.TimeoutError, GeminiTimeout):
+        breaker.release(probe)
+        metrics.GEMINI_DURATION.labels(mode, "timeout").observe(time.perf_counter() - started)
+        raise GeminiTimeout("Gemini did not respond in time (waiting for a free slot)")
+    except BaseException:
+        breaker.release(probe)
+        raise
+    return probe
+
+def _retry_delay(error: Exception, attempt: int, remaining: float, partial: bool = False,
+                 probe: bool = False) -> Optional[float]:
+    """
+    Ghi nhận một lần gửi bị lỗi, và trả về thời gian chờ trước khi thử lại (None nếu không
+    thử lại: lỗi không tạm thời, hết số lần thử, không còn đủ thời gian, `partial` tức bên
+    gọi đã nhận một phần câu trả lời, hoặc `probe` tức request thử của circuit breaker).
+
+    Circuit breaker chỉ tính các request thất bại sau khi đã thử lại, không tính từng lần
+    gửi, để lỗi lẻ tẻ dưới tải cao không làm mạch mở. Request thử không được thử lại: lỗi
+    của nó mở lại mạch ngay, và lần thử lại sẽ bị chính mạch đang half_open từ chối.
+    """
+    if not isinstance(error, GeminiTimeout) and not is_transient(error):
+        # Gemini vẫn trả lời (ví dụ request không hợp lệ): không phải sự cố của Gemini
+        breaker.record_success()
+        return None
+    if is_rate_limit(error):
+        admission.throttle()
+    delay = backoff_delay(attempt, settings.GEMINI_RETRY_BASE_DELAY, settings.GEMINI_RETRY_MAX_DELAY)
+    if probe or partial or attempt + 1 >= settings.GEMINI_RETRY_ATTEMPTS or delay >= remaining:
+        breaker.record_failure()
+        return None
+    return delay
+
+def _raise(error: Exception):
+    if isinstance(error, GeminiTimeout):
+        raise error
+    raise Exception(f"Error generating response from Gemini: {str(error)}")
+
+async def _generate(prompt: str, timeout: float, cache_key: Optional[str], client: Optional[str]) -> str:
+    """
+    Một request tới Gemini (kể cả các lần thử lại), dùng chung bởi các lời gọi
+    `send_async` giống nhau.
+    """
+    loop = asyncio.get_running_loop()
+    expires_at = loop.time() + timeout
+
+    def remaining() -> float:
+        left = expires_at - loop.time()
+        if left <= 0:
+            raise GeminiTimeout(f"Gemini did not respond within {timeout:.1f} seconds")
+        return left
+
+    attempt = 0
+    while True:
+        probe = await _acquire("unary", client, attempt, remaining)
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await asyncio.wait_for(get_model().generate_content_async(prompt), timeout=remaining())
+            text = response.text
+            outcome = "ok"
+        except (asyncio.TimeoutError, GeminiTimeout):
+            outcome = "timeout"
+            error = GeminiTimeout(f"Gemini did not respond within {timeout:.1f} seconds")
+        except asyncio.CancelledError:
+            # Không còn bên nào chờ kết quả (client ngắt kết nối, hết thời hạn): request tới Gemini bị hủy theo
+            outcome = "cancelled"
+            breaker.release(probe)
+            raise
+        except Exception as e:
+            error = e
+        finally:
+            _semaphore.release()
+            metrics.GEMINI_DURATION.labels("unary", outcome).observe(time.perf_counter() - started)
+
+        if outcome == "ok":
+            breaker.record_success()
+            admission.recover()
+            if cache_key is not None:
+                await llm_cache.set(cache_key, MODEL_NAME, text)
+            return text
+
+        delay = _retry_delay(error, attempt, expires_at - loop.time(), probe=probe)
+        if delay is None:
+            _raise(error)
+        metrics.UPSTREAM_RETRIES.labels("gemini", "unary").inc()
+        await asyncio.sleep(delay)
+        attempt += 1
+
+async def stream_async(prompt: str, timeout: Optional[float] = None, cache: Optional[bool] = None,
+                       context_fingerprint: str = "", client: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Gửi yêu cầu đến mô hình Gemini và nhận phản hồi dưới dạng từng đoạn (streaming).
+
+    Mỗi đoạn văn bản được trả về ngay khi Gemini sinh ra, thay vì chờ toàn bộ câu trả lời.
+    Các request giống nhau diễn ra đồng thời dùng chung một luồng streaming từ Gemini:
+    bên gọi đến sau nhận lại các đoạn đã có rồi tiếp tục nhận các đoạn mới. Luồng chung
+    được đọc theo tốc độ của Gemini, các đoạn được giữ trong bộ nhớ đến khi câu trả lời
+    kết thúc (tối đa `max_output_tokens`). Giới hạn tốc độ, thử lại và circuit breaker
+    giống `send_async`; chỉ thử lại khi chưa nhận được đoạn nào.
+
+    Args:
+        prompt (str): Chuỗi đầu vào để gửi đến mô hình Gemini.
+        timeout (Optional[float]): Thời hạn (giây) cho toàn bộ quá trình streaming.
+            Mặc định là `GEMINI_TIMEOUT`, không vượt quá thời hạn còn lại của request chat.
+        cache (Optional[bool]): Có dùng cache phản hồi hay không (xem `send_async`).
+            Khi cache hit, toàn bộ phản hồi được trả về trong một đoạn duy nhất.
+        context_fingerprint (str): Dấu vân tay của ngữ cảnh đã truy xuất, là một phần của khóa cache.
+        client (Optional[str]): Định danh của client cho giới hạn tốc độ theo client.
+
+    Yields:
+        str: Các đoạn văn bản của phản hồi.
+
+    Raises:
+        GeminiTimeout: Nếu quá trình streaming vượt quá thời hạn.
+        Overloaded: Nếu request bị từ chối trước khi gửi tới Gemini (xem `send_async`).
+    """
+    cache_key = _cache_key(prompt, cache, context_fingerprint)
+    if cache_key is not None:
+        cached = await llm_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+    requested = timeout or settings.GEMINI_TIMEOUT
+    timeout = deadline.limit(requested)
+
+    loop = asyncio.get_running_loop()
+    expires_at = loop.time() + timeout
+    key = ("stream", make_cache_key(prompt, MODEL_NAME, generation_config, context_fingerprint), cache_key is not None)
+    async with aclosing(_flight.stream(key, lambda: _generate_stream(prompt, requested, cache_key, client))) as chunks:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=max(0.0, expires_at - loop.time()))
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                raise GeminiTimeout(f"Gemini did not respond within {timeout:.1f} seconds")
+            yield chunk
+
+async def _generate_stream(prompt: str, timeout: float, cache_key: Optional[str],
+                           client: Optional[str]) -> AsyncIterator[str]:
+    """
+    Một request streaming tới Gemini (kể cả các lần thử lại), dùng chung bởi các lời gọi
+    `stream_async` giống nhau.
+    """
+    loop = asyncio.get_running_loop()
+    expires_at = loop.time() + timeout
+
+    def remaining() -> float:
+        left = expires_at - loop.time()
+        if left <= 0:
+            raise GeminiTimeout(f"Gemini did not respond within {timeout:.1f} seconds")
+        return left
+
+    attempt = 0
+    while True:
+        probe = await _acquire("stream", client, attempt, remaining)
+        started = time.perf_counter()
+        outcome = "error"
+        error = None
+        parts = []
+        try:
+            response = await asyncio.wait_for(get_model().generate_content_async(prompt, stream=True), timeout=remaining())
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining())
+                except StopAsyncIteration:
+                    break
+                if chunk.text:
+                    if not parts:
+                        metrics.GEMINI_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - started)
+                        # Gemini đã trả lời: không giữ circuit breaker ở trạng thái thử suốt câu trả lời
+                        breaker.record_success()
+                    parts.append(chunk.text)
+                    yield chunk.text
+            outcome = "ok"
+        except (asyncio.TimeoutError, GeminiTimeout):
+            outcome = "timeout"
+            error = GeminiTimeout(f"Gemini did not respond within {timeout:.1f} seconds")
+        except (GeneratorExit, asyncio.CancelledError):
+            # Không còn bên nào đọc phản hồi (ví dụ client ngắt kết nối)
+            outcome = "cancelled"
+            breaker.release(probe)
+            raise
+        except Exception as e:
+            error = e
+        finally:
+            _semaphore.release()
+            metrics.GEMINI_DURATION.labels("stream", outcome).observe(time.perf_counter() - started)
+
+        if error is None:
+            breaker.record_success()
+            admission.recover()
+            # Chỉ lưu vào cache khi đã nhận đủ toàn bộ phản hồi
+            if cache_key is not None:
+                await llm_cache.set(cache_key, MODEL_NAME, "".join(parts))
+            return
+
+        # Không thử lại khi bên gọi đã nhận một phần câu trả lời
+        delay = _retry_delay(error, attempt, expires_at - loop.time(), partial=bool(parts), probe=probe)
+        if delay is None:
+            _raise(error)
+        metrics.UPSTREAM_RETRIES.labels("gemini", "stream").inc()
+        await asyncio.sleep(delay)
+        attempt += 1
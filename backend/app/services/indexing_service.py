@@ -0,0 +1,165 @@
+import os
+import time
+import uuid
+import asyncio
+import aiofiles
+import numpy as np
+
+from typing import Awaitable, Callable, List, Optional
+from app.core import metrics
+from app.core.config import settings
+from app.services.chunker import Chunk, split_into_chunks, save_chunks, load_chunks
+from app.services.content_store import content_store
+from app.services.file_processor import process_file
+from app.services.segment_index import segment_index
+from app.services.vector_store import embed_texts, serialize_vectors, load_vectors
+
+async def convert_text_to_vector(chunks: List[Chunk]) -> np.ndarray:
+    """
+    Chuyển nội dung các chunk thành embedding có số chiều cố định (EMBEDDING_DIM).
+
+    Returns:
+        np.ndarray: Ma trận (len(chunks), EMBEDDING_DIM) đã chuẩn hóa L2.
+    """
+    started = time.perf_counter()
+    vectors = await asyncio.to_thread(embed_texts, [chunk.text for chunk in chunks])
+    metrics.VECTORIZE_DURATION.observe(time.perf_counter() - started)
+    return vectors
+
+async def write_file_atomic(path: str, data: bytes) -> None:
+    """
+    Ghi dữ liệu vào file tạm rồi đổi tên thành `path`.
+
+    Không bao giờ ghi đè trực tiếp lên file cũ, vì file cũ có thể là hard link
+    tới một mục trong kho nội dung đang được tài liệu khác sử dụng.
+    """
+    # Tên file tạm riêng cho mỗi lần ghi: hai tác vụ có thể ghi cùng một file cùng lúc
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            await f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+async def index_document(doc_id: str, text: str) -> List[Chunk]:
+    """
+    Lưu và đánh chỉ mục nội dung văn bản đã trích xuất của một tài liệu.
+
+    Các bước thực hiện:
+    1. Ghi văn bản vào file `.txt` (UTF-8, không chuyển đổi ký tự xuống dòng để
+       vị trí byte của chunk luôn chính xác).
+    2. Chia văn bản thành các chunk chồng lấn và lưu vị trí byte vào file `.chunks`.
+    3. Vector hóa từng chunk và lưu ma trận vào file `.vector`.
+    4. Ghi một segment mới của chỉ mục truy xuất (chunk, BM25, vector).
+
+    Args:
+        doc_id (str): Định danh tài liệu (tên file đã upload).
+        text (str): Nội dung văn bản đã trích xuất.
+
+    Returns:
+        List[Chunk]: Danh sách các chunk của tài liệu.
+    """
+    base_path = os.path.join(settings.UPLOAD_DIR, doc_id)
+
+    await write_file_atomic(base_path + ".txt", text.encode("utf-8"))
+
+    chunks = await asyncio.to_thread(split_into_chunks, doc_id, text)
+    await asyncio.to_thread(save_chunks, base_path + ".chunks", chunks)
+
+    vectors = await convert_text_to_vector(chunks)
+    await write_file_atomic(base_path + ".vector", serialize_vectors(vectors))
+
+    await _add_to_indexes(doc_id, chunks, vectors)
+    return chunks
+
+async def register_document(doc_id: str) -> str:
+    """
+    Đánh chỉ mục một tài liệu đã có sẵn các file `.txt`, `.chunks` và `.vector`
+    trong thư mục upload (ví dụ được liên kết từ kho nội dung), không cần trích xuất
+    hay vector hóa lại.
+
+    Args:
+        doc_id (str): Định danh tài liệu (tên file đã upload).
+
+    Returns:
+        str: Nội dung văn bản đã trích xuất của tài liệu.
+    """
+    base_path = os.path.join(settings.UPLOAD_DIR, doc_id)
+
+    async with aiofiles.open(base_path + ".txt", "rb") as text_file:
+        data = await text_file.read()
+    spans = await asyncio.to_thread(load_chunks, doc_id, base_path + ".chunks")
+    chunks = [Chunk(c.chunk_id, doc_id, c.start, c.end, data[c.start:c.end].decode("utf-8", errors="ignore")) for c in spans]
+    vectors = await asyncio.to_thread(load_vectors, base_path + ".vector")
+    if vectors is None or len(vectors) != len(chunks):
+        raise ValueError(f"Invalid vector file for {doc_id}")
+
+    await _add_to_indexes(doc_id, chunks, vectors)
+    return data.decode("utf-8")
+
+async def _add_to_indexes(doc_id: str, chunks: List[Chunk], vectors: np.ndarray) -> None:
+    await asyncio.to_thread(segment_index.add_document, doc_id, chunks, vectors)
+
+async def unindex_document(doc_id: str) -> None:
+    """
+    Xóa tài liệu khỏi các chỉ mục và xóa các file `.txt`, `.chunks`, `.vector` liên quan.
+    Nội dung dùng chung trong kho nội dung chỉ bị xóa khi không còn tài liệu nào tham chiếu.
+
+    Args:
+        doc_id (str): Định danh tài liệu (tên file đã upload).
+    """
+    await asyncio.to_thread(segment_index.remove_document, doc_id)
+
+    base_path = os.path.join(settings.UPLOAD_DIR, doc_id)
+    for ext in (".txt", ".chunks", ".vector"):
+        if os.path.exists(base_path + ext):
+            os.remove(base_path + ext)
+
+    await asyncio.to_thread(content_store.release, doc_id)
+
+async def ingest_document(doc_id: str, file_extension: str, sha256: str,
+                          on_stage: Optional[Callable[[str, float], Awaitable[None]]] = None) -> str:
+    """
+    Xử lý đầy đủ một file đã được lưu trong thư mục upload: trích xuất văn bản,
+    chia chunk, vector hóa và đánh chỉ mục.
+
+    Nếu nội dung file (theo SHA-256) đã được xử lý trước đó, dùng lại kết quả trong
+    kho nội dung thay vì trích xuất và vector hóa lại.
+
+    Args:
+        doc_id (str): Định danh tài liệu (tên file đã upload).
+        file_extension (str): Phần mở rộng của file (pdf, docx, ...).
+        sha256 (str): Mã SHA-256 của nội dung file.
+        on_stage (Optional[Callable]): Hàm được gọi với (tên bước, tiến độ 0..1) khi chuyển bước.
+
+    Returns:
+        str: Nội dung văn bản đã trích xuất.
+    """
+    async def report(stage: str, progress: float) -> None:
+        if on_stage is not None:
+            await on_stage(stage, progress)
+
+    if await asyncio.to_thread(content_store.reuse, sha256, doc_id):
+        # Nội dung này đã được xử lý trước đó (có thể dưới tên khác): các file đã trích xuất
+        # được liên kết từ kho nội dung, không cần trích xuất và vector hóa lại
+        await report("indexing", 0.5)
+        return await register_document(doc_id)
+
+    async def report_pages(done: int, total: int) -> None:
+        # Nhận dạng (OCR) các trang scan của PDF: tiến độ được cập nhật sau mỗi trang
+        await report("ocr", 0.1 + 0.5 * done / total)
+
+    # Xử lý file và trích xuất nội dung văn bản
+    await report("extracting", 0.1)
+    extracted_text = await process_file(os.path.join(settings.UPLOAD_DIR, doc_id), file_extension, report_pages)
+
+    # Lưu nội dung văn bản (.txt), chia chunk (.chunks), vector hóa (.vector)
+    # và cập nhật các chỉ mục tìm kiếm
+    await report("indexing", 0.6)
+    await index_document(doc_id, extracted_text)
+
+    # Lưu kết quả vào kho nội dung để dùng lại cho các lần upload trùng nội dung
+    await asyncio.to_thread(content_store.put, sha256, doc_id)
+    return extracted_text
@@ -0,0 +1,322 @@
+import os
+import time
+import uuid
+import random
+import asyncio
+
+from typing import List, Optional, Set
+from sqlalchemy import select, update
+from app.core import profiler
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.job import IngestionJob
+from app.services.segment_index import segment_index
+from app.services.document_catalog import document_catalog
+from app.services.extraction_pool import ExtractionQueueFull
+from app.services.indexing_service import ingest_document, unindex_document
+
+class JobQueue:
+    """
+    Hàng đợi bền vững (lưu trong database) cho các tác vụ xử lý file đã upload.
+
+    - Các tác vụ được lấy theo thứ tự `priority` giảm dần rồi `created_at` tăng dần.
+    - Mỗi tác vụ được một worker nhận bằng một câu lệnh UPDATE có điều kiện, nên nhiều
+      tiến trình uvicorn có thể dùng chung một hàng đợi mà không xử lý trùng.
+    - Tác vụ lỗi được thử lại với thời gian chờ tăng dần (exponential backoff), tối đa
+      `max_attempts` lần.
+    - Tác vụ đang chạy mà worker bị dừng đột ngột (quá `lease_timeout` giây) sẽ được
+      đưa lại vào hàng đợi, hoặc bị đánh dấu lỗi nếu đã hết số lần thử.
+    - Một file có thể được upload lại (cùng tên) khi tác vụ cũ chưa xong: chỉ tác vụ mới
+      nhất của một tên file được cập nhật danh mục tài liệu và dọn dẹp file đã upload.
+    """
+
+    def __init__(self, worker_count: int, poll_interval: float, max_attempts: int,
+                 retry_backoff: float, lease_timeout: float):
+        self.worker_count = worker_count
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease_timeout = lease_timeout
+        self._worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        # Tác vụ được yêu cầu profile bởi một request upload đang được profile
+        self._profiled_jobs: Set[str] = set()
+
+    # ----- Các thao tác với database (đồng bộ, được gọi qua asyncio.to_thread) -----
+
+    def _enqueue(self, filename: str, file_extension: str, sha256: str, size: int,
+                 content_type: Optional[str], priority: int) -> IngestionJob:
+        now = time.time()
+        job = IngestionJob(
+            id=uuid.uuid4().hex,
+            filename=filename,
+            file_extension=file_extension,
+            content_type=content_type,
+            sha256=sha256,
+            size=size,
+            status="queued",
+            stage="queued",
+            progress=0.0,
+            priority=priority,
+            attempts=0,
+            max_attempts=self.max_attempts,
+            created_at=now,
+            updated_at=now,
+            available_at=now,
+        )
+        with SessionLocal() as session:
+            # Tác vụ và tài liệu trong danh mục được tạo trong cùng một giao dịch
+            session.add(job)
+            document_catalog.upsert(session, filename, size, sha256, status="processing", uploaded_at=now)
+            session.commit()
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        """
+        Đọc trạng thái của một tác vụ.
+        """
+        with SessionLocal() as session:
+            return session.get(IngestionJob, job_id)
+
+    def _claim(self) -> Optional[IngestionJob]:
+        now = time.time()
+        with SessionLocal() as session:
+            candidates = session.scalars(
+                select(IngestionJob.id)
+                .where(IngestionJob.status == "queued", IngestionJob.available_at <= now)
+                .order_by(IngestionJob.priority.desc(), IngestionJob.created_at)
+                .limit(self.worker_count)
+            ).all()
+            for job_id in candidates:
+                # Chỉ một worker cập nhật được tác vụ còn ở trạng thái "queued"
+                result = session.execute(
+                    update(IngestionJob)
+                    .where(IngestionJob.id == job_id, IngestionJob.status == "queued")
+                    .values(status="running", locked_by=self._worker_id, locked_at=now,
+                            updated_at=now, attempts=IngestionJob.attempts + 1)
+                )
+                session.commit()
+                if result.rowcount == 1:
+                    return session.get(IngestionJob, job_id)
+        return None
+
+    def _update(self, job_id: str, **values) -> None:
+        values["updated_at"] = time.time()
+        with SessionLocal() as session:
+            session.execute(update(IngestionJob).where(IngestionJob.id == job_id).values(**values))
+            session.commit()
+
+    @staticmethod
+    def _is_latest(session, job: IngestionJob) -> bool:
+        """
+        Tác vụ có phải là tác vụ mới nhất của tên file hay không (file chưa được upload lại
+        sau khi tác vụ được tạo).
+        """
+        newer = session.scalar(
+            select(IngestionJob.id)
+            .where(IngestionJob.filename == job.filename, IngestionJob.id != job.id,
+                   IngestionJob.created_at >= job.created_at)
+            .limit(1)
+        )
+        return newer is None
+
+    def _owns_upload(self, job: IngestionJob) -> bool:
+        with SessionLocal() as session:
+            return self._is_latest(session, job)
+
+    def _finish(self, job: IngestionJob, status: str, error: Optional[str] = None) -> bool:
+        """
+        Kết thúc tác vụ và cập nhật danh mục tài liệu trong cùng một giao dịch.
+
+        Returns:
+            bool: False nếu file đã được upload lại sau khi tác vụ được tạo (danh mục và
+            file đã upload thuộc về tác vụ mới hơn, không bị thay đổi).
+        """
+        now = time.time()
+        values = dict(status=status, stage=status, error=error, locked_by=None, locked_at=None, updated_at=now)
+        if status == "done":
+            values["progress"] = 1.0
+        with SessionLocal() as session:
+            session.execute(update(IngestionJob).where(IngestionJob.id == job.id).values(**values))
+            latest = self._is_latest(session, job)
+            if latest and status == "done":
+                document_catalog.set_status(session, job.filename, "ready",
+                                            chunk_count=segment_index.chunk_count(job.filename))
+            elif latest:
+                document_catalog.delete(session, job.filename)
+            session.commit()
+            return latest
+
+    def _requeue_stale(self) -> List[IngestionJob]:
+        """
+        Đưa lại vào hàng đợi các tác vụ hết hạn giữ (worker bị dừng đột ngột).
+
+        Returns:
+            List[IngestionJob]: Các tác vụ hết hạn giữ đã hết số lần thử (ví dụ file làm
+            worker bị dừng mỗi lần xử lý), được nhận bởi worker này để đánh dấu lỗi.
+        """
+        now = time.time()
+        stale = (IngestionJob.status == "running", IngestionJob.locked_at < now - self.lease_timeout)
+        with SessionLocal() as session:
+            session.execute(
+                update(IngestionJob)
+                .where(*stale, IngestionJob.attempts < IngestionJob.max_attempts)
+                .values(status="queued", stage="queued", locked_by=None, locked_at=None, updated_at=now)
+            )
+            session.commit()
+
+            exhausted = []
+            for job_id in session.scalars(select(IngestionJob.id).where(*stale)).all():
+                # Chỉ một worker nhận được tác vụ (như `_claim`)
+                result = session.execute(
+                    update(IngestionJob)
+                    .where(IngestionJob.id == job_id, *stale)
+                    .values(locked_by=self._worker_id, locked_at=now, updated_at=now)
+                )
+                session.commit()
+                if result.rowcount == 1:
+                    exhausted.append(session.get(IngestionJob, job_id))
+            return exhausted
+
+    # ----- API bất đồng bộ -----
+
+    async def enqueue(self, filename: str, file_extension: str, sha256: str, size: int,
+                      content_type: Optional[str] = None, priority: int = 0) -> IngestionJob:
+        """
+        Thêm một tác vụ xử lý file vào hàng đợi.
+
+        Args:
+            filename (str): Tên file đã được lưu trong thư mục upload.
+            file_extension (str): Phần mở rộng của file.
+            sha256 (str): Mã SHA-256 của nội dung file.
+            size (int): Kích thước file (byte).
+            content_type (Optional[str]): Loại nội dung của file.
+            priority (int): Độ ưu tiên, giá trị lớn hơn được xử lý trước.
+
+        Returns:
+            IngestionJob: Tác vụ vừa được tạo.
+        """
+        job = await asyncio.to_thread(self._enqueue, filename, file_extension, sha256, size, content_type, priority)
+        session = profiler.current_session()
+        if session is not None:
+            # Request upload đang được profile: profile cả tác vụ xử lý file (mã profile là mã tác vụ)
+            self._profiled_jobs.add(job.id)
+            session.metadata["job_id"] = job.id
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def start(self) -> None:
+        """
+        Khởi động các worker xử lý hàng đợi (gọi khi ứng dụng khởi động).
+        """
+        self._wakeup = asyncio.Event()
+        await self._recover_stale()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self) -> None:
+        """
+        Dừng các worker. Tác vụ đang chạy dở được đưa lại vào hàng đợi.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                print(f"Job queue error: {str(e)}")
+                job = None
+
+            if job is None:
+                # Chờ tác vụ mới trong tiến trình này, hoặc hết thời gian để kiểm tra
+                # lại database (tác vụ từ tiến trình khác, tác vụ chờ thử lại)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    await self._recover_stale()
+                continue
+
+            if self._should_profile(job):
+                with profiler.profile("job", f"ingest {job.filename}", settings.PROFILER_INTERVAL,
+                                      settings.PROFILER_MAX_DURATION, profiler.profile_store, job.id) as session:
+                    session.metadata["attempt"] = job.attempts
+                    await self._run(job)
+            else:
+                await self._run(job)
+
+    async def _recover_stale(self) -> None:
+        try:
+            exhausted = await asyncio.to_thread(self._requeue_stale)
+        except Exception as e:
+            print(f"Job queue error: {str(e)}")
+            return
+        for job in exhausted:
+            await self._fail(job, RuntimeError(f"Worker stopped while processing the job ({job.attempts} attempts)"))
+
+    def _should_profile(self, job: IngestionJob) -> bool:
+        if not settings.PROFILER_ENABLED:
+            return False
+        if job.id in self._profiled_jobs:
+            self._profiled_jobs.discard(job.id)
+            return True
+        return settings.PROFILER_SAMPLE_RATE > 0 and random.random() < settings.PROFILER_SAMPLE_RATE
+
+    async def _run(self, job: IngestionJob) -> None:
+        async def on_stage(stage: str, progress: float) -> None:
+            await asyncio.to_thread(self._update, job.id, stage=stage, progress=progress, locked_at=time.time())
+
+        try:
+            await ingest_document(job.filename, job.file_extension, job.sha256, on_stage)
+            await asyncio.to_thread(self._finish, job, "done")
+        except ExtractionQueueFull:
+            # Pool trích xuất đang quá tải: chờ rồi xử lý lại, không tính là một lần thử
+            await asyncio.to_thread(self._update, job.id, status="queued", stage="queued",
+                                    attempts=job.attempts - 1, available_at=time.time() + self.retry_backoff,
+                                    locked_by=None, locked_at=None)
+        except asyncio.CancelledError:
+            # Ứng dụng đang tắt: trả tác vụ về hàng đợi để xử lý lại sau
+            await asyncio.to_thread(self._update, job.id, status="queued", stage="queued",
+                                    attempts=job.attempts - 1, locked_by=None, locked_at=None)
+            raise
+        except Exception as e:
+            await self._fail(job, e)
+
+    async def _fail(self, job: IngestionJob, error: Exception) -> None:
+        if job.attempts < job.max_attempts:
+            # Thử lại sau một khoảng thời gian tăng dần theo số lần thử
+            delay = self.retry_backoff * (2 ** (job.attempts - 1))
+            await asyncio.to_thread(self._update, job.id, status="queued", stage="queued", progress=0.0,
+                                    error=str(error), available_at=time.time() + delay,
+                                    locked_by=None, locked_at=None)
+            return
+
+        # Tác vụ thất bại hẳn: đánh dấu lỗi và xóa tài liệu khỏi danh mục
+        if not await asyncio.to_thread(self._finish, job, "failed", str(error)):
+            # File đã được upload lại: file, chỉ mục và danh mục thuộc về tác vụ mới hơn
+            return
+        # Dọn dẹp file đã upload và các file trung gian
+        try:
+            await unindex_document(job.filename)
+            if not await asyncio.to_thread(self._owns_upload, job):
+                # File được upload lại trong khi đang dọn dẹp
+                return
+            file_path = os.path.join(settings.UPLOAD_DIR, job.filename)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except Exception as e:
+            print(f"Error cleaning up failed job {job.id}: {str(e)}")
+
+# Hàng đợi xử lý file dùng chung cho toàn bộ ứng dụng
+job_queue = JobQueue(
+    worker_count=settings.JOB_WORKERS,
+    poll_interval=settings.JOB_POLL_INTERVAL,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    retry_backoff=settings.JOB_RETRY_BACKOFF,
+    lease_timeout=settings.JOB_LEASE_TIMEOUT,
+)
@@ -0,0 +1,192 @@
+import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import delete
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.llm_cache import LLMCacheEntry
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Chuẩn hóa prompt trước khi tạo khóa cache: bỏ khoảng trắng thừa ở đầu/cuối
+    và gộp các khoảng trắng liên tiếp thành một.
+    """
+    return _WHITESPACE_RE.sub(" ", prompt).strip()
+
+def make_cache_key(prompt: str, model_name: str, generation_config: Dict[str, Any], context_fingerprint: str = "") -> str:
+    """
+    Tạo khóa cache từ prompt đã chuẩn hóa, tên mô hình, cấu hình sinh văn bản
+    và dấu vân tay (fingerprint) của ngữ cảnh đã truy xuất.
+    """
+    payload = json.dumps({
+        "prompt": normalize_prompt(prompt),
+        "model": model_name,
+        "config": generation_config,
+        "context": context_fingerprint,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """
+    Cache hai tầng cho phản hồi của mô hình ngôn ngữ.
+
+    - Tầng 1: LRU trong bộ nhớ của tiến trình, giới hạn số mục và có thời gian sống (TTL).
+    - Tầng 2: bảng `llm_cache` trong database (`DATABASE_URL`), được giữ lại khi khởi động lại
+      và dùng chung giữa tất cả các worker uvicorn.
+
+    Các bộ đếm hit/miss được cung cấp qua `stats()` để điều chỉnh TTL. Các mục hết hạn được
+    xóa khỏi database định kỳ (mỗi `purge_interval` giây, xem `start`).
+    """
+
+    def __init__(self, max_entries: int, ttl: float, purge_interval: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._purge_task: Optional[asyncio.Task] = None
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._memory.get(key)
+            if item is None:
+                return None
+            response, expires_at = item
+            if expires_at <= time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return response
+
+    def _put_memory(self, key: str, response: str, expires_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (response, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _get_disk(self, key: str) -> Optional[Tuple[str, float]]:
+        with SessionLocal() as session:
+            entry = session.get(LLMCacheEntry, key)
+            if entry is None or entry.expires_at <= time.time():
+                return None
+            return entry.response, entry.expires_at
+
+    def _put_disk(self, key: str, model_name: str, response: str, expires_at: float) -> None:
+        with SessionLocal() as session:
+            session.merge(LLMCacheEntry(
+                key=key,
+                model_name=model_name,
+                response=response,
+                created_at=time.time(),
+                expires_at=expires_at,
+            ))
+            session.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        Tìm phản hồi trong cache, lần lượt ở bộ nhớ rồi đến database.
+
+        Returns:
+            Optional[str]: Phản hồi đã lưu, hoặc None nếu không có (hoặc đã hết hạn).
+        """
+        response = self._get_memory(key)
+        if response is not None:
+            self._counters["memory_hits"] += 1
+            return response
+
+        try:
+            item = await asyncio.to_thread(self._get_disk, key)
+        except Exception as e:
+            # Lỗi database không được làm hỏng request: coi như cache miss
+            print(f"LLM cache read error: {str(e)}")
+            self._counters["errors"] += 1
+            item = None
+
+        if item is None:
+            self._counters["misses"] += 1
+            return None
+
+        response, expires_at = item
+        self._put_memory(key, response, expires_at)
+        self._counters["disk_hits"] += 1
+        return response
+
+    async def set(self, key: str, model_name: str, response: str) -> None:
+        """
+        Lưu phản hồi vào cả hai tầng cache.
+        """
+        expires_at = time.time() + self.ttl
+        self._put_memory(key, response, expires_at)
+        self._counters["stores"] += 1
+        try:
+            await asyncio.to_thread(self._put_disk, key, model_name, response, expires_at)
+        except Exception as e:
+            print(f"LLM cache write error: {str(e)}")
+            self._counters["errors"] += 1
+
+    def purge_expired(self) -> int:
+        """
+        Xóa các mục đã hết hạn khỏi database.
+
+        Returns:
+            int: Số mục đã xóa.
+        """
+        with SessionLocal() as session:
+            result = session.execute(delete(LLMCacheEntry).where(LLMCacheEntry.expires_at <= time.time()))
+            session.commit()
+            return result.rowcount or 0
+
+    async def start(self) -> None:
+        """
+        Khởi động việc xóa định kỳ các mục đã hết hạn (gọi khi ứng dụng khởi động).
+        """
+        self._purge_task = asyncio.create_task(self._purge_periodically())
+
+    async def stop(self) -> None:
+        """
+        Dừng việc xóa định kỳ (gọi khi ứng dụng tắt).
+        """
+        if self._purge_task is not None:
+            self._purge_task.cancel()
+            await asyncio.gather(self._purge_task, return_exceptions=True)
+            self._purge_task = None
+
+    async def _purge_periodically(self) -> None:
+        # Mỗi worker đều xóa định kỳ: câu lệnh DELETE chạy nhiều lần cũng không sao
+        while True:
+            try:
+                await asyncio.to_thread(self.purge_expired)
+            except Exception as e:
+                print(f"LLM cache purge error: {str(e)}")
+            await asyncio.sleep(self.purge_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Trả về các bộ đếm hit/miss và tỉ lệ hit của cache (tính riêng cho worker hiện tại).
+        """
+        lookups = self._counters["memory_hits"] + self._counters["disk_hits"] + self._counters["misses"]
+        hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+        return {
+            **self._counters,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+        }
+
+# Cache dùng chung cho toàn bộ ứng dụng
+llm_cache = LLMCache(
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    ttl=settings.LLM_CACHE_TTL,
+    purge_interval=settings.LLM_CACHE_PURGE_INTERVAL,
+)
@@ -0,0 +1,175 @@
+import os
+import math
+import uuid
+import hashlib
+
+from dataclasses import dataclass
+from typing import List, Optional
+from app.core.config import settings
+
+# Tăng giá trị này khi cách nhận dạng thay đổi (tham số tesseract, tiền xử lý ảnh, ...) để
+# kết quả cũ trong cache không còn được dùng
+OCR_VERSION = "1"
+
+class OCRUnavailable(Exception):
+    """
+    Ngoại lệ khi không thể chạy OCR trên máy này (thiếu pytesseract/pdf2image, hoặc thiếu
+    chương trình tesseract/poppler).
+    """
+
+@dataclass(frozen=True)
+class ScannedPage:
+    """
+    Một trang PDF không có lớp văn bản (trang scan), cần nhận dạng ký tự (OCR).
+
+    `digest` là mã hash nội dung của trang (content stream và ảnh của trang), dùng làm
+    khóa của cache (None nếu không đọc được nội dung trang: không dùng cache); `width` và
+    `height` là kích thước trang theo point (1/72 inch).
+    """
+    index: int
+    digest: Optional[str]
+    width: float
+    height: float
+
+def _hash_stream(digest, obj, seen: set) -> None:
+    """
+    Cập nhật `digest` với dữ liệu của một XObject (ảnh, form) và các XObject lồng trong nó.
+    """
+    obj = obj.get_object()
+    key = id(obj)
+    if key in seen:
+        return
+    seen.add(key)
+    digest.update(obj.get_data())
+    resources = obj.get("/Resources")
+    if resources is not None:
+        _hash_resources(digest, resources.get_object(), seen)
+
+def _hash_resources(digest, resources, seen: set) -> None:
+    xobjects = resources.get("/XObject")
+    if xobjects is None:
+        return
+    xobjects = xobjects.get_object()
+    for name in sorted(xobjects.keys()):
+        _hash_stream(digest, xobjects[name], seen)
+
+def page_digest(page) -> str:
+    """
+    Mã hash nội dung của một trang PDF (`pypdf.PageObject`): hai trang được hiển thị giống
+    nhau (kể cả trong hai file khác nhau) có cùng mã hash.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr((list(page.mediabox), page.rotation)).encode("ascii"))
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+    resources = page.get("/Resources")
+    if resources is not None:
+        _hash_resources(digest, resources.get_object(), set())
+    return digest.hexdigest()
+
+def find_scanned_pages(file_path: str, page_texts: List[str], min_chars: int) -> List[ScannedPage]:
+    """
+    Tìm các trang có ít hơn `min_chars` ký tự văn bản (không có lớp văn bản).
+    Chạy trong tiến trình của pool trích xuất.
+    """
+    from pypdf import PdfReader
+
+    candidates = [i for i, text in enumerate(page_texts) if len(text.strip()) < min_chars]
+    if not candidates:
+        return []
+    reader = PdfReader(file_path)
+    pages = []
+    for i in candidates:
+        page = reader.pages[i]
+        try:
+            digest = page_digest(page)
+        except Exception:
+            digest = None
+        pages.append(ScannedPage(i, digest, float(page.mediabox.width), float(page.mediabox.height)))
+    return pages
+
+def raster_dpi(width: float, height: float, dpi: int, max_pixels: int) -> int:
+    """
+    DPI dùng để chuyển trang thành ảnh: `dpi`, giảm xuống sao cho ảnh không vượt quá
+    `max_pixels` điểm ảnh (giới hạn bộ nhớ của một trang khổ lớn).
+    """
+    area = (width / 72) * (height / 72)
+    if area <= 0:
+        return dpi
+    return max(1, min(dpi, int(math.sqrt(max_pixels / area))))
+
+def ocr_page(file_path: str, page: ScannedPage, dpi: int, max_pixels: int, languages: str, timeout: float) -> str:
+    """
+    Chuyển một trang PDF thành ảnh xám (pdf2image) và nhận dạng văn bản (pytesseract).
+    Chạy trong tiến trình của pool trích xuất, mỗi trang là một tác vụ.
+    """
+    try:
+        import pytesseract
+        from pdf2image import convert_from_path
+        from pdf2image.exceptions import PDFInfoNotInstalledError
+    except ImportError as e:
+        raise OCRUnavailable(str(e))
+
+    # Mỗi tiến trình của pool xử lý một trang: tesseract chỉ dùng một luồng để các tiến
+    # trình không tranh nhau CPU
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    try:
+        images = convert_from_path(
+            file_path,
+            dpi=raster_dpi(page.width, page.height, dpi, max_pixels),
+            first_page=page.index + 1,
+            last_page=page.index + 1,
+            grayscale=True,
+            thread_count=1,
+        )
+    except PDFInfoNotInstalledError as e:
+        raise OCRUnavailable(str(e))
+    try:
+        return "\n".join(pytesseract.image_to_string(image, lang=languages, timeout=timeout) for image in images)
+    except pytesseract.TesseractNotFoundError as e:
+        raise OCRUnavailable(str(e))
+    finally:
+        for image in images:
+            image.close()
+
+class PageTextCache:
+    """
+    Cache văn bản OCR theo mã hash nội dung của trang.
+
+    Mỗi trang đã nhận dạng được lưu ngay khi xong, nên khi upload lại cùng một bản scan
+    (hoặc một file khác có chung trang), hoặc khi tác vụ được thử lại sau lỗi ở một trang
+    khác, các trang đã xong không phải nhận dạng lại.
+    """
+
+    def __init__(self, root: str, version: str):
+        self.root = root
+        self.version = version
+
+    def _path(self, digest: str) -> str:
+        key = hashlib.sha256(f"{digest}|{self.version}".encode("ascii")).hexdigest()
+        return os.path.join(self.root, key[:2], key + ".txt")
+
+    def get(self, digest: str) -> Optional[str]:
+        try:
+            with open(self._path(digest), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, digest: str, text: str) -> None:
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+def ocr_version() -> str:
+    """
+    Phiên bản của kết quả OCR: các tham số làm thay đổi văn bản nhận dạng được.
+    """
+    return f"o{OCR_VERSION}-{settings.OCR_LANGUAGES}-{settings.OCR_DPI}-{settings.OCR_MAX_PIXELS}"
+
+# Cache văn bản OCR dùng chung cho toàn bộ ứng dụng
+ocr_cache = PageTextCache(os.path.join(settings.CONTENT_STORE_DIR, "ocr"), ocr_version())
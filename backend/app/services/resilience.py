@@ -0,0 +1,304 @@
+import math
+import time
+import random
+import asyncio
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from app.core import metrics
+
+# Bảo vệ một dịch vụ phía sau (upstream, ví dụ Gemini) khỏi bị quá tải và bảo vệ ứng dụng
+# khỏi upstream đang gặp sự cố: giới hạn tốc độ bằng token bucket (toàn cục và theo client),
+# thử lại lỗi tạm thời với backoff có jitter, và circuit breaker.
+
+# Mã trạng thái HTTP của các lỗi tạm thời, nên thử lại
+_TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+class Overloaded(Exception):
+    """
+    Ngoại lệ khi request bị từ chối trước khi gửi tới upstream (quá tải, mạch đang ngắt).
+    Client nên thử lại sau `retry_after` giây.
+    """
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+class RateLimited(Overloaded):
+    """
+    Ngoại lệ khi một client gửi quá nhiều request.
+    """
+    status_code = 429
+
+class CircuitOpen(Overloaded):
+    """
+    Ngoại lệ khi upstream đang được coi là không hoạt động (circuit breaker đang mở).
+    """
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Lỗi có phải là lỗi tạm thời (quá tải, lỗi server, mất kết nối) nên thử lại hay không.
+
+    Các ngoại lệ của `google.api_core` (và của mô hình giả lập) mang mã trạng thái HTTP
+    trong thuộc tính `code`.
+    """
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code in _TRANSIENT_STATUS
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+def is_rate_limit(error: BaseException) -> bool:
+    """
+    Upstream có từ chối request vì vượt giới hạn tốc độ (HTTP 429) hay không.
+    """
+    return getattr(error, "code", None) == 429
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Thời gian chờ trước lần thử lại thứ `attempt + 1`: backoff lũy thừa với "full jitter",
+    để các client bị lỗi cùng lúc không thử lại cùng lúc.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class TokenBucket:
+    """
+    Token bucket: trung bình `rate` request mỗi giây, tối đa `burst` request liên tiếp.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """
+        Thời gian (giây) đến khi có token tiếp theo.
+        """
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """
+        Đặt trước một token.
+
+        Returns:
+            Optional[float]: Thời gian phải chờ đến lượt (0 nếu có sẵn token), hoặc None
+            (không lấy token) nếu phải chờ lâu hơn `max_wait` giây.
+        """
+        wait = self.wait_time()
+        if wait > max_wait:
+            return None
+        # Số token có thể âm: các request đặt trước được phục vụ lần lượt theo thứ tự
+        self.tokens -= 1
+        return wait
+
+    def refund(self) -> None:
+        self.tokens = min(self.burst, self.tokens + 1)
+
+class AdmissionController:
+    """
+    Kiểm soát số request được gửi tới upstream.
+
+    - Giới hạn toàn cục (`rate`, `burst`): request chờ đến lượt nếu kịp trong thời hạn của
+      nó và hàng đợi chưa đầy (`max_queue`), nếu không bị từ chối ngay (`Overloaded`).
+      Giới hạn này tự điều chỉnh: giảm một nửa khi upstream trả về lỗi 429, tăng dần trở
+      lại sau mỗi request thành công (AIMD).
+    - Giới hạn theo client (`client_rate`, `client_burst`): một client vượt giới hạn bị từ
+      chối ngay (`RateLimited`), không chiếm chỗ trong hàng đợi.
+    - `queue_length`: số request đang chờ token hoặc chờ một slot đồng thời (`waiting()`),
+      là tín hiệu tải cho bộ cân bằng tải và autoscaler.
+
+    Giá trị 0 của `rate` hoặc `client_rate` tắt giới hạn tương ứng. Các giới hạn áp dụng
+    cho từng tiến trình.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, client_rate: float, client_burst: float,
+                 max_queue: int, max_clients: int = 10000):
+        self.name = name
+        self.max_rate = rate
+        self.min_rate = rate / 20
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_queue = max_queue
+        self.max_clients = max_clients
+        self.queue_length = 0
+        self._bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self._clients: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._last_throttle = 0.0
+        if self._bucket is not None:
+            metrics.UPSTREAM_RATE_LIMIT.labels(name).set(rate)
+
+    @property
+    def rate(self) -> Optional[float]:
+        return self._bucket.rate if self._bucket is not None else None
+
+    def _client_bucket(self, client: str) -> TokenBucket:
+        bucket = self._clients.get(client)
+        if bucket is None:
+            bucket = TokenBucket(self.client_rate, self.client_burst)
+            self._clients[client] = bucket
+            # Bỏ client lâu không hoạt động nhất (bucket của nó đã đầy lại từ lâu)
+            if len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(client)
+        return bucket
+
+    @contextmanager
+    def waiting(self) -> Iterator[None]:
+        """
+        Tính request hiện tại vào hàng đợi trong khi nó chờ (token, slot đồng thời).
+        """
+        self.queue_length += 1
+        metrics.UPSTREAM_QUEUE_LENGTH.labels(self.name).inc()
+        try:
+            yield
+        finally:
+            self.queue_length -= 1
+            metrics.UPSTREAM_QUEUE_LENGTH.labels(self.name).dec()
+
+    async def admit(self, client: Optional[str], max_wait: float) -> None:
+        """
+        Chờ đến lượt gửi một request tới upstream.
+
+        Args:
+            client (Optional[str]): Định danh của client (None: không áp giới hạn theo client,
+                ví dụ khi thử lại).
+            max_wait (float): Thời gian chờ tối đa (thời gian còn lại của request).
+
+        Raises:
+            RateLimited: Nếu client đã vượt giới hạn của nó.
+            Overloaded: Nếu hàng đợi đã đầy hoặc không thể đến lượt trong `max_wait` giây.
+        """
+        client_bucket = None
+        if client is not None and self.client_rate > 0:
+            client_bucket = self._client_bucket(client)
+            if client_bucket.reserve(0) is None:
+                metrics.UPSTREAM_REJECTED.labels(self.name, "client_rate").inc()
+                raise RateLimited("Too many requests, please slow down", client_bucket.wait_time())
+
+        if self.queue_length >= self.max_queue:
+            reason = "queue_full"
+            retry_after = self.queue_length / self._bucket.rate if self._bucket is not None else 1.0
+        elif self._bucket is None:
+            return
+        else:
+            wait = self._bucket.reserve(max_wait)
+            reason = "global_rate"
+            retry_after = self._bucket.wait_time()
+        if reason == "queue_full" or wait is None:
+            if client_bucket is not None:
+                client_bucket.refund()
+            metrics.UPSTREAM_REJECTED.labels(self.name, reason).inc()
+            raise Overloaded(f"{self.name} is overloaded, please retry later", retry_after)
+        if wait > 0:
+            with self.waiting():
+                try:
+                    await asyncio.sleep(wait)
+                except asyncio.CancelledError:
+                    self._bucket.refund()
+                    raise
+
+    def throttle(self) -> None:
+        """
+        Upstream báo vượt giới hạn tốc độ: giảm một nửa giới hạn toàn cục (tối đa một lần
+        mỗi giây, vì các request đang chạy đồng thời thường bị từ chối cùng lúc).
+        """
+        now = time.monotonic()
+        if self._bucket is None or now - self._last_throttle < 1:
+            return
+        self._last_throttle = now
+        self._bucket.rate = max(self.min_rate, self._bucket.rate / 2)
+        metrics.UPSTREAM_RATE_LIMIT.labels(self.name).set(self._bucket.rate)
+
+    def recover(self) -> None:
+        """
+        Request thành công: tăng dần giới hạn toàn cục về lại giá trị cấu hình.
+        """
+        if self._bucket is None or self._bucket.rate >= self.max_rate:
+            return
+        self._bucket.rate = min(self.max_rate, self._bucket.rate + self.max_rate / 50)
+        metrics.UPSTREAM_RATE_LIMIT.labels(self.name).set(self._bucket.rate)
+
+class CircuitBreaker:
+    """
+    Circuit breaker cho một upstream.
+
+    - closed: request được gửi bình thường; sau `failure_threshold` lỗi liên tiếp mạch mở.
+    - open: request bị từ chối ngay (`CircuitOpen`) trong `reset_timeout` giây, thay vì
+      chờ upstream trả lỗi chậm.
+    - half_open: một request thử (probe) được gửi; thành công thì mạch đóng lại, lỗi thì
+      mạch mở thêm `reset_timeout` giây.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def retry_after(self) -> float:
+        if self.state == self.CLOSED:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def check(self) -> bool:
+        """
+        Kiểm tra trước khi gửi một request.
+
+        Returns:
+            bool: True nếu request này là request thử (probe) của trạng thái half_open.
+
+        Raises:
+            CircuitOpen: Nếu mạch đang mở, hoặc đang có một request thử khác.
+        """
+        if self.state == self.CLOSED or self.failure_threshold <= 0:
+            return False
+        if self.state == self.OPEN and self.retry_after() <= 0:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        metrics.UPSTREAM_REJECTED.labels(self.name, "circuit_open").inc()
+        raise CircuitOpen(f"{self.name} is unavailable, please retry later", self.retry_after() or 1.0)
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        if self.state != self.CLOSED:
+            self.state = self.CLOSED
+            metrics.UPSTREAM_CIRCUIT_OPEN.labels(self.name).set(0)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.failure_threshold > 0 and (self.state == self.HALF_OPEN or self.failures >= self.failure_threshold):
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            metrics.UPSTREAM_CIRCUIT_OPEN.labels(self.name).set(1)
+
+    def release(self, probe: bool) -> None:
+        """
+        Request kết thúc mà không cho biết upstream có hoạt động hay không (ví dụ bị hủy).
+        """
+        if probe:
+            self._probing = False
@@ -0,0 +1,26 @@
+import re
+import hashlib
+
+from typing import List
+
+# Tách từ: chữ thường hóa và lấy các chuỗi ký tự chữ/số (hỗ trợ Unicode, ví dụ tiếng Việt)
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tách một chuỗi văn bản thành danh sách các token (từ) đã chữ thường hóa.
+
+    Args:
+        text (str): Chuỗi văn bản cần tách từ.
+
+    Returns:
+        List[str]: Danh sách các token theo đúng thứ tự xuất hiện.
+    """
+    return _TOKEN_RE.findall(text.lower())
+
+def term_hash(term: str) -> int:
+    """
+    Hash 64 bit ổn định (giữa các tiến trình và các lần chạy) của một term, dùng làm khóa
+    của postings trong các segment của chỉ mục (xem `app.services.segment_index`).
+    """
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
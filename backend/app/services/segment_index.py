@@ -0,0 +1,763 @@
+import os
+import json
+import time
+import uuid
+import heapq
+import shutil
+import threading
+import numpy as np
+
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from app.core import metrics
+from app.core.file_lock import file_lock
+from app.core.config import settings
+from app.services.chunker import (
+    Chunk, iter_stored_documents, load_chunks, load_document_chunks, make_chunk_id, save_chunks,
+)
+from app.services.search_index import term_hash, tokenize
+from app.services.vector_store import (
+    QUANTIZATION_DTYPES, build_ivf, embed_texts, load_vectors, quantize, score_rows, serialize_vectors,
+)
+
+# Dữ liệu truy xuất (vector, postings BM25, vị trí chunk) được lưu trên đĩa thành các
+# segment bất biến, mỗi segment là một thư mục các file `.npy` mà mọi worker uvicorn mở
+# bằng mmap: các trang dữ liệu nằm trong page cache của hệ điều hành và được dùng chung
+# giữa các tiến trình, thay vì mỗi worker giữ một bản sao trong bộ nhớ của nó.
+#
+# File `manifest.json` liệt kê các segment đang dùng và các tài liệu đã bị xóa (tombstone)
+# trong mỗi segment. Mỗi lần upload ghi một segment mới, mỗi lần xóa ghi một manifest mới
+# (thay thế nguyên tử bằng `os.replace`, dưới khóa file giữa các tiến trình); các worker
+# kiểm tra manifest trước mỗi truy vấn và chuyển sang phiên bản mới mà không cần khởi động
+# lại. Các segment nhỏ được gộp dần (tiered merge) để số segment luôn nhỏ.
+
+# Tăng giá trị này khi định dạng segment thay đổi để các segment được xây dựng lại
+FORMAT_VERSION = 1
+
+_ARRAYS = (
+    "doc_offsets", "spans", "lengths", "codes", "scales",
+    "term_hashes", "term_offsets", "posting_rows", "posting_tfs",
+)
+_IVF_ARRAYS = ("ivf_centroids", "ivf_offsets", "ivf_rows")
+
+# Một segment mồ côi đang ghi dở (`.tmp`) được coi là bị bỏ lại sau khoảng thời gian này
+_STALE_TMP_AGE = 3600
+
+def _save_array(directory: str, name: str, array: np.ndarray) -> None:
+    np.save(os.path.join(directory, name + ".npy"), np.ascontiguousarray(array))
+
+def _bm25_postings(chunk_texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Postings BM25 của các hàng: (hash của term, hàng, tần suất) được sắp xếp theo term.
+
+    Returns:
+        Tuple: Số token của mỗi hàng, hash của các term (tăng dần), vị trí bắt đầu postings
+        của mỗi term và các cặp (hàng, tần suất) tương ứng.
+    """
+    lengths = np.zeros(len(chunk_texts), dtype=np.int32)
+    hashes, rows, tfs = [], [], []
+    hash_cache: Dict[str, int] = {}
+    for row, text in enumerate(chunk_texts):
+        tokens = tokenize(text)
+        lengths[row] = len(tokens)
+        for term, tf in Counter(tokens).items():
+            value = hash_cache.get(term)
+            if value is None:
+                value = hash_cache[term] = term_hash(term)
+            hashes.append(value)
+            rows.append(row)
+            tfs.append(tf)
+    return (lengths,) + _group_postings(
+        np.array(hashes, dtype=np.uint64), np.array(rows, dtype=np.int32), np.array(tfs, dtype=np.int32)
+    )
+
+def _group_postings(hashes: np.ndarray, rows: np.ndarray, tfs: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    order = np.lexsort((rows, hashes))
+    hashes, rows, tfs = hashes[order], rows[order], tfs[order]
+    term_hashes, starts = np.unique(hashes, return_index=True)
+    term_offsets = np.append(starts, len(hashes)).astype(np.int64)
+    return term_hashes, term_offsets, np.stack((rows, tfs), axis=1) if len(rows) else np.zeros((0, 2), dtype=np.int32)
+
+def _write_ivf(directory: str, codes: np.ndarray, scales: np.ndarray) -> None:
+    # Chỉ mục IVF chỉ được xây dựng cho các segment đủ lớn (thường là segment đã gộp)
+    if settings.VECTOR_IVF_MIN_SIZE <= 0 or len(codes) < settings.VECTOR_IVF_MIN_SIZE:
+        return
+    nlist = settings.VECTOR_IVF_NLIST or max(16, int(np.sqrt(len(codes))))
+    centroids, offsets, rows = build_ivf(codes, scales, min(nlist, len(codes)))
+    for name, array in zip(_IVF_ARRAYS, (centroids, offsets, rows)):
+        _save_array(directory, name, array)
+
+def _write_meta(directory: str, doc_ids: List[str], rows: int, total_length: int, quantization: str) -> None:
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "format": FORMAT_VERSION,
+            "dim": settings.EMBEDDING_DIM,
+            "quantization": quantization,
+            "rows": rows,
+            "total_length": total_length,
+            "docs": doc_ids,
+        }, f, ensure_ascii=False)
+
+def write_segment(directory: str, documents: Sequence[Tuple[str, List[Chunk], np.ndarray]], quantization: str) -> None:
+    """
+    Ghi một segment mới chứa các tài liệu `documents`: (doc_id, các chunk kèm nội dung,
+    ma trận vector của các chunk).
+    """
+    os.makedirs(directory)
+    doc_ids = [doc_id for doc_id, _chunks, _vectors in documents]
+    counts = [len(chunks) for _doc_id, chunks, _vectors in documents]
+    chunks = [chunk for _doc_id, doc_chunks, _vectors in documents for chunk in doc_chunks]
+    vectors = [doc_vectors for _doc_id, _chunks, doc_vectors in documents if len(doc_vectors)]
+    vectors = np.concatenate(vectors) if vectors else np.zeros((0, settings.EMBEDDING_DIM), dtype=np.float32)
+
+    codes, scales = quantize(vectors, quantization)
+    lengths, term_hashes, term_offsets, postings = _bm25_postings([chunk.text for chunk in chunks])
+    arrays = {
+        "doc_offsets": np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+        "spans": np.array([[chunk.start, chunk.end] for chunk in chunks], dtype=np.int64).reshape(-1, 2),
+        "lengths": lengths,
+        "codes": codes,
+        "scales": scales,
+        "term_hashes": term_hashes,
+        "term_offsets": term_offsets,
+        "posting_rows": postings[:, 0],
+        "posting_tfs": postings[:, 1],
+    }
+    for name, array in arrays.items():
+        _save_array(directory, name, array)
+    _write_ivf(directory, codes, scales)
+    _write_meta(directory, doc_ids, len(chunks), int(lengths.sum()), quantization)
+
+class Segment:
+    """
+    Một segment đã ghi trên đĩa, mở ở chế độ chỉ đọc.
+
+    Các mảng lớn (vector, postings, vị trí chunk) là view numpy trên mmap, không sao chép
+    vào bộ nhớ của tiến trình; chỉ danh sách doc_id được đọc vào bộ nhớ.
+
+    Các hàng của một tài liệu nằm liên tiếp nhau, từ `doc_offsets[i]` đến
+    `doc_offsets[i + 1]`; hàng thứ k của tài liệu là chunk `make_chunk_id(doc_id, k)`.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.name = os.path.basename(directory)
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["format"] != FORMAT_VERSION or meta["dim"] != settings.EMBEDDING_DIM:
+            raise ValueError(f"Segment {self.name} has an incompatible format")
+        self.quantization = meta["quantization"]
+        self.rows = meta["rows"]
+        self.total_length = meta["total_length"]
+        self.doc_ids: List[str] = meta["docs"]
+        self.doc_index = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, name + ".npy"), mmap_mode="r"))
+        self.has_ivf = os.path.exists(os.path.join(directory, "ivf_centroids.npy"))
+        if self.has_ivf:
+            for name in _IVF_ARRAYS:
+                setattr(self, name, np.load(os.path.join(directory, name + ".npy"), mmap_mode="r"))
+
+    def doc_rows(self, doc: int) -> Tuple[int, int]:
+        return int(self.doc_offsets[doc]), int(self.doc_offsets[doc + 1])
+
+    def docs_of_rows(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Chỉ số tài liệu (trong segment) của mỗi hàng.
+        """
+        return np.searchsorted(self.doc_offsets, rows, side="right") - 1
+
+    def postings(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Các hàng chứa term (theo hash) và tần suất tương ứng.
+        """
+        position = int(np.searchsorted(self.term_hashes, np.uint64(term)))
+        if position >= len(self.term_hashes) or int(self.term_hashes[position]) != term:
+            return self.posting_rows[:0], self.posting_tfs[:0]
+        start, end = int(self.term_offsets[position]), int(self.term_offsets[position + 1])
+        return self.posting_rows[start:end], self.posting_tfs[start:end]
+
+@dataclass
+class _SegmentView:
+    """
+    Một segment trong một phiên bản của manifest: segment và các tài liệu đã bị xóa.
+    """
+    segment: Segment
+    deleted: np.ndarray
+    alive: Optional[np.ndarray] = None
+    live_rows: int = 0
+    live_length: int = 0
+
+    def __post_init__(self):
+        segment = self.segment
+        self.live_rows = segment.rows
+        self.live_length = segment.total_length
+        if len(self.deleted):
+            self.alive = np.ones(segment.rows, dtype=bool)
+            for doc in self.deleted:
+                start, end = segment.doc_rows(doc)
+                self.alive[start:end] = False
+                self.live_rows -= end - start
+                self.live_length -= int(segment.lengths[start:end].sum())
+
+    def row_mask(self, rows: np.ndarray, allowed: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Các hàng không thuộc tài liệu đã xóa và (nếu có) thuộc các tài liệu `allowed`.
+        """
+        mask = self.alive[rows] if self.alive is not None else np.ones(len(rows), dtype=bool)
+        if allowed is not None:
+            mask &= np.isin(self.segment.docs_of_rows(rows), allowed)
+        return mask
+
+    def allowed_docs(self, doc_ids: Sequence[str]) -> np.ndarray:
+        deleted = set(self.deleted.tolist())
+        docs = (self.segment.doc_index.get(doc_id) for doc_id in doc_ids)
+        return np.array([doc for doc in docs if doc is not None and doc not in deleted], dtype=np.int64)
+
+    @property
+    def deleted_ids(self) -> set:
+        return {self.segment.doc_ids[doc] for doc in self.deleted}
+
+    def rows_of_docs(self, docs: np.ndarray) -> np.ndarray:
+        ranges = [np.arange(*self.segment.doc_rows(int(doc))) for doc in docs]
+        return np.concatenate(ranges) if ranges else np.zeros(0, dtype=np.int64)
+
+    def chunk_id(self, row: int) -> str:
+        doc = int(self.segment.docs_of_rows(np.array([row]))[0])
+        return make_chunk_id(self.segment.doc_ids[doc], row - int(self.segment.doc_offsets[doc]))
+
+@dataclass
+class _Snapshot:
+    """
+    Trạng thái của chỉ mục theo một phiên bản của manifest (không thay đổi sau khi tạo;
+    một truy vấn dùng một snapshot từ đầu đến cuối).
+    """
+    version: int
+    views: List[_SegmentView] = field(default_factory=list)
+    docs: Dict[str, Tuple[_SegmentView, int]] = field(default_factory=dict)
+
+    @property
+    def live_rows(self) -> int:
+        return sum(view.live_rows for view in self.views)
+
+    @property
+    def live_length(self) -> int:
+        return sum(view.live_length for view in self.views)
+
+class SegmentIndex:
+    """
+    Chỉ mục truy xuất (BM25, vector, vị trí chunk) dùng chung giữa các worker, gồm các
+    segment bất biến trên đĩa mở bằng mmap (xem chú thích đầu module).
+
+    - Ghi: `add_document` ghi một segment mới và đánh dấu xóa bản cũ của tài liệu (nếu có),
+      `remove_document` đánh dấu xóa; cả hai tạo một phiên bản manifest mới. Khi có hơn
+      `max_segments` segment, các segment nhỏ nhất (và các segment có nhiều hàng đã xóa)
+      được gộp thành một, bỏ các hàng đã xóa, trong một luồng nền (`schedule_merge`).
+    - Đọc: mỗi truy vấn dùng snapshot của manifest mới nhất; snapshot chỉ được tạo lại khi
+      file manifest thay đổi, các segment đã mở được dùng lại.
+    - Lần đầu chạy (chưa có manifest, hoặc định dạng cũ), chỉ mục được xây dựng một lần từ
+      các file `.txt`, `.chunks`, `.vector` trong thư mục upload khi ứng dụng khởi động
+      (`open`); các worker khác chờ rồi mở kết quả, không xây dựng lại.
+    """
+
+    def __init__(self, directory: str, quantization: str, max_segments: int, k1: float = 1.5, b: float = 0.75):
+        if quantization not in QUANTIZATION_DTYPES:
+            raise ValueError(f"Unknown vector quantization: {quantization}")
+        self.directory = directory
+        self.quantization = quantization
+        self.max_segments = max_segments
+        self.k1 = k1
+        self.b = b
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self._segments: Dict[str, Segment] = {}
+        self._snapshot: Optional[_Snapshot] = None
+        self._manifest_stat: Optional[Tuple[int, int, int]] = None
+        self._lock = threading.RLock()
+        self._merge_thread: Optional[threading.Thread] = None
+        self._merge_requested = False
+
+    # --- Manifest ---------------------------------------------------------------------------
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, file_lock(os.path.join(self.directory, "write.lock")):
+            yield
+
+    def _read_manifest(self) -> Optional[dict]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        if manifest.get("format") != FORMAT_VERSION or manifest.get("dim") != settings.EMBEDDING_DIM:
+            return None
+        return manifest
+
+    def _write_manifest(self, manifest: dict) -> None:
+        manifest["format"] = FORMAT_VERSION
+        manifest["dim"] = settings.EMBEDDING_DIM
+        manifest["version"] = manifest.get("version", 0) + 1
+        tmp_path = f"{self.manifest_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+        metrics.INDEX_SEGMENTS.set(len(manifest["segments"]))
+        self._remove_unused_segments(manifest)
+
+    def _remove_unused_segments(self, manifest: dict) -> None:
+        # Chỉ chạy khi đang giữ khóa ghi. Worker khác có thể vẫn đang đọc một segment cũ:
+        # trên Linux file đã mmap vẫn đọc được sau khi bị xóa, trên Windows việc xóa thất bại
+        # và được thử lại lần sau
+        used = {entry["name"] for entry in manifest["segments"]}
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.startswith("seg-") or name in used or not os.path.isdir(path):
+                continue
+            if name.endswith(".tmp") and now - os.path.getmtime(path) < _STALE_TMP_AGE:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _open(self, name: str) -> Segment:
+        segment = self._segments.get(name)
+        if segment is None:
+            segment = self._segments[name] = Segment(os.path.join(self.directory, name))
+        return segment
+
+    def _new_segment_dir(self) -> Tuple[str, str]:
+        name = f"seg-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        return name, os.path.join(self.directory, name + ".tmp")
+
+    # --- Snapshot ---------------------------------------------------------------------------
+
+    def open(self) -> None:
+        """
+        Mở phiên bản mới nhất của chỉ mục, xây dựng nó từ thư mục upload nếu chưa có (gọi
+        khi ứng dụng khởi động, trong luồng khác: việc xây dựng đọc và vector hóa lại toàn bộ
+        tài liệu, hoặc chờ worker khác làm việc đó).
+        """
+        self._current()
+
+    def _current(self) -> _Snapshot:
+        """
+        Snapshot của manifest mới nhất (tạo lại khi file manifest thay đổi).
+        """
+        try:
+            stat = os.stat(self.manifest_path)
+            key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            key = None
+        snapshot = self._snapshot
+        if snapshot is not None and key is not None and key == self._manifest_stat:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is not None and key is not None and key == self._manifest_stat:
+                return self._snapshot
+            for attempt in range(3):
+                if self._read_manifest() is None:
+                    self._build_from_uploads()
+                # Lấy thông tin file trước khi đọc: nếu manifest thay đổi ngay sau đó, truy vấn
+                # sau sẽ thấy khác và đọc lại
+                stat = os.stat(self.manifest_path)
+                try:
+                    snapshot = self._load_snapshot(self._read_manifest())
+                    break
+                except FileNotFoundError:
+                    # Segment vừa bị gộp và xóa bởi một worker khác: đọc lại manifest
+                    if attempt == 2:
+                        raise
+            self._manifest_stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._snapshot = snapshot
+            return snapshot
+
+    def _load_snapshot(self, manifest: dict) -> _Snapshot:
+        snapshot = _Snapshot(manifest["version"])
+        for entry in manifest["segments"]:
+            segment = self._open(entry["name"])
+            deleted = np.array(sorted(segment.doc_index[doc_id] for doc_id in entry["deleted"]), dtype=np.int64)
+            view = _SegmentView(segment, deleted)
+            snapshot.views.append(view)
+            deleted_docs = set(entry["deleted"])
+            for doc, doc_id in enumerate(segment.doc_ids):
+                if doc_id not in deleted_docs:
+                    snapshot.docs[doc_id] = (view, doc)
+        # Đóng (bỏ tham chiếu tới mmap của) các segment không còn được dùng
+        names = {entry["name"] for entry in manifest["segments"]}
+        self._segments = {name: segment for name, segment in self._segments.items() if name in names}
+        metrics.INDEX_SEGMENTS.set(len(snapshot.views))
+        return snapshot
+
+    def _build_from_uploads(self) -> None:
+        """
+        Xây dựng chỉ mục từ các tài liệu đã có trong thư mục upload (lần chạy đầu tiên, hoặc
+        khi định dạng chỉ mục thay đổi). Chỉ một worker thực hiện; các worker khác chờ khóa
+        rồi dùng manifest vừa được ghi.
+        """
+        with self._write_lock():
+            if self._read_manifest() is not None:
+                return
+            documents = [self._load_stored_document(doc_id) for doc_id in iter_stored_documents()]
+            manifest = {"segments": []}
+            if documents:
+                name, tmp_dir = self._new_segment_dir()
+                write_segment(tmp_dir, documents, self.quantization)
+                os.replace(tmp_dir, os.path.join(self.directory, name))
+                manifest["segments"].append({"name": name, "deleted": []})
+            self._write_manifest(manifest)
+
+    @staticmethod
+    def _load_stored_document(doc_id: str) -> Tuple[str, List[Chunk], np.ndarray]:
+        base_path = os.path.join(settings.UPLOAD_DIR, doc_id)
+        with open(base_path + ".txt", "rb") as f:
+            data = f.read()
+        if os.path.exists(base_path + ".chunks"):
+            chunks = [
+                Chunk(c.chunk_id, doc_id, c.start, c.end, data[c.start:c.end].decode("utf-8", errors="ignore"))
+                for c in load_chunks(doc_id, base_path + ".chunks")
+            ]
+        else:
+            # Tài liệu được upload trước khi có chunk: chia chunk và lưu lại
+            chunks = load_document_chunks(doc_id)
+            save_chunks(base_path + ".chunks", chunks)
+
+        vectors = load_vectors(base_path + ".vector") if os.path.exists(base_path + ".vector") else None
+        if vectors is None or len(vectors) != len(chunks):
+            # File `.vector` theo định dạng cũ hoặc khác số chiều: vector hóa lại
+            vectors = embed_texts([chunk.text for chunk in chunks])
+            tmp_path = f"{base_path}.vector.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(serialize_vectors(vectors))
+                os.replace(tmp_path, base_path + ".vector")
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return doc_id, chunks, vectors
+
+    # --- Ghi --------------------------------------------------------------------------------
+
+    def _delete_in(self, manifest: dict, doc_id: str) -> bool:
+        """
+        Đánh dấu xóa bản đang dùng của tài liệu trong manifest (nếu có).
+        """
+        for entry in manifest["segments"]:
+            if doc_id in self._open(entry["name"]).doc_index and doc_id not in entry["deleted"]:
+                entry["deleted"].append(doc_id)
+                return True
+        return False
+
+    def add_document(self, doc_id: str, chunks: List[Chunk], vectors: np.ndarray) -> None:
+        """
+        Thêm (hoặc thay thế) một tài liệu: ghi một segment mới chứa các chunk (kèm nội dung)
+        và vector của nó.
+        """
+        self.add_documents([(doc_id, chunks, vectors)])
+
+    def add_documents(self, documents: Sequence[Tuple[str, List[Chunk], np.ndarray]]) -> None:
+        """
+        Thêm (hoặc thay thế) nhiều tài liệu trong cùng một segment mới.
+        """
+        self._current()
+        name, tmp_dir = self._new_segment_dir()
+        # Segment được ghi ngoài khóa, chỉ việc cập nhật manifest cần khóa
+        write_segment(tmp_dir, documents, self.quantization)
+        with self._write_lock():
+            manifest = self._read_manifest()
+            for doc_id, _chunks, _vectors in documents:
+                self._delete_in(manifest, doc_id)
+            os.replace(tmp_dir, os.path.join(self.directory, name))
+            manifest["segments"].append({"name": name, "deleted": []})
+            self._write_manifest(manifest)
+        self.schedule_merge()
+
+    def remove_document(self, doc_id: str) -> None:
+        """
+        Xóa một tài liệu (đánh dấu xóa trong segment chứa nó).
+        """
+        self._current()
+        with self._write_lock():
+            manifest = self._read_manifest()
+            if self._delete_in(manifest, doc_id):
+                self._write_manifest(manifest)
+
+    def schedule_merge(self) -> None:
+        """
+        Gộp các segment trong một luồng nền nếu có hơn `max_segments` segment, để tác vụ
+        upload vừa thêm segment không phải chờ việc gộp. Mỗi tiến trình có tối đa một luồng
+        gộp; yêu cầu đến trong lúc đang gộp được thực hiện ngay sau lần gộp đó.
+        """
+        if len(self._current().views) <= self.max_segments:
+            return
+        with self._lock:
+            if self._merge_thread is not None:
+                self._merge_requested = True
+                return
+            self._merge_thread = threading.Thread(target=self._merge_loop, name="segment-merge", daemon=True)
+            self._merge_thread.start()
+
+    def _merge_loop(self) -> None:
+        while True:
+            try:
+                self.merge()
+            except Exception as e:
+                print(f"Error merging index segments: {str(e)}")
+            with self._lock:
+                if not self._merge_requested:
+                    self._merge_thread = None
+                    return
+                self._merge_requested = False
+
+    def merge(self) -> None:
+        """
+        Gộp các segment nhỏ nhất (và các segment có hơn một nửa số hàng đã bị xóa) khi có hơn
+        `max_segments` segment (chạy đồng bộ, xem `schedule_merge`). Việc gộp chạy ngoài khóa
+        ghi (các upload khác không phải chờ) và chỉ một tiến trình gộp tại một thời điểm.
+        """
+        with file_lock(os.path.join(self.directory, "merge.lock"), blocking=False) as acquired:
+            if not acquired:
+                return
+            snapshot = self._current()
+            if len(snapshot.views) <= self.max_segments:
+                return
+            views = sorted(snapshot.views, key=lambda view: view.live_rows)
+            count = len(views) - self.max_segments // 2 + 1
+            selected = views[:count] + [
+                view for view in views[count:] if view.live_rows < view.segment.rows / 2
+            ]
+
+            started = time.perf_counter()
+            name, tmp_dir = self._new_segment_dir()
+            self._write_merged(tmp_dir, selected)
+            with self._write_lock():
+                manifest = self._read_manifest()
+                entries = {entry["name"]: entry for entry in manifest["segments"]}
+                if any(view.segment.name not in entries for view in selected):
+                    # Một tiến trình khác đã thay đổi các segment này
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    return
+                # Tài liệu bị xóa (hoặc thay thế) trong lúc gộp vẫn bị xóa trong segment mới
+                merged_names = {view.segment.name for view in selected}
+                deleted = [
+                    doc_id for view in selected
+                    for doc_id in set(entries[view.segment.name]["deleted"]) - view.deleted_ids
+                ]
+                manifest["segments"] = [entry for entry in manifest["segments"] if entry["name"] not in merged_names]
+                os.replace(tmp_dir, os.path.join(self.directory, name))
+                manifest["segments"].append({"name": name, "deleted": deleted})
+                self._write_manifest(manifest)
+            metrics.INDEX_MERGE_DURATION.observe(time.perf_counter() - started)
+
+    def _write_merged(self, directory: str, views: List[_SegmentView]) -> None:
+        """
+        Ghi một segment chứa các hàng còn lại của `views`.
+        """
+        os.makedirs(directory)
+        doc_ids, counts, spans, lengths, scales = [], [], [], [], []
+        posting_hashes, posting_rows, posting_tfs = [], [], []
+        total_rows = sum(view.live_rows for view in views)
+        codes = np.lib.format.open_memmap(
+            os.path.join(directory, "codes.npy"), mode="w+",
+            dtype=QUANTIZATION_DTYPES[self.quantization], shape=(total_rows, settings.EMBEDDING_DIM),
+        )
+
+        offset = 0
+        for view in views:
+            segment = view.segment
+            keep = np.flatnonzero(view.alive) if view.alive is not None else np.arange(segment.rows)
+            deleted = set(view.deleted.tolist())
+            for doc, doc_id in enumerate(segment.doc_ids):
+                if doc not in deleted:
+                    doc_ids.append(doc_id)
+                    start, end = segment.doc_rows(doc)
+                    counts.append(end - start)
+            spans.append(segment.spans[keep])
+            lengths.append(segment.lengths[keep])
+            # Sao chép vector theo từng khối; đổi kiểu lượng tử hóa nếu cấu hình đã thay đổi
+            for start in range(0, len(keep), 65536):
+                rows = keep[start:start + 65536]
+                block_codes, block_scales = segment.codes[rows], segment.scales[rows]
+                if segment.quantization != self.quantization:
+                    block_codes, block_scales = quantize(block_codes.astype(np.float32) * block_scales[:, None], self.quantization)
+                codes[offset + start:offset + start + len(rows)] = block_codes
+                scales.append(block_scales)
+
+            # Đánh số lại các hàng trong postings
+            new_rows = np.full(segment.rows, -1, dtype=np.int64)
+            new_rows[keep] = np.arange(offset, offset + len(keep))
+            mapped = new_rows[segment.posting_rows]
+            live = mapped >= 0
+            posting_hashes.append(np.repeat(segment.term_hashes, np.diff(segment.term_offsets))[live])
+            posting_rows.append(mapped[live].astype(np.int32))
+            posting_tfs.append(np.asarray(segment.posting_tfs)[live])
+            offset += len(keep)
+
+        codes.flush()
+        scales = np.concatenate(scales) if scales else np.zeros(0, dtype=np.float32)
+        lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int32)
+        term_hashes, term_offsets, postings = _group_postings(
+            np.concatenate(posting_hashes), np.concatenate(posting_rows), np.concatenate(posting_tfs)
+        )
+        arrays = {
+            "doc_offsets": np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+            "spans": np.concatenate(spans) if spans else np.zeros((0, 2), dtype=np.int64),
+            "lengths": lengths,
+            "scales": scales,
+            "term_hashes": term_hashes,
+            "term_offsets": term_offsets,
+            "posting_rows": postings[:, 0],
+            "posting_tfs": postings[:, 1],
+        }
+        for name, array in arrays.items():
+            _save_array(directory, name, array)
+        _write_ivf(directory, codes, scales)
+        del codes
+        _write_meta(directory, doc_ids, total_rows, int(lengths.sum()), self.quantization)
+
+    # --- Đọc --------------------------------------------------------------------------------
+
+    def _allowed(self, view: _SegmentView, doc_ids: Optional[Sequence[str]]) -> Optional[np.ndarray]:
+        return view.allowed_docs(doc_ids) if doc_ids is not None else None
+
+    def search_keywords(self, query: str, top_k: int = 5, doc_ids: Optional[Sequence[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Tìm các chunk liên quan nhất với câu truy vấn theo điểm BM25.
+
+        Args:
+            query (str): Câu truy vấn của người dùng.
+            top_k (int): Số lượng chunk tối đa cần trả về.
+            doc_ids (Optional[Sequence[str]]): Nếu được cung cấp, chỉ xét các chunk của các tài liệu này.
+
+        Returns:
+            List[Tuple[str, float]]: Danh sách (chunk_id, điểm) sắp xếp theo điểm giảm dần.
+        """
+        snapshot = self._current()
+        n_chunks = snapshot.live_rows
+        terms = sorted({term_hash(term) for term in tokenize(query)})
+        if n_chunks == 0 or not terms or top_k <= 0:
+            return []
+        avg_len = snapshot.live_length / n_chunks or 1.0
+
+        # Tần suất tài liệu của mỗi term trên toàn bộ chỉ mục (gồm cả các hàng đã xóa nhưng
+        # chưa được gộp đi, như Lucene)
+        postings = [[view.segment.postings(term) for term in terms] for view in snapshot.views]
+        df = np.sum([[len(rows) for rows, _tfs in view_postings] for view_postings in postings], axis=0)
+        idf = np.log(1 + (n_chunks - df + 0.5) / (df + 0.5))
+
+        candidates = []
+        for view, view_postings in zip(snapshot.views, postings):
+            rows = np.concatenate([rows for rows, _tfs in view_postings]).astype(np.int64)
+            if len(rows) == 0:
+                continue
+            tfs = np.concatenate([tfs for _rows, tfs in view_postings]).astype(np.float32)
+            weights = np.repeat(idf, [len(rows) for rows, _tfs in view_postings])
+            norm = self.k1 * (1 - self.b + self.b * view.segment.lengths[rows] / avg_len)
+            unique_rows, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, weights * tfs * (self.k1 + 1) / (tfs + norm))
+            kept = view.row_mask(unique_rows, self._allowed(view, doc_ids))
+            candidates.extend(self._top(view, unique_rows[kept], scores[kept], top_k))
+        return [(chunk_id, score) for score, chunk_id in heapq.nlargest(top_k, candidates)]
+
+    def search_vectors(self, query: np.ndarray, top_k: int = 5, doc_ids: Optional[Sequence[str]] = None,
+                       nprobe: Optional[int] = None, exact: bool = False) -> List[Tuple[str, float]]:
+        """
+        Tìm top-k chunk có độ tương đồng cosine cao nhất với vector truy vấn.
+
+        Segment có chỉ mục IVF chỉ xét các hàng của `nprobe` list gần nhất (tìm xấp xỉ); khi
+        giới hạn trong `doc_ids` (hoặc `exact`), tất cả các hàng liên quan đều được xét.
+
+        Args:
+            query (np.ndarray): Vector truy vấn (dim,) đã chuẩn hóa L2.
+            top_k (int): Số kết quả tối đa.
+            doc_ids (Optional[Sequence[str]]): Nếu được cung cấp, chỉ xét các tài liệu này.
+            nprobe (Optional[int]): Số list IVF được xét (mặc định VECTOR_IVF_NPROBE).
+            exact (bool): Bỏ qua chỉ mục IVF.
+
+        Returns:
+            List[Tuple[str, float]]: Danh sách (chunk_id, điểm cosine) giảm dần theo điểm.
+        """
+        snapshot = self._current()
+        if top_k <= 0:
+            return []
+        query = query.astype(np.float32, copy=False)
+        nprobe = nprobe or settings.VECTOR_IVF_NPROBE
+
+        candidates = []
+        for view in snapshot.views:
+            segment = view.segment
+            if view.live_rows == 0:
+                continue
+            if doc_ids is not None:
+                rows = view.rows_of_docs(self._allowed(view, doc_ids))
+            elif segment.has_ivf and not exact:
+                closeness = segment.ivf_centroids @ query
+                probes = np.argpartition(-closeness, min(nprobe, len(closeness)) - 1)[:nprobe]
+                rows = np.concatenate([
+                    segment.ivf_rows[segment.ivf_offsets[i]:segment.ivf_offsets[i + 1]] for i in probes
+                ]).astype(np.int64)
+                rows = rows[view.row_mask(rows, None)]
+            elif view.alive is not None:
+                rows = np.flatnonzero(view.alive)
+            else:
+                rows = None
+            scores = score_rows(segment.codes, segment.scales, query, rows)
+            if rows is None:
+                rows = np.arange(segment.rows)
+            candidates.extend(self._top(view, rows, scores, top_k))
+        return [(chunk_id, score) for score, chunk_id in heapq.nlargest(top_k, candidates) if score > 0]
+
+    @staticmethod
+    def _top(view: _SegmentView, rows: np.ndarray, scores: np.ndarray, top_k: int) -> List[Tuple[float, str]]:
+        if len(rows) == 0:
+            return []
+        k = min(top_k, len(rows))
+        # argpartition: O(n) để lấy k phần tử lớn nhất
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [(float(scores[i]), view.chunk_id(int(rows[i]))) for i in top]
+
+    def span(self, chunk_id: str) -> Optional[Tuple[str, int, int]]:
+        """
+        Trả về (doc_id, start, end) của chunk, hoặc None nếu không tồn tại.
+        """
+        doc_id, _, number = chunk_id.rpartition("#")
+        entry = self._current().docs.get(doc_id)
+        if entry is None or not number.isdigit():
+            return None
+        view, doc = entry
+        start, end = view.segment.doc_rows(doc)
+        row = start + int(number)
+        if row >= end:
+            return None
+        return doc_id, int(view.segment.spans[row, 0]), int(view.segment.spans[row, 1])
+
+    def chunk_count(self, doc_id: str) -> int:
+        """
+        Số chunk của một tài liệu (0 nếu tài liệu không có trong chỉ mục).
+        """
+        entry = self._current().docs.get(doc_id)
+        if entry is None:
+            return 0
+        start, end = entry[0].segment.doc_rows(entry[1])
+        return end - start
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Phiên bản manifest, số segment, số tài liệu và số chunk đang dùng.
+        """
+        snapshot = self._current()
+        return {
+            "version": snapshot.version,
+            "segments": len(snapshot.views),
+            "documents": len(snapshot.docs),
+            "chunks": snapshot.live_rows,
+        }
+
+# Chỉ mục truy xuất dùng chung cho toàn bộ ứng dụng
+segment_index = SegmentIndex(
+    os.path.join(settings.INDEX_DIR, "segments"),
+    quantization=settings.VECTOR_QUANTIZATION,
+    max_segments=settings.INDEX_MAX_SEGMENTS,
+)
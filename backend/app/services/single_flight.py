@@ -0,0 +1,123 @@
+import asyncio
+
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+from app.core import deadline, metrics
+
+T = TypeVar("T")
+
+class _Call:
+    """
+    Một công việc đang chạy, dùng chung bởi `waiters` bên gọi.
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        # Chỉ dùng cho `stream`: các phần tử đã nhận và sự kiện báo có phần tử mới
+        self.items: List[Any] = []
+        self.changed = asyncio.Event()
+
+    def notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+class SingleFlight:
+    """
+    Gộp các lời gọi giống nhau đang diễn ra đồng thời (single-flight).
+
+    Lời gọi đầu tiên với một khóa khởi chạy công việc trong một task riêng; các lời gọi
+    cùng khóa đến trước khi công việc xong chờ chung task đó và nhận cùng kết quả (hoặc
+    cùng ngoại lệ). Khi công việc xong, khóa được giải phóng: kết quả không được giữ lại
+    (việc đó thuộc về `llm_cache`).
+
+    - Một bên gọi bị hủy (client ngắt kết nối, hết thời hạn) chỉ ngừng chờ; công việc
+      chung chỉ bị hủy khi không còn bên nào chờ.
+    - Công việc chung không thuộc về request nào (xem `deadline.detached_context`): nó
+      không bị dừng vì thời hạn hay việc hủy của request đầu tiên, mỗi bên gọi tự áp
+      thời hạn của mình khi chờ.
+    """
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._calls: Dict[Hashable, _Call] = {}
+
+    @property
+    def in_flight_count(self) -> int:
+        return len(self._calls)
+
+    def _join(self, key: Hashable, start: Callable[[_Call], Awaitable[Any]]) -> _Call:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call()
+            call.task = asyncio.get_running_loop().create_task(start(call), context=deadline.detached_context())
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self._calls[key] = call
+        else:
+            metrics.SINGLE_FLIGHT_SHARED.labels(self.name).inc()
+        call.waiters += 1
+        return call
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _leave(self, key: Hashable, call: _Call) -> None:
+        call.waiters -= 1
+        if call.waiters == 0 and not call.task.done():
+            # Không còn ai chờ kết quả: hủy công việc, lời gọi sau với cùng khóa chạy lại từ đầu
+            self._forget(key, call)
+            call.task.cancel()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Chạy `fn()`, hoặc chờ kết quả của lời gọi cùng khóa đang diễn ra.
+        """
+        if not self.enabled:
+            return await fn()
+        call = self._join(key, lambda _: fn())
+        try:
+            # shield: bên gọi bị hủy không làm hủy task dùng chung
+            return await asyncio.shield(call.task)
+        finally:
+            self._leave(key, call)
+
+    async def stream(self, key: Hashable, fn: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Duyệt `fn()`, hoặc cùng duyệt kết quả của lời gọi cùng khóa đang diễn ra.
+
+        Bên gọi đến sau nhận lại các phần tử đã có rồi tiếp tục nhận các phần tử mới cùng
+        lúc với các bên khác. Công việc chung đọc nguồn theo tốc độ của nó, không chờ bên
+        gọi chậm nhất; các phần tử được giữ trong bộ nhớ cho đến khi công việc xong.
+        """
+        if not self.enabled:
+            async with aclosing(fn()) as items:
+                async for item in items:
+                    yield item
+            return
+
+        async def produce(call: _Call) -> None:
+            try:
+                async with aclosing(fn()) as items:
+                    async for item in items:
+                        call.items.append(item)
+                        call.notify()
+            finally:
+                call.notify()
+
+        call = self._join(key, produce)
+        try:
+            index = 0
+            while True:
+                if index < len(call.items):
+                    index += 1
+                    yield call.items[index - 1]
+                elif call.task.done():
+                    # Ném lại ngoại lệ của công việc chung (nếu có)
+                    call.task.result()
+                    return
+                else:
+                    await call.changed.wait()
+        finally:
+            self._leave(key, call)
@@ -0,0 +1,154 @@
+import io
+import threading
+import numpy as np
+
+from typing import List, Optional, Tuple
+from app.core.config import settings
+
+# Vectorizer không có trạng thái (stateless): không cần fit, mọi worker đều cho ra
+# cùng một vector với cùng một văn bản, số chiều cố định bằng EMBEDDING_DIM.
+# scikit-learn chỉ được import ở lần vector hóa đầu tiên (import mất khoảng 1 giây).
+_vectorizer = None
+_vectorizer_lock = threading.Lock()
+
+def get_vectorizer():
+    """
+    Trả về vectorizer dùng chung, khởi tạo ở lần gọi đầu tiên.
+    """
+    global _vectorizer
+    if _vectorizer is None:
+        with _vectorizer_lock:
+            if _vectorizer is None:
+                from sklearn.feature_extraction.text import HashingVectorizer
+                _vectorizer = HashingVectorizer(
+                    n_features=settings.EMBEDDING_DIM,
+                    ngram_range=(1, 2),
+                    norm="l2",
+                    dtype=np.float32,
+                )
+    return _vectorizer
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """
+    Chuyển danh sách văn bản thành ma trận embedding đã chuẩn hóa L2.
+
+    Args:
+        texts (List[str]): Danh sách văn bản cần vector hóa.
+
+    Returns:
+        np.ndarray: Ma trận float32 có kích thước (len(texts), EMBEDDING_DIM).
+    """
+    return np.ascontiguousarray(get_vectorizer().transform(texts).toarray(), dtype=np.float32)
+
+def serialize_vectors(vectors: np.ndarray) -> bytes:
+    """
+    Chuyển ma trận vector thành bytes (định dạng .npy) để lưu vào file `.vector`.
+    """
+    buffer = io.BytesIO()
+    np.save(buffer, vectors.astype(np.float32, copy=False))
+    return buffer.getvalue()
+
+def load_vectors(vector_path: str) -> Optional[np.ndarray]:
+    """
+    Đọc ma trận vector từ file `.vector`.
+
+    Returns:
+        Optional[np.ndarray]: Ma trận (n, EMBEDDING_DIM), hoặc None nếu file không hợp lệ
+        (ví dụ file theo định dạng cũ mỗi ký tự một số float, hoặc khác số chiều).
+    """
+    try:
+        vectors = np.load(vector_path, allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+    if vectors.ndim != 2 or vectors.shape[1] != settings.EMBEDDING_DIM:
+        return None
+    return vectors.astype(np.float32, copy=False)
+
+# Kiểu dữ liệu lưu vector trong bộ nhớ: float16 (1/2 bộ nhớ) hoặc int8 kèm một hệ số
+# tỉ lệ cho mỗi vector (1/4 bộ nhớ); độ tương đồng được tính lại bằng float32
+QUANTIZATION_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# Số hàng được giải lượng tử hóa và nhân với vector truy vấn mỗi lần (giới hạn bộ nhớ tạm)
+_BLOCK_SIZE = 256
+
+def quantize(vectors: np.ndarray, quantization: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lượng tử hóa các vector để lưu trong bộ nhớ.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Ma trận đã lượng tử hóa và hệ số tỉ lệ (float32) của
+        từng hàng, sao cho `codes[i] * scales[i]` xấp xỉ `vectors[i]`.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if quantization == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    return vectors.astype(QUANTIZATION_DTYPES[quantization]), np.ones(len(vectors), dtype=np.float32)
+
+def nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Chỉ số của centroid gần nhất (cosine) với mỗi vector.
+    """
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _BLOCK_SIZE):
+        block = vectors[start:start + _BLOCK_SIZE].astype(np.float32, copy=False)
+        assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+def train_centroids(sample: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Huấn luyện `nlist` centroid bằng k-means cầu (spherical k-means, theo cosine) trên
+    một mẫu các vector đã chuẩn hóa L2.
+    """
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(sample))
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = nearest_centroids(sample, centroids)
+        counts = np.bincount(assign, minlength=nlist)
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+        centroids[nonempty] = np.add.reduceat(sample[np.argsort(assign, kind="stable")], starts, axis=0)
+        # List rỗng: khởi tạo lại bằng một vector ngẫu nhiên của mẫu
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty))]
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids /= np.where(norms > 0, norms, 1)
+    return centroids
+
+def build_ivf(codes: np.ndarray, scales: np.ndarray, nlist: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Xây dựng chỉ mục IVF cho các vector đã lượng tử hóa: huấn luyện `nlist` centroid trên
+    một mẫu khoảng 40 vector cho mỗi list, rồi xếp mỗi hàng vào list của centroid gần nhất.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Các centroid (nlist, dim), vị trí bắt đầu
+        của mỗi list (nlist + 1) và chỉ số các hàng sắp xếp theo list.
+    """
+    rng = np.random.default_rng(seed)
+    sample_rows = np.sort(rng.choice(len(codes), min(len(codes), nlist * 40), replace=False))
+    sample = codes[sample_rows].astype(np.float32) * scales[sample_rows, None]
+    norms = np.linalg.norm(sample, axis=1, keepdims=True)
+    sample /= np.where(norms > 0, norms, 1)
+    centroids = train_centroids(sample, nlist, seed=seed)
+    # Hệ số tỉ lệ dương không làm thay đổi centroid gần nhất
+    assign = nearest_centroids(codes, centroids)
+    rows = np.argsort(assign, kind="stable").astype(np.int32)
+    offsets = np.searchsorted(assign[rows], np.arange(len(centroids) + 1)).astype(np.int64)
+    return centroids, offsets, rows
+
+def score_rows(codes: np.ndarray, scales: np.ndarray, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Độ tương đồng cosine giữa vector truy vấn và các hàng `rows` (tất cả các hàng nếu
+    None) của một ma trận đã lượng tử hóa, giải lượng tử hóa theo từng khối nhỏ.
+    """
+    count = len(codes) if rows is None else len(rows)
+    scores = np.empty(count, dtype=np.float32)
+    for start in range(0, count, _BLOCK_SIZE):
+        block_rows = slice(start, min(start + _BLOCK_SIZE, count)) if rows is None else rows[start:start + _BLOCK_SIZE]
+        block = codes[block_rows].astype(np.float32, copy=False)
+        scores[start:start + block.shape[0]] = (block @ query) * scales[block_rows]
+    return scores
@@ -0,0 +1,25 @@
+import time
+import asyncio
+
+from app.services.extraction_pool import extraction_pool
+from app.services.file_processor import preload_loaders
+from app.services.gemini_service import get_model
+from app.services.vector_store import embed_texts
+
+async def warm_up() -> float:
+    """
+    Khởi tạo trước các thành phần được nạp chậm (lazy), để request đầu tiên không
+    phải chờ import các thư viện nặng:
+
+    - Client Gemini (google.generativeai).
+    - Vectorizer (scikit-learn) dùng để vector hóa văn bản.
+    - Các bộ đọc định dạng file (langchain, python-pptx) trong pool trích xuất.
+
+    Returns:
+        float: Thời gian warm-up (giây).
+    """
+    started = time.perf_counter()
+    await asyncio.to_thread(get_model)
+    await asyncio.to_thread(embed_texts, ["warm up"])
+    await extraction_pool.run(preload_loaders)
+    return time.perf_counter() - started
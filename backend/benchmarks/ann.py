@@ -0,0 +1,195 @@
+"""
+Benchmark độ phủ (recall) và độ trễ của tìm kiếm vector xấp xỉ (IVF) so với tìm chính xác.
+
+Với mỗi kiểu lượng tử hóa (`--quantizations`), một chỉ mục (`SegmentIndex`) được tạo với
+một segment chứa `--vectors` vector và chỉ mục IVF; mỗi giá trị `--nprobe` được đo:
+- `recall_at_k`: tỉ lệ top-k của tìm kiếm chính xác (float32, duyệt toàn bộ) có trong top-k
+  trả về.
+- Thời gian truy vấn (trung bình, p50, p95), so với tìm kiếm chính xác trên cùng kho.
+- Dung lượng của segment (vector đã lượng tử hóa và chỉ mục) và thời gian ghi segment.
+
+Nguồn vector (`--source`):
+- `text`: embedding của các chunk văn bản sinh ngẫu nhiên (giống dữ liệu thật, chậm hơn).
+- `synthetic`: vector ngẫu nhiên quanh các cụm, để thử với hàng triệu vector.
+
+Cách dùng (chạy từ thư mục backend):
+    python benchmarks/ann.py --vectors 20000
+    python benchmarks/ann.py --source synthetic --vectors 1000000 --nprobe 4,16,64 --output ann.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+
+from typing import Any, Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import make_text, make_vocabulary  # noqa: E402
+
+def _configure_environment(work_dir: str, nlist: int) -> None:
+    # Cấu hình được đọc khi import `app`; chỉ mục được xây dựng từ UPLOAD_DIR: dùng một thư
+    # mục rỗng. Segment của benchmark luôn có chỉ mục IVF
+    os.environ["UPLOAD_DIR"] = os.path.join(work_dir, "uploads")
+    os.environ["INDEX_DIR"] = os.path.join(work_dir, "index")
+    os.environ["CONTENT_STORE_DIR"] = os.path.join(work_dir, "content_store")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'bench.sqlite')}"
+    os.environ["VECTOR_IVF_MIN_SIZE"] = "1"
+    os.environ["VECTOR_IVF_NLIST"] = str(nlist)
+    os.makedirs(os.environ["UPLOAD_DIR"], exist_ok=True)
+
+def _directory_size(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _dirs, files in os.walk(directory) for name in files)
+
+def text_vectors(count: int, queries: int, seed: int):
+    """
+    Embedding của `count` chunk văn bản và của `queries` câu truy vấn ngắn.
+    """
+    from app.services.chunker import split_into_chunks
+    from app.services.vector_store import embed_texts
+
+    vocabulary = make_vocabulary(seed)
+    chunks: List[str] = []
+    doc = 0
+    while len(chunks) < count:
+        text = make_text(seed * 7_919 + doc, 64 * 1024, vocabulary)
+        chunks.extend(chunk.text for chunk in split_into_chunks(f"doc{doc}", text))
+        doc += 1
+    rng = random.Random(seed)
+    query_texts = [" ".join(rng.choices(vocabulary[:500], k=rng.randint(2, 6))) for _ in range(queries)]
+    return embed_texts(chunks[:count]), embed_texts(query_texts)
+
+def synthetic_vectors(count: int, queries: int, dim: int, seed: int):
+    """
+    `count` vector quanh các cụm ngẫu nhiên (đã chuẩn hóa L2), và `queries` truy vấn lấy
+    từ các vector đó cộng thêm nhiễu.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(16, int(np.sqrt(count))), dim)).astype(np.float32)
+    vectors = np.empty((count, dim), dtype=np.float32)
+    for start in range(0, count, 65536):
+        end = min(count, start + 65536)
+        vectors[start:end] = centers[rng.integers(0, len(centers), end - start)]
+        vectors[start:end] += 0.8 * rng.standard_normal((end - start, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    query_vectors = vectors[rng.integers(0, count, queries)] + 0.05 * rng.standard_normal((queries, dim), dtype=np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return vectors, query_vectors.astype(np.float32)
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    """
+    Kết quả đúng: top-k theo cosine trên vector float32, duyệt toàn bộ.
+    """
+    truth = []
+    for query in queries:
+        scores = vectors @ query
+        top = np.argpartition(-scores, k - 1)[:k]
+        truth.append({int(i) for i in top if scores[i] > 0})
+    return truth
+
+def _latency(timings: List[float]) -> Dict[str, float]:
+    timings = sorted(timings)
+    return {
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "p50_ms": timings[len(timings) // 2] * 1000,
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+    }
+
+def _row(chunk_id: str) -> int:
+    # chunk_id của hàng thứ i trong tài liệu `doc<start>` là `doc<start>#<i>`
+    doc, _, number = chunk_id.rpartition("#")
+    return int(doc[len("doc"):]) + int(number)
+
+def bench_index(directory: str, vectors: np.ndarray, queries: np.ndarray, truth: List[set], quantization: str,
+                nprobes: List[int], k: int, doc_size: int) -> Dict[str, Any]:
+    from app.services.chunker import Chunk, make_chunk_id
+    from app.services.segment_index import SegmentIndex
+
+    index = SegmentIndex(directory, quantization=quantization, max_segments=1)
+    documents = []
+    for start in range(0, len(vectors), doc_size):
+        doc_id = f"doc{start}"
+        rows = vectors[start:start + doc_size]
+        documents.append((doc_id, [Chunk(make_chunk_id(doc_id, i), doc_id, 0, 0) for i in range(len(rows))], rows))
+    started = time.perf_counter()
+    index.add_documents(documents)
+    result: Dict[str, Any] = {
+        "build_s": time.perf_counter() - started,
+        "disk_mb": _directory_size(directory) / (1024 * 1024),
+        "float32_mb": vectors.nbytes / (1024 * 1024),
+    }
+
+    def run(**options) -> Dict[str, Any]:
+        timings, hits, expected = [], 0, 0
+        for query, relevant in zip(queries, truth):
+            started = time.perf_counter()
+            found = index.search_vectors(query, top_k=k, **options)
+            timings.append(time.perf_counter() - started)
+            hits += len(relevant & {_row(chunk_id) for chunk_id, _ in found})
+            expected += len(relevant)
+        return {"recall_at_k": hits / expected if expected else None, **_latency(timings)}
+
+    result["exact"] = run(exact=True)
+    result["ivf"] = {str(nprobe): run(nprobe=nprobe) for nprobe in nprobes}
+    return result
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark IVF vector search recall and latency against exact search")
+    parser.add_argument("--source", choices=("text", "synthetic"), default="text")
+    parser.add_argument("--vectors", type=int, default=20000, help="Number of vectors in the store")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--quantizations", default="float32,float16,int8")
+    parser.add_argument("--nprobe", default="1,4,16,64", help="Comma-separated numbers of lists scanned per query")
+    parser.add_argument("--nlist", type=int, default=0, help="Number of IVF lists (0: about sqrt(vectors))")
+    parser.add_argument("--doc-size", type=int, default=100, help="Vectors added per document")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file (default: stdout)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="rag-ann-")
+    _configure_environment(work_dir, args.nlist)
+    from app.core.config import settings
+
+    started = time.perf_counter()
+    if args.source == "text":
+        vectors, queries = text_vectors(args.vectors, args.queries, args.seed)
+    else:
+        vectors, queries = synthetic_vectors(args.vectors, args.queries, settings.EMBEDDING_DIM, args.seed)
+    generated = time.perf_counter() - started
+    truth = exact_top_k(vectors, queries, args.top_k)
+
+    nprobes = [int(n) for n in args.nprobe.split(",") if n]
+    results = {
+        quantization: bench_index(os.path.join(work_dir, quantization), vectors, queries, truth, quantization,
+                                  nprobes, args.top_k, args.doc_size)
+        for quantization in args.quantizations.split(",") if quantization
+    }
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "cpu_count": os.cpu_count(),
+            "generate_s": generated,
+            "args": {key: value for key, value in vars(args).items() if key != "output"},
+        },
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Đo thời gian khởi động (cold start) của `app.main`.
+
+Chạy `python -X importtime -c "import app.main"` trong một tiến trình mới, sau đó báo cáo:
+- Tổng thời gian import `app.main` và thời gian chạy của cả tiến trình.
+- Các module tốn thời gian nhất (tính cả các module con mà chúng import).
+- Thời gian import theo từng package cấp cao nhất (fastapi, sqlalchemy, numpy, ...).
+
+Với `--budget`, script trả về mã lỗi 1 khi thời gian import vượt quá ngân sách, để
+phát hiện các thay đổi làm chậm việc khởi động worker (ví dụ import thư viện nặng
+ở cấp module thay vì import khi cần).
+
+Cách dùng (chạy từ thư mục backend):
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --top 30 --budget 1.5
+    python benchmarks/cold_start.py --json > cold_start.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure(module: str, runs: int) -> Tuple[List[Tuple[str, int, int]], float]:
+    """
+    Import `module` trong tiến trình mới `runs` lần và giữ lại lần nhanh nhất
+    (ít bị ảnh hưởng bởi cache của hệ điều hành nhất).
+
+    Returns:
+        Tuple: Danh sách (tên module, thời gian riêng µs, thời gian tích lũy µs)
+        và thời gian chạy của tiến trình (giây).
+    """
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+        )
+        wall = time.perf_counter() - started
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+        entries = []
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            entries.append((name.strip(), int(self_us), int(cumulative_us)))
+
+        if best is None or wall < best[1]:
+            best = (entries, wall)
+    return best
+
+def summarize(entries: List[Tuple[str, int, int]], module: str, top: int) -> Dict:
+    total_us = next((cumulative for name, _, cumulative in entries if name == module), 0)
+
+    packages = defaultdict(int)
+    for name, self_us, _ in entries:
+        packages[name.split(".")[0]] += self_us
+
+    slowest = sorted(entries, key=lambda entry: entry[2], reverse=True)[:top]
+    return {
+        "module": module,
+        "import_seconds": total_us / 1e6,
+        "modules_imported": len(entries),
+        "slowest_modules": [
+            {"module": name, "self_ms": self_us / 1000, "cumulative_ms": cumulative_us / 1000}
+            for name, self_us, cumulative_us in slowest
+        ],
+        "packages": [
+            {"package": package, "self_ms": self_us / 1000}
+            for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        ],
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Report per-module import cost of the backend")
+    parser.add_argument("--module", default="app.main", help="Module to import (default: app.main)")
+    parser.add_argument("--top", type=int, default=20, help="Number of modules/packages to show")
+    parser.add_argument("--runs", type=int, default=3, help="Number of fresh processes, the fastest is kept")
+    parser.add_argument("--budget", type=float, default=None, help="Fail if the import takes longer (seconds)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    entries, wall = measure(args.module, args.runs)
+    report = summarize(entries, args.module, args.top)
+    report["process_seconds"] = wall
+    report["budget_seconds"] = args.budget
+    over_budget = args.budget is not None and report["import_seconds"] > args.budget
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import {args.module}: {report['import_seconds']:.3f}s "
+              f"({report['modules_imported']} modules, process {wall:.3f}s)")
+        print("\nSlowest modules (cumulative):")
+        for entry in report["slowest_modules"]:
+            print(f"  {entry['cumulative_ms']:9.1f} ms  {entry['self_ms']:9.1f} ms self  {entry['module']}")
+        print("\nBy top-level package (self):")
+        for entry in report["packages"]:
+            print(f"  {entry['self_ms']:9.1f} ms  {entry['package']}")
+        if args.budget is not None:
+            print(f"\nBudget {args.budget:.3f}s: {'EXCEEDED' if over_budget else 'ok'}")
+
+    return 1 if over_budget else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Sinh bộ dữ liệu (corpus) tổng hợp có tính tất định cho các benchmark.
+
+Với cùng `seed`, định dạng và chỉ số file, nội dung văn bản sinh ra luôn giống nhau,
+nên kết quả benchmark giữa các lần chạy (và giữa các commit) có thể so sánh được.
+Các định dạng được hỗ trợ: pdf, docx, pptx, xlsx, csv, txt.
+
+Cách dùng (chạy từ thư mục backend):
+    python benchmarks/corpus.py /tmp/corpus --formats pdf,docx,txt --count 5 --size-kb 64
+"""
+import os
+import csv
+import random
+import argparse
+
+from typing import Callable, Dict, List
+
+FORMATS = ["pdf", "docx", "pptx", "xlsx", "csv", "txt"]
+
+_SYLLABLES = [
+    "an", "ba", "ca", "da", "em", "go", "ha", "in", "ke", "lo", "ma", "na", "on", "pa",
+    "qua", "ra", "sa", "ta", "uy", "va", "xa", "yen", "tri", "thu", "ngu", "nhan", "kho", "phat",
+]
+
+def make_vocabulary(seed: int, size: int = 5000) -> List[str]:
+    """
+    Tạo bộ từ vựng tất định gồm `size` từ ghép từ các âm tiết.
+    """
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(1, 3))))
+    return sorted(words)
+
+def make_text(seed: int, size_bytes: int, vocabulary: List[str] = None) -> str:
+    """
+    Sinh văn bản khoảng `size_bytes` byte, chia thành các đoạn và câu.
+    Tần suất từ theo phân phối Zipf gần đúng (ít từ phổ biến, nhiều từ hiếm),
+    giống văn bản thật hơn so với chọn từ ngẫu nhiên đều.
+    """
+    vocabulary = vocabulary or make_vocabulary(0)
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    paragraphs, size = [], 0
+    while size < size_bytes:
+        sentences = []
+        for _ in range(rng.randint(3, 8)):
+            words = rng.choices(vocabulary, weights=weights, k=rng.randint(6, 20))
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+def _write_txt(path: str, text: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def _write_csv(path: str, text: str) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "title", "body"])
+        for i, paragraph in enumerate(text.split("\n\n")):
+            writer.writerow([i, paragraph[:40], paragraph])
+
+def _write_docx(path: str, text: str) -> None:
+    from docx import Document
+    document = Document()
+    for paragraph in text.split("\n\n"):
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+def _write_pptx(path: str, text: str) -> None:
+    from pptx import Presentation
+    from pptx.util import Inches
+    presentation = Presentation()
+    layout = presentation.slide_layouts[1]
+    for i, paragraph in enumerate(text.split("\n\n")):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = f"Slide {i + 1}"
+        slide.placeholders[1].text = paragraph
+        # Một bảng nhỏ trên mỗi slide để đo cả phần trích xuất bảng
+        table = slide.shapes.add_table(2, 2, Inches(1), Inches(5), Inches(4), Inches(1)).table
+        words = paragraph.split()
+        for cell, word in zip([c for row in table.rows for c in row.cells], words):
+            cell.text = word
+    presentation.save(path)
+
+def _write_xlsx(path: str, text: str) -> None:
+    from openpyxl import Workbook
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["id", "title", "body"])
+    for i, paragraph in enumerate(text.split("\n\n")):
+        sheet.append([i, paragraph[:40], paragraph])
+    workbook.save(path)
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _write_pdf(path: str, text: str, lines_per_page: int = 50, chars_per_line: int = 90) -> None:
+    # PDF tối giản (font Helvetica chuẩn, không nhúng font), không cần thư viện ngoài
+    lines = []
+    for paragraph in text.split("\n\n"):
+        while paragraph:
+            lines.append(paragraph[:chars_per_line])
+            paragraph = paragraph[chars_per_line:]
+        lines.append("")
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    objects: Dict[int, bytes] = {}
+    page_ids = []
+    font_id = 3
+    objects[font_id] = b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    next_id = 4
+    for page_lines in pages:
+        content = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(f"({_pdf_escape(line)}) '" for line in page_lines) + " ET"
+        content_bytes = content.encode("latin-1", errors="replace")
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(content_bytes) + content_bytes + b"\nendstream"
+        objects[page_id] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (font_id, content_id))
+        page_ids.append(page_id)
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[2] = b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % i for i in page_ids) + b"] /Count %d >>" % len(page_ids)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += b"%d 0 obj\n" % object_id + objects[object_id] + b"\nendobj\n"
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for object_id in sorted(objects):
+        output += b"%010d 00000 n \n" % offsets[object_id]
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    with open(path, "wb") as f:
+        f.write(output)
+
+WRITERS: Dict[str, Callable[[str, str], None]] = {
+    "pdf": _write_pdf,
+    "docx": _write_docx,
+    "pptx": _write_pptx,
+    "xlsx": _write_xlsx,
+    "csv": _write_csv,
+    "txt": _write_txt,
+}
+
+def generate_corpus(out_dir: str, formats: List[str], count: int, size_kb: int, seed: int = 42) -> Dict[str, List[str]]:
+    """
+    Sinh `count` file cho mỗi định dạng trong `formats`, mỗi file khoảng `size_kb` KB văn bản.
+
+    Returns:
+        Dict[str, List[str]]: Đường dẫn các file đã sinh theo từng định dạng.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    vocabulary = make_vocabulary(seed)
+    corpus = {}
+    for fmt in formats:
+        if fmt not in WRITERS:
+            raise ValueError(f"Unsupported format: {fmt}")
+        paths = []
+        for i in range(count):
+            path = os.path.join(out_dir, f"doc_{i:05d}.{fmt}")
+            WRITERS[fmt](path, make_text(seed * 1_000_003 + i, size_kb * 1024, vocabulary))
+            paths.append(path)
+        corpus[fmt] = paths
+    return corpus
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic multi-format corpus")
+    parser.add_argument("out_dir", help="Output directory")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="Comma-separated formats")
+    parser.add_argument("--count", type=int, default=3, help="Files per format")
+    parser.add_argument("--size-kb", type=int, default=32, help="Approximate text size per file (KB)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.out_dir, args.formats.split(","), args.count, args.size_kb, args.seed)
+    for fmt, paths in corpus.items():
+        size = sum(os.path.getsize(path) for path in paths)
+        print(f"{fmt}: {len(paths)} files, {size / 1024:.1f} KB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Kiểm thử tải đầu-cuối cho `/chat` (WebSocket và HTTP) và `/gemini`.
+
+Mở `--sessions` phiên đồng thời (tăng dần trong `--ramp` giây), mỗi phiên gửi
+`--messages` tin nhắn, rồi báo cáo:
+- Thông lượng (tin nhắn hoàn tất mỗi giây).
+- Độ trễ p50/p95/p99 tới đoạn trả lời đầu tiên (WebSocket) và tới khi hoàn tất.
+- Tỉ lệ lỗi kết nối và lỗi tin nhắn, kèm các loại lỗi thường gặp.
+
+Để không gọi Gemini thật, chạy server với mô hình giả lập hoặc phát lại (tất cả các phiên
+đến từ cùng một địa chỉ, nên cần tắt giới hạn tốc độ Gemini theo client):
+    GEMINI_BACKEND=fake GEMINI_FAKE_LATENCY_MS=300 GEMINI_CLIENT_RATE_LIMIT=0 uvicorn app.main:app --workers 1
+    GEMINI_BACKEND=record uvicorn app.main:app   # ghi phản hồi thật một lần
+    GEMINI_BACKEND=replay uvicorn app.main:app   # phát lại tất định
+
+`/chat` chỉ gọi Gemini khi tìm thấy ngữ cảnh, nên dùng `--seed-docs` để upload trước
+một vài tài liệu tổng hợp.
+
+Cách dùng (chạy từ thư mục backend):
+    python benchmarks/load_ws.py --sessions 2000 --messages 5 --ramp 20 --seed-docs 5
+    python benchmarks/load_ws.py --sessions 200 --messages 8 --pipeline 4
+    python benchmarks/load_ws.py --sessions 10000 --messages 1 --ramp 60 --idle 120
+    python benchmarks/load_ws.py --mode chat --sessions 200 --json > load.json
+    python benchmarks/load_ws.py --mode gemini --sessions 200
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import urllib.request
+
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import make_text, make_vocabulary  # noqa: E402
+
+class Stats:
+    def __init__(self):
+        self.connect_latencies: List[float] = []
+        self.first_chunk_latencies: List[float] = []
+        self.latencies: List[float] = []
+        self.connect_errors = 0
+        self.completed = 0
+        self.errors = 0
+        self.error_types: Counter = Counter()
+        self.active = 0
+        self.peak_active = 0
+
+    def error(self, kind: str) -> None:
+        self.errors += 1
+        self.error_types[kind] += 1
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000 if values else None,
+        "p50_ms": percentile(values, 50) * 1000 if values else None,
+        "p95_ms": percentile(values, 95) * 1000 if values else None,
+        "p99_ms": percentile(values, 99) * 1000 if values else None,
+        "max_ms": max(values) * 1000 if values else None,
+    }
+
+def raise_fd_limit() -> None:
+    # Mỗi phiên WebSocket dùng một file descriptor
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+def make_messages(count: int, seed: int) -> List[str]:
+    vocabulary = make_vocabulary(seed)
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(vocabulary[:300], k=rng.randint(3, 8))) for _ in range(count)]
+
+def seed_documents(http_url: str, count: int, seed: int, timeout: float = 120) -> None:
+    """
+    Upload `count` tài liệu văn bản tổng hợp và chờ chúng được xử lý xong.
+    """
+    vocabulary = make_vocabulary(seed)
+    job_ids = []
+    for i in range(count):
+        boundary = uuid.uuid4().hex
+        content = make_text(seed + i, 16 * 1024, vocabulary).encode("utf-8")
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"loadtest_{i:04d}.txt\"\r\n"
+            f"Content-Type: text/plain\r\n\r\n"
+        ).encode("utf-8") + content + f"\r\n--{boundary}--\r\n".encode("utf-8")
+        request = urllib.request.Request(f"{http_url}/upload", data=body, method="POST",
+                                         headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+        with urllib.request.urlopen(request) as response:
+            job_ids.append(json.loads(response.read())["job_id"])
+
+    deadline = time.time() + timeout
+    for job_id in job_ids:
+        while True:
+            with urllib.request.urlopen(f"{http_url}/jobs/{job_id}") as response:
+                status = json.loads(response.read())["status"]
+            if status in ("done", "failed"):
+                break
+            if time.time() > deadline:
+                raise TimeoutError(f"Seed document job {job_id} did not finish")
+            time.sleep(0.5)
+
+async def ws_session(url: str, messages: List[str], args, stats: Stats) -> None:
+    import websockets
+
+    started = time.perf_counter()
+    try:
+        connection = await asyncio.wait_for(websockets.connect(url, max_size=None, open_timeout=args.timeout),
+                                            timeout=args.timeout)
+    except Exception as e:
+        stats.connect_errors += 1
+        stats.error_types[f"connect:{type(e).__name__}"] += 1
+        return
+    stats.connect_latencies.append(time.perf_counter() - started)
+    stats.active += 1
+    stats.peak_active = max(stats.peak_active, stats.active)
+
+    # Mã tin nhắn -> [thời điểm gửi, độ trễ tới đoạn đầu tiên, future hoàn tất]
+    pending: Dict[str, list] = {}
+
+    async def read_frames() -> None:
+        try:
+            async for raw in connection:
+                frame = json.loads(raw)
+                frame_type = frame.get("type")
+                if frame_type == "ping":
+                    await connection.send(json.dumps({"type": "pong"}))
+                    continue
+                entry = pending.get(frame.get("id"))
+                if entry is None:
+                    if frame_type is None:
+                        # Phản hồi không theo dạng stream (ví dụ "Message too large")
+                        stats.error("unexpected_frame")
+                    continue
+                sent, first_chunk, done = entry
+                if frame_type == "delta" and first_chunk is None:
+                    entry[1] = time.perf_counter() - sent
+                elif frame_type in ("done", "error") and not done.done():
+                    done.set_result(frame_type)
+        except Exception as e:
+            for _, _, done in pending.values():
+                if not done.done():
+                    done.set_exception(e)
+
+    reader = asyncio.create_task(read_frames())
+    pipeline = asyncio.Semaphore(max(1, args.pipeline))
+
+    async def send_message(index: int, text: str) -> None:
+        async with pipeline:
+            message_id = str(index)
+            done = asyncio.get_running_loop().create_future()
+            pending[message_id] = [time.perf_counter(), None, done]
+            try:
+                await connection.send(json.dumps({"text": text, "id": message_id}))
+                outcome = await asyncio.wait_for(done, timeout=args.timeout)
+                sent, first_chunk, _ = pending[message_id]
+                if outcome == "done":
+                    elapsed = time.perf_counter() - sent
+                    stats.first_chunk_latencies.append(first_chunk if first_chunk is not None else elapsed)
+                    stats.latencies.append(elapsed)
+                    stats.completed += 1
+                else:
+                    stats.error("server_error")
+            except asyncio.TimeoutError:
+                stats.error("timeout")
+            except Exception as e:
+                stats.error(type(e).__name__)
+            finally:
+                pending.pop(message_id, None)
+            if args.think_time:
+                await asyncio.sleep(random.uniform(0, 2 * args.think_time))
+
+    try:
+        await asyncio.gather(*(send_message(i, text) for i, text in enumerate(messages)))
+        if args.idle:
+            # Giữ phiên mở (và trả lời heartbeat) để đo chi phí của các kết nối nhàn rỗi
+            await asyncio.sleep(args.idle)
+    finally:
+        stats.active -= 1
+        reader.cancel()
+        try:
+            await connection.close()
+        except Exception:
+            pass
+
+async def http_session(client, http_url: str, messages: List[str], args, stats: Stats) -> None:
+    stats.active += 1
+    stats.peak_active = max(stats.peak_active, stats.active)
+    try:
+        for text in messages:
+            sent = time.perf_counter()
+            try:
+                if args.mode == "chat":
+                    response = await client.post(f"{http_url}/chat", json={"text": text}, timeout=args.timeout)
+                else:
+                    response = await client.get(f"{http_url}/gemini", params={"prompt": text}, timeout=args.timeout)
+                if response.status_code == 200:
+                    elapsed = time.perf_counter() - sent
+                    stats.latencies.append(elapsed)
+                    stats.completed += 1
+                else:
+                    stats.error(f"http_{response.status_code}")
+            except Exception as e:
+                stats.error(type(e).__name__)
+            if args.think_time:
+                await asyncio.sleep(random.uniform(0, 2 * args.think_time))
+    finally:
+        stats.active -= 1
+
+async def run(args) -> Dict[str, Any]:
+    stats = Stats()
+    prompts = make_messages(max(1, args.distinct_messages), args.seed)
+    rng = random.Random(args.seed)
+    sessions = [[rng.choice(prompts) for _ in range(args.messages)] for _ in range(args.sessions)]
+
+    client = None
+    if args.mode != "ws":
+        try:
+            import httpx
+        except ImportError:
+            raise SystemExit("HTTP modes need httpx: pip install httpx")
+        client = httpx.AsyncClient(limits=httpx.Limits(max_connections=args.sessions, max_keepalive_connections=args.sessions))
+
+    async def start_session(index: int, messages: List[str]) -> None:
+        # Tăng dần số phiên trong khoảng thời gian ramp-up
+        if args.ramp:
+            await asyncio.sleep(args.ramp * index / args.sessions)
+        if args.mode == "ws":
+            await ws_session(args.ws_url, messages, args, stats)
+        else:
+            await http_session(client, args.http_url, messages, args, stats)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(start_session(i, messages) for i, messages in enumerate(sessions)))
+    duration = time.perf_counter() - started
+    if client is not None:
+        await client.aclose()
+
+    attempted = stats.completed + stats.errors
+    return {
+        "mode": args.mode,
+        "sessions": args.sessions,
+        "messages_per_session": args.messages,
+        "duration_s": duration,
+        "peak_concurrent_sessions": stats.peak_active,
+        "connect_errors": stats.connect_errors,
+        "connect_error_rate": stats.connect_errors / args.sessions if args.sessions else 0.0,
+        "messages_completed": stats.completed,
+        "message_errors": stats.errors,
+        "message_error_rate": stats.errors / attempted if attempted else 0.0,
+        "throughput_msgs_per_s": stats.completed / duration if duration else None,
+        "connect_latency": summarize(stats.connect_latencies),
+        "first_chunk_latency": summarize(stats.first_chunk_latencies),
+        "latency": summarize(stats.latencies),
+        "error_types": dict(stats.error_types.most_common(10)),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test the chat WebSocket, /chat and /gemini endpoints")
+    parser.add_argument("--mode", choices=["ws", "chat", "gemini"], default="ws")
+    parser.add_argument("--host", default="localhost:8000", help="Server host:port")
+    parser.add_argument("--prefix", default="/api/v1")
+    parser.add_argument("--sessions", type=int, default=1000, help="Concurrent sessions")
+    parser.add_argument("--messages", type=int, default=5, help="Messages per session")
+    parser.add_argument("--distinct-messages", type=int, default=50, help="Number of distinct prompts")
+    parser.add_argument("--ramp", type=float, default=10.0, help="Seconds over which sessions are started")
+    parser.add_argument("--pipeline", type=int, default=1,
+                        help="Messages in flight at once per WebSocket session")
+    parser.add_argument("--idle", type=float, default=0.0,
+                        help="Keep each WebSocket session open this many seconds after its messages")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean pause between messages (seconds)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-message timeout (seconds)")
+    parser.add_argument("--seed-docs", type=int, default=0, help="Upload this many synthetic documents first")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    args.http_url = f"http://{args.host}{args.prefix}"
+    args.ws_url = f"ws://{args.host}{args.prefix}/chat"
+    raise_fd_limit()
+    if args.seed_docs:
+        seed_documents(args.http_url, args.seed_docs, args.seed)
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{report['mode']}: {report['sessions']} sessions x {report['messages_per_session']} messages "
+          f"in {report['duration_s']:.1f}s (peak {report['peak_concurrent_sessions']} concurrent)")
+    print(f"throughput: {report['throughput_msgs_per_s']:.1f} msg/s, "
+          f"errors: {report['message_error_rate']:.2%} messages, {report['connect_error_rate']:.2%} connects")
+    for name in ("connect_latency", "first_chunk_latency", "latency"):
+        summary = report[name]
+        if summary["count"]:
+            print(f"{name:>20}: p50 {summary['p50_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms, "
+                  f"p99 {summary['p99_ms']:.1f} ms (n={summary['count']})")
+    if report["error_types"]:
+        print(f"error types: {report['error_types']}")
+
+if __name__ == "__main__":
+    main()
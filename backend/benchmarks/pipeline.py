@@ -0,0 +1,293 @@
+"""
+Benchmark các bước của pipeline xử lý tài liệu và truy xuất ngữ cảnh.
+
+Các bước được đo:
+- `process_file.<định dạng>`: trích xuất văn bản (`extract_text`, chạy trực tiếp trong
+  tiến trình hiện tại để không tính chi phí của pool trích xuất) cho từng định dạng.
+- `extract_text_from_pptx`: trích xuất văn bản từ PowerPoint.
+- `vectorize`: vector hóa các chunk (`embed_texts`).
+- `index_document`: lưu và đánh chỉ mục một tài liệu.
+- `find_relevant_context.<n>docs`: truy xuất ngữ cảnh khi có `n` tài liệu trong chỉ mục.
+- `list_files.<n>docs`: lấy trang đầu và một trang ở sâu khi danh mục có `n` tài liệu.
+
+Mỗi bước được chạy `--repeat` lần để đo thời gian (trung bình, p50, p95, thông lượng),
+sau đó chạy thêm một lần dưới `tracemalloc` để đo bộ nhớ cấp phát tối đa.
+
+Kết quả được ghi ra JSON. Với `--baseline`, mỗi bước được so sánh với kết quả đã lưu
+(chênh lệch thời gian và bộ nhớ theo %); `--max-regression` làm script trả về mã lỗi 1
+khi một bước chậm hơn baseline quá ngưỡng.
+
+Cách dùng (chạy từ thư mục backend):
+    python benchmarks/pipeline.py --output bench.json
+    python benchmarks/pipeline.py --save-baseline benchmarks/baseline.json
+    python benchmarks/pipeline.py --baseline benchmarks/baseline.json --max-regression 20
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+
+from typing import Any, Callable, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import FORMATS, generate_corpus, make_text, make_vocabulary  # noqa: E402
+
+def _configure_environment(work_dir: str) -> None:
+    # Cấu hình được đọc khi import `app`, nên phải đặt biến môi trường trước
+    os.environ["UPLOAD_DIR"] = os.path.join(work_dir, "uploads")
+    os.environ["INDEX_DIR"] = os.path.join(work_dir, "index")
+    os.environ["CONTENT_STORE_DIR"] = os.path.join(work_dir, "content_store")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'bench.sqlite')}"
+    os.makedirs(os.environ["UPLOAD_DIR"], exist_ok=True)
+
+def measure(fn: Callable[[], Any], repeat: int, items: int = 1, size_bytes: int = 0) -> Dict[str, Any]:
+    """
+    Đo thời gian chạy `fn` (`repeat` lần) và bộ nhớ cấp phát tối đa (một lần, dưới tracemalloc).
+
+    Args:
+        fn (Callable): Hàm cần đo, không có tham số.
+        repeat (int): Số lần chạy để đo thời gian.
+        items (int): Số phần tử được xử lý trong một lần chạy (để tính thông lượng).
+        size_bytes (int): Số byte được xử lý trong một lần chạy (để tính MB/s).
+    """
+    fn()  # Chạy thử một lần (nạp thư viện, làm nóng cache)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    mean = statistics.fmean(timings)
+    result = {
+        "runs": repeat,
+        "mean_s": mean,
+        "p50_s": timings[len(timings) // 2],
+        "p95_s": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "min_s": timings[0],
+        "items_per_s": items / mean if mean else None,
+        "peak_mem_mb": peak / (1024 * 1024),
+    }
+    if size_bytes:
+        result["mb_per_s"] = size_bytes / (1024 * 1024) / mean if mean else None
+    return result
+
+def bench_extraction(corpus: Dict[str, List[str]], repeat: int) -> Dict[str, Any]:
+    from app.services.file_processor import extract_text, extract_text_from_pptx
+
+    results = {}
+    for fmt, paths in corpus.items():
+        size = sum(os.path.getsize(path) for path in paths)
+        try:
+            results[f"process_file.{fmt}"] = measure(
+                lambda: [extract_text(path, fmt) for path in paths], repeat, len(paths), size)
+        except Exception as e:
+            # Ví dụ thiếu thư viện đọc định dạng (unstructured cho xlsx)
+            results[f"process_file.{fmt}"] = {"error": str(e)}
+
+    if corpus.get("pptx"):
+        paths = corpus["pptx"]
+        size = sum(os.path.getsize(path) for path in paths)
+        results["extract_text_from_pptx"] = measure(
+            lambda: [extract_text_from_pptx(path) for path in paths], repeat, len(paths), size)
+    return results
+
+def bench_vectorize(texts: List[str], repeat: int) -> Dict[str, Any]:
+    from app.services.chunker import split_into_chunks
+    from app.services.vector_store import embed_texts
+
+    chunks = [chunk.text for i, text in enumerate(texts) for chunk in split_into_chunks(f"doc{i}", text)]
+    size = sum(len(chunk.encode("utf-8")) for chunk in chunks)
+    return {"vectorize": measure(lambda: embed_texts(chunks), repeat, len(chunks), size)}
+
+def bench_retrieval(corpus_sizes: List[int], size_kb: int, queries: int, repeat: int, seed: int) -> Dict[str, Any]:
+    from app.services.chat_service import find_relevant_context
+    from app.services.indexing_service import index_document
+
+    vocabulary = make_vocabulary(seed)
+    rng = random.Random(seed)
+    query_texts = [" ".join(rng.choices(vocabulary[:500], k=rng.randint(2, 6))) for _ in range(queries)]
+
+    results = {}
+    loop = asyncio.new_event_loop()
+    indexed = 0
+    index_timings = []
+    for target in sorted(corpus_sizes):
+        # Thêm tài liệu cho tới khi chỉ mục có `target` tài liệu
+        while indexed < target:
+            text = make_text(seed * 7_919 + indexed, size_kb * 1024, vocabulary)
+            doc_id = f"bench_{indexed:06d}.txt"
+            with open(os.path.join(os.environ["UPLOAD_DIR"], doc_id), "w", encoding="utf-8") as f:
+                f.write(text)
+            started = time.perf_counter()
+            loop.run_until_complete(index_document(doc_id, text))
+            index_timings.append(time.perf_counter() - started)
+            indexed += 1
+
+        results[f"find_relevant_context.{target}docs"] = measure(
+            lambda: [loop.run_until_complete(find_relevant_context(query)) for query in query_texts],
+            repeat, len(query_texts))
+
+    if index_timings:
+        mean = statistics.fmean(index_timings)
+        results["index_document"] = {
+            "runs": len(index_timings),
+            "mean_s": mean,
+            "p50_s": statistics.median(index_timings),
+            "items_per_s": 1 / mean if mean else None,
+            "mb_per_s": size_kb / 1024 / mean if mean else None,
+        }
+    loop.close()
+    return results
+
+def bench_list_files(catalog_sizes: List[int], repeat: int) -> Dict[str, Any]:
+    from app.api.endpoints.files import list_files
+    from app.core.database import SessionLocal, init_db
+    from app.models.document import Document
+
+    init_db()
+    results = {}
+    loop = asyncio.new_event_loop()
+    inserted = 0
+
+    def list_page(cursor: Optional[str] = None):
+        return loop.run_until_complete(list_files(limit=50, cursor=cursor, status="ready", q=None,
+                                                  uploaded_after=None, uploaded_before=None))
+
+    for target in sorted(catalog_sizes):
+        with SessionLocal() as session:
+            now = time.time()
+            session.add_all([
+                Document(filename=f"catalog_{i:07d}.pdf", size=1024 + i, sha256=None, uploaded_at=now - i,
+                         status="ready", chunk_count=5, updated_at=now)
+                for i in range(inserted, target)
+            ])
+            session.commit()
+        inserted = target
+
+        # Con trỏ tới khoảng giữa danh mục để đo một trang ở sâu
+        page = list_page()
+        for _ in range(min(20, target // 100)):
+            if page.next_cursor is None:
+                break
+            page = list_page(page.next_cursor)
+        deep_cursor = page.next_cursor
+
+        results[f"list_files.{target}docs"] = measure(lambda: list_page(), repeat)
+        if deep_cursor:
+            results[f"list_files.{target}docs.deep_page"] = measure(lambda: list_page(deep_cursor), repeat)
+    loop.close()
+    return results
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    So sánh kết quả với baseline: chênh lệch (%) của thời gian trung bình và bộ nhớ tối đa.
+    Giá trị dương nghĩa là chậm hơn / tốn bộ nhớ hơn baseline.
+    """
+    comparison = {}
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or "mean_s" not in current or "mean_s" not in previous:
+            continue
+        entry = {
+            "baseline_mean_s": previous["mean_s"],
+            "mean_s": current["mean_s"],
+            "time_delta_pct": (current["mean_s"] - previous["mean_s"]) / previous["mean_s"] * 100 if previous["mean_s"] else None,
+        }
+        if current.get("peak_mem_mb") is not None and previous.get("peak_mem_mb"):
+            entry["mem_delta_pct"] = (current["peak_mem_mb"] - previous["peak_mem_mb"]) / previous["peak_mem_mb"] * 100
+        comparison[name] = entry
+    return comparison
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ingestion and retrieval pipeline stages")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="Comma-separated formats to extract")
+    parser.add_argument("--docs-per-format", type=int, default=3)
+    parser.add_argument("--size-kb", type=int, default=32, help="Approximate text size per document (KB)")
+    parser.add_argument("--corpus-sizes", default="10,100,500", help="Document counts for retrieval benchmarks")
+    parser.add_argument("--catalog-sizes", default="100,1000,10000", help="Document counts for list_files benchmarks")
+    parser.add_argument("--queries", type=int, default=20, help="Queries per retrieval run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", default=None, help="Comma-separated stages: extraction,vectorize,retrieval,list_files")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="Compare against this stored report")
+    parser.add_argument("--save-baseline", default=None, help="Also store the results as a new baseline")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="Fail if a stage is slower than the baseline by more than this percentage")
+    parser.add_argument("--work-dir", default=None, help="Working directory (default: a temporary directory)")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="rag-bench-")
+    _configure_environment(work_dir)
+    stages = set(args.only.split(",")) if args.only else {"extraction", "vectorize", "retrieval", "list_files"}
+
+    results: Dict[str, Any] = {}
+    formats = [fmt for fmt in args.formats.split(",") if fmt]
+    if "extraction" in stages or "vectorize" in stages:
+        corpus = generate_corpus(os.path.join(work_dir, "corpus"), formats, args.docs_per_format, args.size_kb, args.seed)
+    if "extraction" in stages:
+        results.update(bench_extraction(corpus, args.repeat))
+    if "vectorize" in stages:
+        vocabulary = make_vocabulary(args.seed)
+        texts = [make_text(args.seed + i, args.size_kb * 1024, vocabulary) for i in range(args.docs_per_format * len(formats))]
+        results.update(bench_vectorize(texts, args.repeat))
+    if "retrieval" in stages:
+        corpus_sizes = [int(n) for n in args.corpus_sizes.split(",")]
+        results.update(bench_retrieval(corpus_sizes, args.size_kb, args.queries, args.repeat, args.seed))
+    if "list_files" in stages:
+        catalog_sizes = [int(n) for n in args.catalog_sizes.split(",")]
+        results.update(bench_list_files(catalog_sizes, args.repeat))
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "save_baseline")},
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(results, json.load(f)["results"])
+        if args.max_regression is not None:
+            regressions = [name for name, entry in report["comparison"].items()
+                           if entry["time_delta_pct"] is not None and entry["time_delta_pct"] > args.max_regression]
+            report["regressions"] = regressions
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(output)
+
+    for name in regressions:
+        print(f"Regression: {name} is {report['comparison'][name]['time_delta_pct']:.1f}% slower than baseline",
+              file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services import gemini_service
+from app.services.resilience import CircuitBreaker
+
+class UpstreamError(Exception):
+    code = 503
+
+class Chunk:
+    def __init__(self, text: str):
+        self.text = text
+
+class StubModel:
+    """
+    Mô hình giả lập trả lỗi 503 khi `failing` là True.
+    """
+
+    def __init__(self):
+        self.failing = True
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, stream=False):
+        self.calls += 1
+        if self.failing:
+            raise UpstreamError("Service Unavailable")
+        if stream:
+            return self._stream()
+        return Chunk("ok")
+
+    async def _stream(self):
+        yield Chunk("o")
+        yield Chunk("k")
+
+async def _call(mode: str) -> str:
+    if mode == "unary":
+        return await gemini_service._generate("prompt", 5, None, None)
+    return "".join([chunk async for chunk in gemini_service._generate_stream("prompt", 5, None, None)])
+
+@pytest.mark.parametrize("mode", ["unary", "stream"])
+def test_breaker_recovers_after_failed_probe(monkeypatch, mode):
+    """
+    Request thử (half_open) bị lỗi tạm thời mở lại mạch, và mạch đóng lại khi Gemini hoạt
+    động trở lại.
+    """
+    model = StubModel()
+    breaker = CircuitBreaker("gemini", failure_threshold=1, reset_timeout=0.2)
+    monkeypatch.setattr(gemini_service, "_model", model)
+    monkeypatch.setattr(gemini_service, "breaker", breaker)
+    monkeypatch.setattr(settings, "GEMINI_RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(settings, "GEMINI_RETRY_MAX_DELAY", 0.01)
+
+    async def scenario():
+        with pytest.raises(Exception, match="Service Unavailable"):
+            await _call(mode)
+        assert breaker.state == breaker.OPEN
+
+        # Request thử bị lỗi: không thử lại, mạch mở lại
+        await asyncio.sleep(0.25)
+        calls = model.calls
+        with pytest.raises(Exception, match="Service Unavailable"):
+            await _call(mode)
+        assert model.calls == calls + 1
+        assert breaker.state == breaker.OPEN
+        assert not breaker._probing
+
+        # Gemini hoạt động trở lại: request thử tiếp theo đóng mạch
+        model.failing = False
+        await asyncio.sleep(0.25)
+        assert await _call(mode) == "ok"
+        assert breaker.state == breaker.CLOSED
+        assert await _call(mode) == "ok"
+
+    asyncio.run(scenario())
@@ -1,191 +1,220 @@
-import { useState, useRef, useEffect, useCallback } from "react";
-import {
-  Box,
-  VStack,
-  Input,
-  Button,
-  Text,
-  HStack,
-  Flex,
-  useToast,
-} from "@chakra-ui/react";
-
-import useWebSocket, { ReadyState } from "react-use-websocket";
-
-const SOCKET_URL = process.env.REACT_APP_SOCKET_URL || "ws://localhost:8000/api/v1/chat";
-
-interface Message {
-  text: string;
-  isUser: boolean;
-}
-
-const Chat = () => {
-  const [messages, setMessages] = useState<Message[]>([]);
-  const [input, setInput] = useState("");
-  const messagesEndRef = useRef<HTMLDivElement>(null);
-  const toast = useToast();
-
-  const { sendMessage, lastMessage, readyState } = useWebSocket(SOCKET_URL, {
-    onOpen: () => {
-      toast({
-        title: "Connected",
-        status: "success",
-        duration: 2000,
-      });
-    },
-    onError: () => {
-      toast({
-        title: "Connection failed",
-        status: "error",
-        duration: 2000,
-      });
-    },
-    //Tự động kết nối lại khi mất kết nối
-    shouldReconnect: () => true,
-  });
-
-  const scrollToBottom = () => {
-    messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
-  };
-
-  useEffect(() => {
-    if (lastMessage !== null) {
-      try {
-        const data = JSON.parse(lastMessage.data);
-        const botMessage: Message = {
-          text: data.response,
-          isUser: false,
-        };
-        setMessages((prev) => [...prev, botMessage]);
-      } catch (err) {
-        console.error("Failed to parse message:", err);
-      }
-    }
-  }, [lastMessage]);
-
-  useEffect(() => {
-    scrollToBottom();
-  }, [messages]);
-
-  const handleSend = useCallback(() => {
-    if (!input.trim()) return;
-    if (readyState !== ReadyState.OPEN) {
-      toast({
-        title: "Connection not ready",
-        status: "warning",
-        duration: 2000,
-      });
-      return;
-    }
-
-    const userMessage: Message = {
-      text: input,
-      isUser: true,
-    };
-
-    setMessages((prev) => [...prev, userMessage]);
-
-    // Gửi tin nhắn dưới dạng JSON string
-    sendMessage(JSON.stringify({ text: input }));
-    setInput("");
-  }, [input, sendMessage, readyState, toast]);
-
-  // Hiển thị trạng thái kết nối
-  const connectionStatus = {
-    [ReadyState.CONNECTING]: "Connecting",
-    [ReadyState.OPEN]: "Connected",
-    [ReadyState.CLOSING]: "Closing",
-    [ReadyState.CLOSED]: "Closed",
-    [ReadyState.UNINSTANTIATED]: "Uninstantiated",
-  }[readyState];
-
-  return (
-    <VStack spacing={4} align="stretch">
-      <Text
-        fontSize="sm"
-        color={readyState === ReadyState.OPEN ? "green.500" : "red.500"}
-      >
-        Status: {connectionStatus}
-      </Text>
-      <Box
-        p={4}
-        borderWidth={1}
-        borderRadius="lg"
-        bg="white"
-        height="60vh"
-        overflowY="auto"
-      >
-        <VStack spacing={4} align="stretch">
-          {messages.map((message, index) => (
-            <Flex
-              key={`${message.text}-${index}`}
-              justify={message.isUser ? "flex-end" : "flex-start"}
-            >
-              <Box
-                bg={message.isUser ? "blue.500" : "gray.100"}
-                color={message.isUser ? "white" : "black"}
-                p={3}
-                borderRadius="lg"
-                maxW="80%"
-                position="relative"
-                _after={
-                  message.isUser
-                    ? {
-                        content: '""',
-                        position: "absolute",
-                        right: "-8px",
-                        top: "50%",
-                        transform: "translateY(-50%)",
-                        border: "8px solid transparent",
-                        borderLeftColor: "blue.500",
-                      }
-                    : undefined
-                }
-                _before={
-                  !message.isUser
-                    ? {
-                        content: '""',
-                        position: "absolute",
-                        left: "-8px",
-                        top: "50%",
-                        transform: "translateY(-50%)",
-                        border: "8px solid transparent",
-                        borderRightColor: "gray.100",
-                      }
-                    : undefined
-                }
-              >
-                <Text>{message.text}</Text>
-              </Box>
-            </Flex>
-          ))}
-          <div ref={messagesEndRef} />
-        </VStack>
-      </Box>
-      <HStack>
-        <Input
-          value={input}
-          onChange={(e) => setInput(e.target.value)}
-          placeholder="Type your message..."
-          onKeyDown={(e) => {
-            if (e.key === "Enter") {
-              handleSend();
-            }
-          }}
-          isDisabled={readyState !== ReadyState.OPEN}
-          aria-label="Message input"
-        />
-        <Button
-          colorScheme="blue"
-          onClick={handleSend}
-          isDisabled={readyState !== ReadyState.OPEN}
-          aria-label="Send message"
-        >
-          Send
-        </Button>
-      </HStack>
-    </VStack>
-  );
-};
-
-export default Chat;
+import { useState, useRef, useEffect, useCallback } from "react";
+import {
+  Box,
+  VStack,
+  Input,
+  Button,
+  Text,
+  HStack,
+  Flex,
+  useToast,
+} from "@chakra-ui/react";
+
+import useWebSocket, { ReadyState } from "react-use-websocket";
+
+const SOCKET_URL = process.env.REACT_APP_SOCKET_URL || "ws://localhost:8000/api/v1/chat";
+
+interface Message {
+  text: string;
+  isUser: boolean;
+  streaming?: boolean;
+  // Mã tin nhắn mà câu trả lời thuộc về (frame từ server mang cùng mã)
+  id?: string;
+}
+
+const Chat = () => {
+  const [messages, setMessages] = useState<Message[]>([]);
+  const [input, setInput] = useState("");
+  const messagesEndRef = useRef<HTMLDivElement>(null);
+  const nextMessageId = useRef(0);
+  const toast = useToast();
+
+  const { sendMessage, lastMessage, readyState } = useWebSocket(SOCKET_URL, {
+    onOpen: () => {
+      toast({
+        title: "Connected",
+        status: "success",
+        duration: 2000,
+      });
+    },
+    onError: () => {
+      toast({
+        title: "Connection failed",
+        status: "error",
+        duration: 2000,
+      });
+    },
+    //Tự động kết nối lại khi mất kết nối
+    shouldReconnect: () => true,
+  });
+
+  const scrollToBottom = () => {
+    messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
+  };
+
+  useEffect(() => {
+    if (lastMessage !== null) {
+      try {
+        const data = JSON.parse(lastMessage.data);
+
+        // Heartbeat: trả lời "ping" của server để kết nối không bị đóng
+        if (data.type === "ping") {
+          sendMessage(JSON.stringify({ type: "pong" }));
+          return;
+        }
+        if (data.type === "pong") return;
+
+        setMessages((prev) => {
+          // Câu trả lời đang stream của cùng tin nhắn (các câu trả lời có thể xen kẽ nhau)
+          const index = prev.findIndex((m) => !m.isUser && m.streaming && m.id === data.id);
+          const current = index >= 0 ? prev[index] : undefined;
+          const replace = (message: Message) => [...prev.slice(0, index), message, ...prev.slice(index + 1)];
+
+          // Frame "delta": nối tiếp đoạn câu trả lời vào tin nhắn đang stream
+          if (data.type === "delta") {
+            if (current) {
+              return replace({ ...current, text: current.text + data.response });
+            }
+            return [...prev, { text: data.response, isUser: false, streaming: true, id: data.id }];
+          }
+
+          // Frame "done" (hoặc "error"): câu trả lời đã kết thúc
+          if (current) {
+            return replace({ text: data.response, isUser: false, id: data.id });
+          }
+
+          return [...prev, { text: data.response, isUser: false, id: data.id }];
+        });
+      } catch (err) {
+        console.error("Failed to parse message:", err);
+      }
+    }
+  }, [lastMessage, sendMessage]);
+
+  useEffect(() => {
+    scrollToBottom();
+  }, [messages]);
+
+  const handleSend = useCallback(() => {
+    if (!input.trim()) return;
+    if (readyState !== ReadyState.OPEN) {
+      toast({
+        title: "Connection not ready",
+        status: "warning",
+        duration: 2000,
+      });
+      return;
+    }
+
+    const userMessage: Message = {
+      text: input,
+      isUser: true,
+    };
+
+    setMessages((prev) => [...prev, userMessage]);
+
+    // Gửi tin nhắn dưới dạng JSON string, kèm mã để nhận đúng câu trả lời
+    nextMessageId.current += 1;
+    sendMessage(JSON.stringify({ text: input, id: String(nextMessageId.current) }));
+    setInput("");
+  }, [input, sendMessage, readyState, toast]);
+
+  // Hiển thị trạng thái kết nối
+  const connectionStatus = {
+    [ReadyState.CONNECTING]: "Connecting",
+    [ReadyState.OPEN]: "Connected",
+    [ReadyState.CLOSING]: "Closing",
+    [ReadyState.CLOSED]: "Closed",
+    [ReadyState.UNINSTANTIATED]: "Uninstantiated",
+  }[readyState];
+
+  return (
+    <VStack spacing={4} align="stretch">
+      <Text
+        fontSize="sm"
+        color={readyState === ReadyState.OPEN ? "green.500" : "red.500"}
+      >
+        Status: {connectionStatus}
+      </Text>
+      <Box
+        p={4}
+        borderWidth={1}
+        borderRadius="lg"
+        bg="white"
+        height="60vh"
+        overflowY="auto"
+      >
+        <VStack spacing={4} align="stretch">
+          {messages.map((message, index) => (
+            <Flex
+              key={`${message.text}-${index}`}
+              justify={message.isUser ? "flex-end" : "flex-start"}
+            >
+              <Box
+                bg={message.isUser ? "blue.500" : "gray.100"}
+                color={message.isUser ? "white" : "black"}
+                p={3}
+                borderRadius="lg"
+                maxW="80%"
+                position="relative"
+                _after={
+                  message.isUser
+                    ? {
+                        content: '""',
+                        position: "absolute",
+                        right: "-8px",
+                        top: "50%",
+                        transform: "translateY(-50%)",
+                        border: "8px solid transparent",
+                        borderLeftColor: "blue.500",
+                      }
+                    : undefined
+                }
+                _before={
+                  !message.isUser
+                    ? {
+                        content: '""',
+                        position: "absolute",
+                        left: "-8px",
+                        top: "50%",
+                        transform: "translateY(-50%)",
+                        border: "8px solid transparent",
+                        borderRightColor: "gray.100",
+                      }
+                    : undefined
+                }
+              >
+                <Text>{message.text}</Text>
+              </Box>
+            </Flex>
+          ))}
+          <div ref={messagesEndRef} />
+        </VStack>
+      </Box>
+      <HStack>
+        <Input
+          value={input}
+          onChange={(e) => setInput(e.target.value)}
+          placeholder="Type your message..."
+          onKeyDown={(e) => {
+            if (e.key === "Enter") {
+              handleSend();
+            }
+          }}
+          isDisabled={readyState !== ReadyState.OPEN}
+          aria-label="Message input"
+        />
+        <Button
+          colorScheme="blue"
+          onClick={handleSend}
+          isDisabled={readyState !== ReadyState.OPEN}
+          aria-label="Send message"
+        >
+          Send
+        </Button>
+      </HStack>
+    </VStack>
+  );
+};
+
+export default Chat;